@@ -0,0 +1,135 @@
+# app/api/access.py
+from typing import Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core import access
+from app.db import models, reads
+from app.db.session import get_db
+from app.deps.auth import get_current_user
+
+router = APIRouter()
+
+
+# ---------- Schemas ----------
+class GrantIn(BaseModel):
+    subject_type: Literal["user", "role"]
+    subject: str                              # user id or role name
+    scope_type: Literal["device", "field"]
+    scope_id: UUID
+
+
+class OwnerIn(BaseModel):
+    user_id: Optional[UUID] = None            # None clears the owner
+
+
+def serialize_grant(g: models.DeviceGrant) -> dict:
+    return {
+        "id": str(g.id),
+        "subject_type": g.subject_type,
+        "subject": g.subject,
+        "scope_type": g.scope_type,
+        "scope_id": str(g.scope_id),
+        "created_by": str(g.created_by) if g.created_by else None,
+        "created_at": g.created_at.isoformat() if g.created_at else None,
+    }
+
+
+def _require_admin(current):
+    if not access.is_admin(current):
+        raise HTTPException(status_code=403, detail="Requires admin")
+
+
+def _require_grant_manager(db: Session, current, scope_type: str, scope_id: UUID) -> None:
+    """Admins manage every grant; a device owner may share that device."""
+    if access.is_admin(current):
+        return
+    if scope_type == "device":
+        device = db.get(models.Device, scope_id)
+        if device is not None and device.owner_id == current.id:
+            return
+    raise HTTPException(status_code=403, detail="Requires admin or device owner")
+
+
+# ---------- Grants ----------
+@router.get("/api/v1/grants")
+def list_grants(scope_id: Optional[UUID] = None, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    q = db.query(models.DeviceGrant)
+    if scope_id:
+        q = q.filter(models.DeviceGrant.scope_id == scope_id)
+    if not access.is_admin(current):
+        owned = db.query(models.Device.id).filter(models.Device.owner_id == current.id)
+        q = q.filter(models.DeviceGrant.scope_type == "device", models.DeviceGrant.scope_id.in_(owned))
+    return [serialize_grant(g) for g in q.order_by(models.DeviceGrant.created_at).all()]
+
+
+@router.post("/api/v1/grants", status_code=201)
+def create_grant(payload: GrantIn, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_grant_manager(db, current, payload.scope_type, payload.scope_id)
+    scope_model = models.Device if payload.scope_type == "device" else models.Field
+    if db.get(scope_model, payload.scope_id) is None:
+        raise HTTPException(status_code=404, detail=f"{payload.scope_type.capitalize()} not found")
+    if payload.subject_type == "user":
+        try:
+            user_id = UUID(payload.subject)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="subject must be a user id")
+        if db.get(models.User, user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        payload.subject = str(user_id)
+    grant = models.DeviceGrant(**payload.model_dump(), created_by=current.id)
+    db.add(grant)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Grant already exists")
+    db.refresh(grant)
+    access.get_access_index().added(
+        access.grant_users(db, grant.subject_type, grant.subject),
+        access.scope_devices(db, grant.scope_type, grant.scope_id),
+    )
+    return serialize_grant(grant)
+
+
+@router.delete("/api/v1/grants/{grant_id}", status_code=204)
+def delete_grant(grant_id: UUID, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    grant = db.get(models.DeviceGrant, grant_id)
+    if grant is None:
+        raise HTTPException(status_code=404, detail="Grant not found")
+    _require_grant_manager(db, current, grant.scope_type, grant.scope_id)
+    users = access.grant_users(db, grant.subject_type, grant.subject)
+    db.delete(grant)
+    db.commit()
+    access.get_access_index().revoked(users)
+
+
+# ---------- Ownership ----------
+@router.put("/api/v1/devices/{device_id}/owner")
+def set_device_owner(device_id: UUID, payload: OwnerIn, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    device = db.get(models.Device, device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    if payload.user_id is not None and db.get(models.User, payload.user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    previous = device.owner_id
+    device.owner_id = payload.user_id
+    db.commit()
+    index = access.get_access_index()
+    if previous and previous != payload.user_id:
+        index.revoked([str(previous)])
+    if payload.user_id:
+        index.added([str(payload.user_id)], [str(device_id)])
+    return {"id": str(device.id), "owner_id": str(device.owner_id) if device.owner_id else None}
+
+
+@router.get("/api/v1/me/devices")
+def my_devices(db: Session = Depends(get_db), current=Depends(get_current_user)):
+    """Devices the caller can read (everything for administrators)."""
+    return ORJSONResponse(reads.list_devices(db, access.get_access_index().allowed(current, db)))
@@ -0,0 +1,37 @@
+# app/api/admin.py
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.core import profiling
+from app.core.config import settings
+from app.deps.auth import get_current_user
+
+router = APIRouter()
+
+
+def _require_admin(current):
+    if current.role != "Administrador":
+        raise HTTPException(status_code=403, detail="Requires admin")
+
+
+@router.get("/api/v1/admin/profiling")
+def get_profiling(current=Depends(get_current_user)):
+    """
+    Per-endpoint request/SQL aggregates of *this* API process (see
+    core/profiling.py), worst average latency first.
+    """
+    _require_admin(current)
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    stats = profiling.endpoint_stats()
+    return {
+        "slow_sql_ms": settings.PROFILING_SLOW_SQL_MS,
+        "n_plus_one_threshold": settings.PROFILING_N_PLUS_ONE,
+        "profile_dir": settings.PROFILING_DIR,
+        "endpoints": dict(sorted(stats.items(), key=lambda kv: kv[1]["avg_ms"], reverse=True)),
+    }
+
+
+@router.delete("/api/v1/admin/profiling", status_code=204)
+def reset_profiling(current=Depends(get_current_user)):
+    _require_admin(current)
+    profiling.reset_stats()
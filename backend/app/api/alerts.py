@@ -0,0 +1,164 @@
+# app/api/alerts.py
+from datetime import datetime
+from typing import Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field, model_validator
+from sqlalchemy.orm import Session
+
+from app.core import access
+from app.db.session import get_db
+from app.db import models
+from app.deps.auth import get_current_user
+from app.workers.alerts import MEASUREMENT_FIELDS, OPS, rules_changed
+
+router = APIRouter()
+
+
+# ---------- Schemas ----------
+class AlertRuleIn(BaseModel):
+    name: str
+    device_id: Optional[UUID] = None          # None = whole fleet
+    field: str
+    kind: Literal["threshold", "rate", "sustained"] = "threshold"
+    op: Literal[">", ">=", "<", "<="]
+    value: float
+    window_s: Optional[int] = Field(default=None, gt=0)
+    severity: Literal["Alta", "Media", "Baja"] = "Media"
+    cooldown_s: int = Field(default=900, ge=0)
+    enabled: bool = True
+
+    @model_validator(mode="after")
+    def _check(self):
+        if self.field not in MEASUREMENT_FIELDS:
+            raise ValueError(f"field must be one of {', '.join(MEASUREMENT_FIELDS)}")
+        if self.kind == "sustained" and not self.window_s:
+            raise ValueError("sustained rules need window_s")
+        return self
+
+
+def serialize_rule(rule: models.AlertRule) -> dict:
+    return {
+        "id": str(rule.id),
+        "name": rule.name,
+        "device_id": str(rule.device_id) if rule.device_id else None,
+        "field": rule.field,
+        "kind": rule.kind,
+        "op": rule.op,
+        "value": rule.value,
+        "window_s": rule.window_s,
+        "severity": rule.severity,
+        "cooldown_s": rule.cooldown_s,
+        "enabled": rule.enabled,
+        "created_at": rule.created_at.isoformat() if rule.created_at else None,
+    }
+
+
+def serialize_alert(a: models.Alert) -> dict:
+    return {
+        "id": str(a.id),
+        "created_at": a.created_at.isoformat() if a.created_at else None,
+        "device_id": str(a.device_id) if a.device_id else None,
+        "alert_type": a.alert_type,
+        "severity": a.severity,
+        "message": a.message,
+        "payload": a.payload,
+        "acknowledged": a.acknowledged,
+        "acknowledged_by": a.acknowledged_by,
+    }
+
+
+def _require_admin(current):
+    if current.role != "Administrador":
+        raise HTTPException(status_code=403, detail="Requires admin")
+
+
+# ---------- Rules ----------
+@router.get("/api/v1/alert-rules")
+def list_rules(device_id: Optional[UUID] = None, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    """Fleet-wide rules plus the rules of devices the caller can read."""
+    q = db.query(models.AlertRule)
+    if device_id:
+        access.require_device(current, device_id, db)
+        q = q.filter((models.AlertRule.device_id == device_id) | (models.AlertRule.device_id.is_(None)))
+    else:
+        allowed = access.get_access_index().allowed(current, db)
+        if allowed is not None:
+            q = q.filter(models.AlertRule.device_id.is_(None)
+                         | models.AlertRule.device_id.in_([UUID(d) for d in allowed]))
+    return [serialize_rule(r) for r in q.order_by(models.AlertRule.created_at).all()]
+
+
+@router.post("/api/v1/alert-rules", status_code=201)
+def create_rule(payload: AlertRuleIn, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    rule = models.AlertRule(**payload.model_dump())
+    db.add(rule)
+    db.commit()
+    db.refresh(rule)
+    rules_changed()
+    return serialize_rule(rule)
+
+
+@router.put("/api/v1/alert-rules/{rule_id}")
+def update_rule(rule_id: UUID, payload: AlertRuleIn, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    rule = db.get(models.AlertRule, rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    for k, v in payload.model_dump().items():
+        setattr(rule, k, v)
+    db.commit()
+    rules_changed(rule_id=rule_id)
+    return serialize_rule(rule)
+
+
+@router.delete("/api/v1/alert-rules/{rule_id}", status_code=204)
+def delete_rule(rule_id: UUID, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    deleted = db.query(models.AlertRule).filter(models.AlertRule.id == rule_id).delete()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    db.commit()
+    rules_changed(rule_id=rule_id)
+
+
+# ---------- Alerts ----------
+@router.get("/api/v1/alerts")
+def list_alerts(
+    device_id: Optional[UUID] = None,
+    unacknowledged: bool = False,
+    since: Optional[datetime] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current=Depends(get_current_user),
+):
+    """Most recent first (ix_alerts_device_created); only devices the caller can read."""
+    q = db.query(models.Alert)
+    if device_id:
+        access.require_device(current, device_id, db)
+        q = q.filter(models.Alert.device_id == device_id)
+    else:
+        allowed = access.get_access_index().allowed(current, db)
+        if allowed is not None:
+            q = q.filter(models.Alert.device_id.in_([UUID(d) for d in allowed]))
+    if unacknowledged:
+        q = q.filter(models.Alert.acknowledged.is_(False))
+    if since:
+        q = q.filter(models.Alert.created_at >= since)
+    rows = q.order_by(models.Alert.created_at.desc()).limit(max(1, min(limit, 500))).all()
+    return [serialize_alert(a) for a in rows]
+
+
+@router.post("/api/v1/alerts/{alert_id}/ack")
+def acknowledge_alert(alert_id: UUID, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    alert = db.get(models.Alert, alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    if alert.device_id:
+        access.require_device(current, alert.device_id, db)
+    alert.acknowledged = True
+    alert.acknowledged_by = current.email or str(current.id)
+    db.commit()
+    return serialize_alert(alert)
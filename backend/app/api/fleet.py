@@ -0,0 +1,36 @@
+# app/api/fleet.py
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from app.core import access
+from app.db import reads
+from app.db.session import get_db
+from app.deps.auth import get_current_user
+from app.workers import fleet
+
+router = APIRouter()
+
+
+@router.get("/api/v1/devices/health")
+def get_fleet_health(db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """
+    Liveness and link quality of every device the caller can read: status
+    (online / stale / offline / never), last seen, message rate, gaps,
+    duplicate rate, clock skew and battery trend.  The device list comes
+    from ``devices``; the state is one pipelined Redis read for the whole
+    fleet, so this never queries ``measurements``.
+    """
+    devices = reads.list_devices(db, access.get_access_index().allowed(user, db))
+    states = fleet.get_fleet().fleet(str(d["id"]) for d in devices)
+    now = time.time()
+    items = [{**d, **fleet.describe(states.get(str(d["id"])), now)} for d in devices]
+    return ORJSONResponse({
+        "generated_at": datetime.fromtimestamp(now, timezone.utc),
+        "counts": dict(Counter(i["status"] for i in items)),
+        "devices": items,
+    })
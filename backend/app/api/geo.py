@@ -0,0 +1,356 @@
+# app/api/geo.py
+"""
+Map endpoints: field polygons and device positions as GeoJSON.
+
+Devices and fields change rarely, so every API process keeps them in a
+:class:`~app.core.spatial.GridIndex` and answers a viewport with one index
+lookup plus one pipelined Redis read of the visible devices' fleet state
+(which carries the latest reading), without touching Postgres.  Writes bump
+``geo:version`` in Redis; a process notices within ``GEO_REFRESH_S`` and
+rebuilds its index (it also rebuilds after ``GEO_MAX_AGE_S`` regardless, to
+cover devices edited elsewhere).
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field as PydanticField, field_validator
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core import access, spatial
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.db import models, reads
+from app.db.session import get_db
+from app.deps.auth import get_current_user
+from app.workers import fleet
+
+logger = logging.getLogger("app.api.geo")
+
+router = APIRouter()
+
+GEO_VERSION_KEY = "geo:version"
+MAX_ZOOM = 22
+
+
+def geo_changed(client=None) -> None:
+    """Tell every API process to rebuild its map index.
+
+    Called after the write is committed, so Redis trouble is logged, not
+    raised; processes still rebuild after ``GEO_MAX_AGE_S``.
+    """
+    try:
+        (client or get_sync_redis()).incr(GEO_VERSION_KEY)
+    except Exception:
+        logger.exception("Could not announce map change")
+
+
+# ---------- index ----------
+@dataclass
+class MapSnapshot:
+    devices: dict      # id -> located_devices row
+    fields: dict       # id -> list_fields row
+    points: spatial.GridIndex
+    boxes: spatial.GridIndex
+    by_field: dict     # field id -> ids of the devices assigned to it
+
+
+def build_snapshot(devices: list[dict], fields: list[dict], cell_deg: float) -> MapSnapshot:
+    points, boxes = spatial.GridIndex(cell_deg), spatial.GridIndex(cell_deg)
+    for d in devices:
+        points.insert_point(str(d["id"]), d["lon"], d["lat"])
+    for f in fields:
+        boxes.insert(str(f["id"]), (f["min_lon"], f["min_lat"], f["max_lon"], f["max_lat"]))
+    by_field: dict[str, list] = {}
+    for d in devices:
+        if d["field_id"]:
+            by_field.setdefault(str(d["field_id"]), []).append(str(d["id"]))
+    return MapSnapshot(
+        devices={str(d["id"]): d for d in devices},
+        fields={str(f["id"]): f for f in fields},
+        points=points,
+        boxes=boxes,
+        by_field=by_field,
+    )
+
+
+class MapIndex:
+    def __init__(self, redis_client=None):
+        self._redis_client = redis_client
+        self._snapshot: Optional[MapSnapshot] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return self._redis_client or get_sync_redis()
+
+    def snapshot(self, db: Session) -> MapSnapshot:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < settings.GEO_REFRESH_S:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot is None or now - self._checked_at >= settings.GEO_REFRESH_S:
+                version = self.redis.get(GEO_VERSION_KEY)
+                if (self._snapshot is None or version != self._version
+                        or now - self._built_at >= settings.GEO_MAX_AGE_S):
+                    self._snapshot = build_snapshot(
+                        reads.located_devices(db), reads.list_fields(db), settings.GEO_GRID_CELL_DEG,
+                    )
+                    self._version = version
+                    self._built_at = now
+                    logger.info("Map index loaded: %d device(s), %d field(s), version %s",
+                                len(self._snapshot.points), len(self._snapshot.boxes), version)
+                self._checked_at = now
+        return self._snapshot
+
+
+_map_index: Optional[MapIndex] = None
+
+
+def get_map_index() -> MapIndex:
+    global _map_index
+    if _map_index is None:
+        _map_index = MapIndex()
+    return _map_index
+
+
+# ---------- GeoJSON ----------
+def _map_status(status: str) -> str:
+    # the map legend only knows online / alert / offline
+    return {"online": "online", "stale": "alert"}.get(status, "offline")
+
+
+def feature_collection(snap: MapSnapshot, bbox: spatial.BBox, states: dict, device_ids: list, now: float,
+                       allowed: Optional[frozenset] = None) -> dict:
+    """``allowed`` (device ids) limits the fields to those holding a readable device."""
+    features = []
+    fields = snap.boxes.query(bbox)
+    if allowed is not None:
+        fields = {f for f in fields if any(d in allowed for d in snap.by_field.get(f, ()))}
+    for fid in sorted(fields, key=lambda k: snap.fields[k]["name"]):
+        f = snap.fields[fid]
+        features.append({
+            "type": "Feature",
+            "id": fid,
+            "geometry": f["boundary"],
+            "properties": {"kind": "field", "name": f["name"], "crop": f["crop"], "area_ha": f["area_ha"]},
+        })
+    for did in device_ids:
+        d = snap.devices[did]
+        state = states.get(did)
+        health = fleet.describe(state, now)
+        features.append({
+            "type": "Feature",
+            "id": did,
+            "geometry": {"type": "Point", "coordinates": [d["lon"], d["lat"]]},
+            "properties": {
+                "kind": "device",
+                "name": d["name"],
+                "device_type": d["device_type"],
+                "field_id": str(d["field_id"]) if d["field_id"] else None,
+                "status": health["status"],
+                "map_status": _map_status(health["status"]),
+                "last_seen": health.get("last_seen"),
+                "last_measurement": health.get("last_measurement"),
+                "battery_v": health.get("battery_v"),
+                "latest": (state or {}).get("latest"),
+            },
+        })
+    return {"type": "FeatureCollection", "bbox": list(bbox), "features": features}
+
+
+def _features_response(db: Session, user, bbox: spatial.BBox, headers: Optional[dict] = None) -> ORJSONResponse:
+    snap = get_map_index().snapshot(db)
+    allowed = access.get_access_index().allowed(user, db)
+    device_ids = [d for d in sorted(snap.points.query(bbox)) if allowed is None or d in allowed]
+    truncated = len(device_ids) > settings.GEO_MAX_FEATURES
+    device_ids = device_ids[:settings.GEO_MAX_FEATURES]
+    states = fleet.get_fleet().fleet(device_ids, latest=True)
+    now = time.time()
+    body = feature_collection(snap, bbox, states, device_ids, now, allowed)
+    body["generated_at"] = datetime.fromtimestamp(now, timezone.utc)
+    body["truncated"] = truncated
+    return ORJSONResponse(body, headers=headers)
+
+
+@router.get("/api/v1/map/features")
+def get_map_features(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Fields and devices inside the viewport as a GeoJSON FeatureCollection.
+    Device features carry the fleet status and the latest reading from the
+    Redis health cache.
+    """
+    try:
+        box = spatial.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _features_response(db, user, box)
+
+
+@router.get("/api/v1/map/tiles/{z}/{x}/{y}")
+def get_map_tile(z: int, x: int, y: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Same as ``/map/features`` for slippy-map tile ``z/x/y``."""
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    headers = {"Cache-Control": f"private, max-age={int(settings.GEO_REFRESH_S)}"}
+    return _features_response(db, user, spatial.tile_bbox(z, x, y), headers=headers)
+
+
+# ---------- fields ----------
+class FieldIn(BaseModel):
+    name: str
+    crop: Optional[str] = None
+    boundary: dict
+
+    @field_validator("boundary")
+    @classmethod
+    def _check_boundary(cls, v):
+        try:
+            rings = spatial.polygon_rings(v)
+        except (KeyError, IndexError, TypeError):
+            raise ValueError("boundary must be a GeoJSON Polygon or MultiPolygon") from None
+        for ring in rings:
+            if len(ring) < 4:
+                raise ValueError("polygon rings need at least 4 positions")
+            for pos in ring:
+                if not (isinstance(pos, (list, tuple)) and len(pos) >= 2
+                        and -180 <= pos[0] <= 180 and -90 <= pos[1] <= 90):
+                    raise ValueError("positions must be [lon, lat] in range")
+        return v
+
+
+class LocationIn(BaseModel):
+    lat: float = PydanticField(ge=-90, le=90)
+    lon: float = PydanticField(ge=-180, le=180)
+    field_id: Optional[UUID] = None     # None: whichever field contains the point
+
+
+def serialize_field(f: models.Field) -> dict:
+    return {
+        "id": str(f.id),
+        "name": f.name,
+        "crop": f.crop,
+        "boundary": f.boundary,
+        "bbox": [f.min_lon, f.min_lat, f.max_lon, f.max_lat],
+        "area_ha": f.area_ha,
+        "created_at": f.created_at.isoformat() if f.created_at else None,
+    }
+
+
+def _require_admin(current):
+    if current.role != "Administrador":
+        raise HTTPException(status_code=403, detail="Requires admin")
+
+
+def _apply_field(f: models.Field, payload: FieldIn) -> None:
+    f.name, f.crop, f.boundary = payload.name, payload.crop, payload.boundary
+    f.min_lon, f.min_lat, f.max_lon, f.max_lat = spatial.geometry_bbox(payload.boundary)
+    area = sum(spatial.ring_area_m2(r) for r in spatial.polygon_rings(payload.boundary))
+    f.area_ha = round(area / 10_000, 4)
+
+
+def field_containing(db: Session, lon: float, lat: float) -> Optional[UUID]:
+    """Field whose polygon contains the point (bbox prefilter on ix_fields_bbox)."""
+    F = models.Field
+    rows = db.execute(
+        select(F.id, F.boundary)
+        .where(F.min_lon <= lon, F.max_lon >= lon, F.min_lat <= lat, F.max_lat >= lat)
+        .order_by(F.id)
+    )
+    for fid, boundary in rows:
+        if spatial.point_in_geometry(lon, lat, boundary):
+            return fid
+    return None
+
+
+@router.get("/api/v1/fields")
+def list_fields(db: Session = Depends(get_db), current=Depends(get_current_user)):
+    """Fields holding at least one device the caller can read (all of them for admins)."""
+    fields = reads.list_fields(db)
+    allowed = access.get_access_index().allowed(current, db)
+    if allowed is not None:
+        D = models.Device
+        ids = {str(f) for f in db.execute(
+            select(D.field_id).where(D.id.in_([UUID(d) for d in allowed]), D.field_id.isnot(None)).distinct()
+        ).scalars()}
+        fields = [f for f in fields if str(f["id"]) in ids]
+    return ORJSONResponse(fields)
+
+
+@router.post("/api/v1/fields", status_code=201)
+def create_field(payload: FieldIn, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    f = models.Field()
+    _apply_field(f, payload)
+    db.add(f)
+    db.commit()
+    db.refresh(f)
+    geo_changed()
+    return serialize_field(f)
+
+
+@router.put("/api/v1/fields/{field_id}")
+def update_field(field_id: UUID, payload: FieldIn, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    f = db.get(models.Field, field_id)
+    if f is None:
+        raise HTTPException(status_code=404, detail="Field not found")
+    _apply_field(f, payload)
+    db.commit()
+    geo_changed()
+    return serialize_field(f)
+
+
+@router.delete("/api/v1/fields/{field_id}", status_code=204)
+def delete_field(field_id: UUID, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    users = access.field_grant_users(db, [field_id])
+    db.query(models.Device).filter(models.Device.field_id == field_id).update({"field_id": None})
+    db.query(models.DeviceGrant).filter(
+        models.DeviceGrant.scope_type == "field", models.DeviceGrant.scope_id == field_id,
+    ).delete()
+    deleted = db.query(models.Field).filter(models.Field.id == field_id).delete()
+    if not deleted:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Field not found")
+    db.commit()
+    access.get_access_index().revoked(users)
+    geo_changed()
+
+
+@router.put("/api/v1/devices/{device_id}/location")
+def set_device_location(device_id: UUID, payload: LocationIn, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    _require_admin(current)
+    device = db.get(models.Device, device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    if payload.field_id is not None and db.get(models.Field, payload.field_id) is None:
+        raise HTTPException(status_code=404, detail="Field not found")
+    previous_field = device.field_id
+    device.lat, device.lon = payload.lat, payload.lon
+    device.field_id = payload.field_id or field_containing(db, payload.lon, payload.lat)
+    db.commit()
+    if device.field_id != previous_field:
+        # field grants follow the device
+        access.get_access_index().revoked(access.field_grant_users(db, [previous_field, device.field_id]))
+    geo_changed()
+    return {
+        "id": str(device.id),
+        "lat": device.lat,
+        "lon": device.lon,
+        "field_id": str(device.field_id) if device.field_id else None,
+    }
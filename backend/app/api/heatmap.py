@@ -0,0 +1,186 @@
+# app/api/heatmap.py
+"""
+Field heatmaps: the readings of a field's devices interpolated (IDW) over
+the field polygon, as a PNG overlay or a raw float32 grid.
+
+Rendering is the expensive part, so results sit in a per-process LRU cache
+with a TTL, keyed by field, metric, bucket, zoom and output options.  Each
+entry remembers a stamp made of the field's bbox and, per device, its
+position and fleet-health message count; a new reading bumps the count, so
+the next request sees a different stamp and re-renders.  The stamp comes
+from the same pipelined Redis read that supplies the latest readings, so a
+cache hit costs one round trip and no SQL.  Closed hourly/daily buckets are
+not stamped with the counters (their data no longer changes) and only age
+out with ``HEATMAP_CACHE_TTL_S``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+
+from app.api.geo import get_map_index
+from app.core import access, metrics
+from app.core.config import settings
+from app.db import reads
+from app.db.session import get_db
+from app.deps.auth import get_current_user
+from app.workers import fleet, indicators
+from app.workers.alerts import MEASUREMENT_FIELDS
+
+router = APIRouter()
+
+# wind direction is circular; an IDW of angles is meaningless
+METRICS = tuple(f for f in MEASUREMENT_FIELDS if f != "wind_direction_deg")
+MEDIA_TYPES = {"png": "image/png", "f32": "application/octet-stream"}
+
+
+class TileCache:
+    """Small thread-safe LRU with a TTL; an entry is only returned for the same stamp."""
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, stamp):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            expires, entry_stamp, value = hit
+            if expires <= now or entry_stamp != stamp:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, stamp, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+_cache: Optional[TileCache] = None
+
+
+def get_tile_cache() -> TileCache:
+    global _cache
+    if _cache is None:
+        _cache = TileCache(settings.HEATMAP_CACHE_SIZE, settings.HEATMAP_CACHE_TTL_S)
+    return _cache
+
+
+def bucket_window(bucket: str, at: datetime) -> tuple[datetime, datetime]:
+    """``[start, end)`` of the hourly (UTC) or daily (INDICATORS_TZ) bucket holding ``at``."""
+    if bucket == "1h":
+        start = at.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        return start, start + timedelta(hours=1)
+    day, _ = indicators.local_day(at.timestamp())
+    return indicators.day_bounds(day)
+
+
+def latest_samples(device_ids: list, states: dict, metric: str, now: float) -> dict:
+    out = {}
+    for d in device_ids:
+        state = states.get(d) or {}
+        value = (state.get("latest") or {}).get(metric)
+        if value is not None and now - state.get("last_ts", 0.0) <= settings.HEATMAP_LATEST_MAX_AGE_S:
+            out[d] = float(value)
+    return out
+
+
+@router.get("/api/v1/fields/{field_id}/heatmap")
+def get_field_heatmap(
+    field_id: UUID,
+    metric: str = Query("temperature_c"),
+    bucket: Literal["latest", "1h", "1d"] = "latest",
+    at: Optional[datetime] = None,
+    zoom: int = Query(17, ge=10, le=20),
+    format: Literal["png", "f32"] = "png",
+    vmin: Optional[float] = None,
+    vmax: Optional[float] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    ``metric`` interpolated over the field: the latest reading of each device
+    (``bucket=latest``, readings older than ``HEATMAP_LATEST_MAX_AGE_S`` are
+    left out) or the device means over the hour/day holding ``at``.
+
+    ``png`` is an RGBA overlay for the field's bbox (transparent outside the
+    polygon), coloured from ``vmin`` to ``vmax`` (default: the sample range).
+    ``f32`` is the raw row-major little-endian float32 grid, north row first,
+    NaN outside the polygon.  Both report the grid in ``X-Heatmap-*`` headers.
+    """
+    if metric not in METRICS:
+        raise HTTPException(status_code=422, detail=f"metric must be one of {', '.join(METRICS)}")
+    snap = get_map_index().snapshot(db)
+    fid = str(field_id)
+    field = snap.fields.get(fid)
+    if field is None:
+        raise HTTPException(status_code=404, detail="Field not found")
+    bbox = (field["min_lon"], field["min_lat"], field["max_lon"], field["max_lat"])
+    device_ids = access.visible(user, snap.by_field.get(fid, []), db)
+    if not device_ids and not access.is_admin(user):
+        raise HTTPException(status_code=404, detail="Field not found")
+
+    now = time.time()
+    states = fleet.get_fleet().fleet(device_ids, latest=(bucket == "latest"))
+    if bucket == "latest":
+        bucket_key, start, end, live = "latest", None, None, True
+    else:
+        start, end = bucket_window(bucket, at or datetime.now(timezone.utc))
+        bucket_key, live = f"{bucket}:{int(start.timestamp())}", end.timestamp() > now
+    stamp = (bbox, tuple(
+        (d, snap.devices[d]["lon"], snap.devices[d]["lat"], (states.get(d) or {}).get("msgs", 0.0) if live else None)
+        for d in device_ids
+    ))
+
+    cache = get_tile_cache()
+    key = (fid, metric, bucket_key, zoom, format, vmin, vmax)
+    hit = cache.get(key, stamp)
+    if hit is not None:
+        metrics.HEATMAP_CACHE.labels(result="hit").inc()
+        body, headers = hit
+        return Response(content=body, media_type=MEDIA_TYPES[format], headers={**headers, "X-Cache": "hit"})
+    metrics.HEATMAP_CACHE.labels(result="miss").inc()
+
+    if bucket == "latest":
+        values = latest_samples(device_ids, states, metric, now)
+    else:
+        values = reads.device_means(db, device_ids, metric, start, end) if device_ids else {}
+    if not values:
+        raise HTTPException(status_code=404, detail="No readings for this field and bucket")
+    samples = [(snap.devices[d]["lon"], snap.devices[d]["lat"], v) for d, v in values.items()]
+
+    # NumPy/Pillow stay out of the API's import path until the first heatmap
+    from app.core import heatmap
+
+    with metrics.timed(metrics.HEATMAP_RENDER_SECONDS):
+        raster = heatmap.interpolate(field["boundary"], bbox, samples, zoom,
+                                     settings.HEATMAP_MAX_PX, settings.HEATMAP_IDW_POWER)
+        lo = raster.vmin if vmin is None else vmin
+        hi = raster.vmax if vmax is None else vmax
+        body = heatmap.to_png(raster, lo, hi) if format == "png" else heatmap.to_f32(raster)
+    height, width = raster.values.shape
+    headers = {
+        "X-Heatmap-Bbox": ",".join(f"{v:.7f}" for v in bbox),
+        "X-Heatmap-Shape": f"{height},{width}",
+        "X-Heatmap-Range": f"{lo:.4f},{hi:.4f}",
+        "X-Heatmap-Samples": str(raster.samples),
+        "Cache-Control": "private, max-age=60",
+    }
+    cache.put(key, stamp, (body, headers))
+    return Response(content=body, media_type=MEDIA_TYPES[format], headers={**headers, "X-Cache": "miss"})
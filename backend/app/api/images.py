@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from app.utils.s3 import generate_presigned_put, get_s3_client
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from app.utils.s3 import derived_key, generate_presigned_put, generate_presigned_puts, get_s3_client, presigned_get_cached
+from app.core import access
 from app.core.config import settings
 from app.db.session import get_db
+from app.deps.auth import get_current_user
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from app.db import models
 from datetime import datetime
+from typing import List, Literal, Optional
+import base64
 import uuid
 
 router = APIRouter()
@@ -17,13 +23,36 @@ class StartSessionIn(BaseModel):
     timestamp: datetime | None = None
 
 class ImageCompleteIn(BaseModel):
-    session_id: str
+    session_id: uuid.UUID
     frame_index: int
     timestamp: datetime
     s3_key: str
     width: int | None = None
     height: int | None = None
 
+class SessionUploadsIn(BaseModel):
+    count: int = Field(..., ge=1)
+    start_index: int = Field(0, ge=0)
+
+class FrameCompleteIn(BaseModel):
+    frame_index: int
+    timestamp: datetime
+    s3_key: str
+    width: int | None = None
+    height: int | None = None
+
+class SessionCompleteIn(BaseModel):
+    frames: List[FrameCompleteIn]
+
+def _session_prefix(session: models.CameraSession) -> str:
+    return f"camera/{session.device_id}/{session.id}/"
+
+def _get_session(db: Session, session_id: uuid.UUID) -> models.CameraSession:
+    session = db.get(models.CameraSession, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Camera session not found")
+    return session
+
 @router.post('/api/v1/camera/sessions/start')
 def start_session(payload: StartSessionIn, db: Session = Depends(get_db)):
     session = models.CameraSession(
@@ -48,20 +77,190 @@ def request_upload(device_id: str, frame_index: int):
 
 @router.post('/api/v1/images/complete')
 def image_complete(payload: ImageCompleteIn, db: Session = Depends(get_db)):
-    # create image row and enqueue processing
-    img = models.Image(
-        session_id=payload.session_id,
-        device_id=None, # can be filled if needed
-        capture_time=payload.timestamp,
-        s3_key=payload.s3_key,
-        width=payload.width,
-        height=payload.height,
-        status='pending'
-    )
-    db.add(img)
+    # create image row and enqueue processing; a repeated call returns the same row
+    image_id = db.execute(
+        insert(models.Image).values(
+            id=uuid.uuid4(),
+            session_id=payload.session_id,
+            # the session's device, so the frame is in that device's gallery
+            device_id=select(models.CameraSession.device_id)
+            .where(models.CameraSession.id == payload.session_id).scalar_subquery(),
+            capture_time=payload.timestamp,
+            s3_key=payload.s3_key,
+            width=payload.width,
+            height=payload.height,
+            status='pending',
+        )
+        .on_conflict_do_nothing(index_elements=['session_id', 's3_key'])
+        .returning(models.Image.id)
+    ).scalar()
+    if image_id is None:
+        existing = db.execute(select(models.Image.id).where(
+            models.Image.session_id == payload.session_id, models.Image.s3_key == payload.s3_key,
+        )).scalar_one()
+        db.rollback()
+        return {'image_id': str(existing)}
     db.commit()
-    db.refresh(img)
     # enqueue Celery task
     from app.workers.tasks import process_image
-    process_image.delay(str(img.id), payload.s3_key)
-    return {'image_id': str(img.id)}
\ No newline at end of file
+    process_image.delay(str(image_id), payload.s3_key)
+    return {'image_id': str(image_id)}
+
+@router.post('/api/v1/camera/sessions/{session_id}/request-uploads')
+def request_session_uploads(session_id: uuid.UUID, payload: SessionUploadsIn, db: Session = Depends(get_db)):
+    """Presigned PUT URLs for ``count`` frames of a session in one call."""
+    if payload.count > settings.MAX_UPLOAD_BATCH:
+        raise HTTPException(status_code=400, detail=f"count must be <= {settings.MAX_UPLOAD_BATCH}")
+    session = _get_session(db, session_id)
+    prefix = _session_prefix(session)
+    indexes = range(payload.start_index, payload.start_index + payload.count)
+    keys = [f"{prefix}{i:06d}.jpg" for i in indexes]
+    urls = generate_presigned_puts(keys, expires_in=settings.UPLOAD_URL_EXPIRE_S)
+    return {
+        'session_id': str(session.id),
+        'expires_in': settings.UPLOAD_URL_EXPIRE_S,
+        'uploads': [
+            {'frame_index': i, 's3_key': key, 'upload_url': url}
+            for i, key, url in zip(indexes, keys, urls)
+        ],
+    }
+
+@router.post('/api/v1/camera/sessions/{session_id}/complete')
+def session_complete(session_id: uuid.UUID, payload: SessionCompleteIn, db: Session = Depends(get_db)):
+    """Register every uploaded frame of a session with one INSERT and one UPDATE."""
+    if not payload.frames:
+        raise HTTPException(status_code=400, detail="No frames")
+    if len(payload.frames) > settings.MAX_UPLOAD_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {settings.MAX_UPLOAD_BATCH} frames per call")
+    session = _get_session(db, session_id)
+    prefix = _session_prefix(session)
+    bad = [f.s3_key for f in payload.frames if not f.s3_key.startswith(prefix)]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Keys outside {prefix}: {bad[:5]}")
+
+    rows = [
+        {
+            'id': uuid.uuid4(),
+            'session_id': session.id,
+            'device_id': session.device_id,
+            'capture_time': f.timestamp,
+            's3_key': f.s3_key,
+            'width': f.width,
+            'height': f.height,
+            'status': 'pending',
+        }
+        for f in payload.frames
+    ]
+    # a retried call must not register (or process) its frames twice
+    inserted = db.execute(
+        insert(models.Image).values(rows)
+        .on_conflict_do_nothing(index_elements=['session_id', 's3_key'])
+        .returning(models.Image.id, models.Image.s3_key)
+    ).all()
+    if inserted:
+        db.query(models.CameraSession).filter(models.CameraSession.id == session.id).update(
+            {models.CameraSession.frames_count: func.coalesce(models.CameraSession.frames_count, 0) + len(inserted)},
+            synchronize_session=False,
+        )
+    ids = {key: image_id for image_id, key in inserted}
+    if len(ids) < len(rows):
+        ids.update({key: image_id for image_id, key in db.execute(
+            select(models.Image.id, models.Image.s3_key).where(
+                models.Image.session_id == session.id,
+                models.Image.s3_key.in_([r['s3_key'] for r in rows if r['s3_key'] not in ids]),
+            )
+        )})
+    db.commit()
+
+    # enqueue processing over a single broker connection
+    if inserted:
+        from app.workers.tasks import celery, process_image
+        with celery.producer_or_acquire() as producer:
+            for image_id, key in inserted:
+                process_image.apply_async((str(image_id), key), producer=producer)
+    return {
+        'session_id': str(session.id),
+        'image_ids': [str(ids[r['s3_key']]) for r in rows],
+        'registered': len(inserted),
+    }
+
+# ---------- Gallery ----------
+def _encode_cursor(capture_time: datetime, image_id: uuid.UUID) -> str:
+    raw = f"{capture_time.isoformat()}|{image_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, image_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), uuid.UUID(image_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def serialize_image(row: models.Image) -> dict:
+    processed = row.status == "processed"
+    return {
+        "id": str(row.id),
+        "session_id": str(row.session_id) if row.session_id else None,
+        "device_id": str(row.device_id) if row.device_id else None,
+        "capture_time": row.capture_time.isoformat() if row.capture_time else None,
+        "status": row.status,
+        "width": row.width,
+        "height": row.height,
+        "thumbnail_url": presigned_get_cached(row.thumbnail_key) if row.thumbnail_key else None,
+        "preview_url": presigned_get_cached(derived_key(row.s3_key, "preview")) if processed and row.s3_key else None,
+        "url": presigned_get_cached(row.s3_key) if row.s3_key else None,
+        "analysis": row.analysis,
+    }
+
+@router.get('/api/v1/images')
+def list_images(
+    device_id: Optional[uuid.UUID] = None,
+    session_id: Optional[uuid.UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Keyset-paginated gallery ordered by (capture_time, id).
+
+    Pass ``next_cursor`` back as ``cursor`` for the next page; every page is an
+    index range scan on (session_id|device_id, capture_time, id), so page 500
+    costs the same as page 1.  Only frames of devices the caller can read.
+    """
+    q = db.query(models.Image).filter(models.Image.capture_time.isnot(None))
+    if session_id:
+        q = q.filter(models.Image.session_id == session_id)
+    if device_id:
+        access.require_device(user, device_id, db)
+        q = q.filter(models.Image.device_id == device_id)
+    else:
+        allowed = access.get_access_index().allowed(user, db)
+        if allowed is not None:
+            q = q.filter(models.Image.device_id.in_([uuid.UUID(d) for d in allowed]))
+    if since:
+        q = q.filter(models.Image.capture_time >= since)
+    if until:
+        q = q.filter(models.Image.capture_time < until)
+    if status:
+        q = q.filter(models.Image.status == status)
+
+    key = tuple_(models.Image.capture_time, models.Image.id)
+    if cursor:
+        after = tuple_(*_decode_cursor(cursor))
+        q = q.filter(key > after if order == "asc" else key < after)
+    if order == "asc":
+        q = q.order_by(models.Image.capture_time.asc(), models.Image.id.asc())
+    else:
+        q = q.order_by(models.Image.capture_time.desc(), models.Image.id.desc())
+
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1].capture_time, rows[-1].id) if has_more else None
+    return {"items": [serialize_image(r) for r in rows], "next_cursor": next_cursor}
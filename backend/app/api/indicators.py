@@ -0,0 +1,59 @@
+# app/api/indicators.py
+from datetime import date, timedelta
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from app.core import access
+from app.core.config import settings
+from app.db import reads
+from app.db.session import get_db
+from app.deps.auth import get_current_user
+from app.workers import indicators
+
+router = APIRouter()
+
+MAX_RANGE_DAYS = 400
+
+
+@router.get("/api/v1/devices/{device_id}/indicators")
+def get_indicators(
+    device_id: UUID,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    base_c: Optional[float] = None,
+    cap_c: Optional[float] = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Daily indicators (GDD with running total, VPD, dew point, frost hours,
+    ET0) for ``start..end`` inclusive, local days of INDICATORS_TZ.  Defaults
+    to the last 30 days; ``base_c`` / ``cap_c`` set the GDD thresholds for the
+    crop.  One row per day, read from daily_indicators, never from raw data.
+    """
+    access.require_device(user, device_id, db)
+    end = end or indicators.local_today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=422, detail=f"range is limited to {MAX_RANGE_DAYS} days")
+    base = settings.INDICATORS_GDD_BASE_C if base_c is None else base_c
+    cap = settings.INDICATORS_GDD_CAP_C if cap_c is None else cap_c
+    if cap <= base:
+        raise HTTPException(status_code=422, detail="cap_c must be above base_c")
+
+    rows = reads.daily_indicators(db, device_id, start, end)
+    return ORJSONResponse({
+        "device_id": str(device_id),
+        "start": start,
+        "end": end,
+        "timezone": settings.INDICATORS_TZ,
+        "gdd_base_c": base,
+        "gdd_cap_c": cap,
+        "days": indicators.daily_series(rows, base, cap),
+    })
@@ -3,31 +3,35 @@ from __future__ import annotations
 
 import asyncio
 import json
+import time
+import zlib
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 from uuid import UUID
 
 from fastapi import (
-    APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect,
+    APIRouter, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect,
     Header, status
 )
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from app.core import access, metrics, ratelimit, tracing
 from app.core.config import settings
 from app.db.session import get_db
-from app.db import models
+from app.db import models, reads
 
 # Auth deps / WS token verify
-from app.deps.auth import get_current_user
-from app.core.security import verify_ws_token
-
-# celery task
-from app.workers.tasks import process_measurement
+from app.deps.auth import get_current_user, principal_from_claims
+from app.core import security
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError
 
 import logging
 import redis.asyncio as aioredis  # async client for the API process
+from app.core.redis import get_async_redis
 from typing import Optional, Dict, Any
 import secrets
 router = APIRouter()
@@ -52,6 +56,18 @@ class TelemetryIn(BaseModel):
     meta: Optional[Dict[str, Any]] = None
 
 
+class ReadingIn(BaseModel):
+    message_id: Optional[str] = None
+    timestamp: datetime
+    measurements: Measurements
+    meta: Optional[Dict[str, Any]] = None
+
+
+class TelemetryBatchIn(BaseModel):
+    device_id: UUID
+    readings: list[ReadingIn] = Field(min_length=1, max_length=settings.TELEMETRY_BATCH_MAX)
+
+
 class DeviceNotFoundError(HTTPException):
     def __init__(self):
         super().__init__(status_code=404, detail="Device not found")
@@ -88,29 +104,111 @@ def _extract_user_access_token(query_params) -> Optional[str]:
 
 # ---------- Connection manager (exportado como `manager`) ----------
 class ConnectionManager:
+    """Tracks local WebSocket viewers and reference-counts their interest.
+
+    The number of sockets per device (and whether any socket wants "all")
+    decides which Redis channels the pubsub hub subscribes to; every time a
+    count moves between zero and non-zero the hub is woken up to resync.
+    """
     def __init__(self):
         self._device_subs: dict[str, set[WebSocket]] = defaultdict(set)
         self._all_subs: set[WebSocket] = set()
         self._lock = asyncio.Lock()
+        self._interest_changed = asyncio.Event()
 
-    async def connect(self, websocket: WebSocket, device_id: Optional[str]):
+    async def connect(self, websocket: WebSocket, device_id: Optional[str], device_ids=None):
+        """Register a viewer of ``device_id``, of each of ``device_ids``, or (neither) of all."""
         await websocket.accept()
+        targets = [str(device_id)] if device_id else [str(d) for d in device_ids or ()]
         async with self._lock:
-            if device_id:
-                self._device_subs[str(device_id)].add(websocket)
+            if device_id or device_ids is not None:
+                for did in targets:
+                    subs = self._device_subs[did]
+                    if not subs:
+                        self._interest_changed.set()
+                    subs.add(websocket)
             else:
+                if not self._all_subs:
+                    self._interest_changed.set()
                 self._all_subs.add(websocket)
+        if not device_id and device_ids is None:
+            metrics.WS_CONNECTIONS.labels(scope="all").inc()
+        elif targets:
+            metrics.WS_CONNECTIONS.labels(scope="device").inc()
+
+    def bind_loop(self) -> None:
+        """Recreate the asyncio primitives for the running loop.
+
+        The manager is a module-level singleton while the loop belongs to the
+        app's lifespan (a fresh one per TestClient, for instance); an Event or
+        Lock that has been awaited on another loop cannot be reused.
+        """
+        self._lock = asyncio.Lock()
+        self._interest_changed = asyncio.Event()
+        wants_all, device_ids = self.interest()
+        if wants_all or device_ids:
+            self._interest_changed.set()
 
     async def disconnect(self, websocket: WebSocket):
+        await self._remove_ws(websocket)
+
+    async def update_devices(self, websocket: WebSocket, device_ids) -> None:
+        """Resubscribe a per-device viewer to exactly ``device_ids`` (its grants changed)."""
+        wanted = {str(d) for d in device_ids}
         async with self._lock:
-            self._all_subs.discard(websocket)
-            for did, s in list(self._device_subs.items()):
-                if websocket in s:
-                    s.discard(websocket)
-                    if not s:
-                        del self._device_subs[did]
+            had = False
+            for did, subs in list(self._device_subs.items()):
+                if websocket in subs:
+                    had = True
+                    if did not in wanted:
+                        subs.discard(websocket)
+                        if not subs:
+                            del self._device_subs[did]
+                            self._interest_changed.set()
+            for did in wanted:
+                subs = self._device_subs[did]
+                if not subs:
+                    self._interest_changed.set()
+                subs.add(websocket)
+        if had and not wanted:
+            metrics.WS_CONNECTIONS.labels(scope="device").dec()
+        elif wanted and not had:
+            metrics.WS_CONNECTIONS.labels(scope="device").inc()
+
+    def interest(self) -> tuple[bool, set[str]]:
+        """Return ``(wants_all, device_ids)`` with at least one local viewer."""
+        return bool(self._all_subs), {did for did, s in self._device_subs.items() if s}
+
+    def ref_count(self, device_id: Optional[str]) -> int:
+        """Number of local sockets interested in ``device_id`` (``None`` = "all")."""
+        if device_id is None:
+            return len(self._all_subs)
+        return len(self._device_subs.get(str(device_id), ()))
+
+    async def wait_interest_changed(self, timeout: float | None = None) -> bool:
+        """Block until interest changes (or ``timeout``); clears the flag."""
+        try:
+            await asyncio.wait_for(self._interest_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._interest_changed.clear()
+        return True
+
+    def consume_interest_changed(self) -> bool:
+        """Non-blocking variant of :meth:`wait_interest_changed`."""
+        if self._interest_changed.is_set():
+            self._interest_changed.clear()
+            return True
+        return False
 
     async def broadcast(self, device_id: Optional[str], payload: dict):
+        trace_ctx = payload.get("trace")
+        if trace_ctx is not None:
+            # sampled reading (core/tracing.py): close the pubsub hop and keep
+            # the context out of what viewers receive
+            tracing.record_span(trace_ctx, "pubsub.deliver", trace_ctx.get("published_at") or time.time(),
+                                device_id=device_id)
+            payload = {k: v for k, v in payload.items() if k != "trace"}
         msg = json.dumps(payload, default=str)
         async with self._lock:
             recipients = []
@@ -119,27 +217,47 @@ class ConnectionManager:
             recipients.extend(list(self._all_subs))
         if not recipients:
             return
+        fanout_start = time.time()
 
         async def _safe_send(ws: WebSocket):
             try:
                 await ws.send_text(msg)
             except Exception:
+                metrics.DROPPED_MESSAGES.labels(reason="ws_send_failed").inc()
                 try:
                     await ws.close()
                 except Exception:
                     pass
                 await self._remove_ws(ws)
 
+        t0 = time.perf_counter()
         await asyncio.gather(*[_safe_send(ws) for ws in recipients], return_exceptions=True)
+        metrics.BROADCAST_SECONDS.observe(time.perf_counter() - t0)
+        tracing.record_span(trace_ctx, "ws.fanout", fanout_start, recipients=len(recipients))
+        reading_time = payload.get("time")
+        if isinstance(reading_time, str):
+            try:
+                metrics.observe_lag("ws_send", datetime.fromisoformat(reading_time))
+            except ValueError:
+                pass
 
     async def _remove_ws(self, ws: WebSocket):
         async with self._lock:
-            self._all_subs.discard(ws)
+            if ws in self._all_subs:
+                self._all_subs.discard(ws)
+                metrics.WS_CONNECTIONS.labels(scope="all").dec()
+                if not self._all_subs:
+                    self._interest_changed.set()
+            found = False
             for did, s in list(self._device_subs.items()):
                 if ws in s:
                     s.discard(ws)
+                    found = True
                     if not s:
                         del self._device_subs[did]
+                        self._interest_changed.set()
+            if found:
+                metrics.WS_CONNECTIONS.labels(scope="device").dec()
 
 
 # instancia exportada
@@ -159,20 +277,15 @@ async def ws_live(websocket: WebSocket):
 
     # Validate access token passed as ?access_token=...
     token = _extract_user_access_token(q)
-    subject = verify_ws_token(token)
-    if subject is None:
+    try:
+        principal = await principal_from_claims(security.decode_access_token(token)) if token else None
+    except JWTError:
+        principal = None
+    if principal is None or principal.status != "activo":
         # no leak over handshake
         await websocket.close(code=1008)
         return
 
-    # OPTIONAL: permission check
-    # If you want to enforce that only certain users can subscribe to a given device,
-    # you should check ownership or membership here (query DB).
-    # Note: websockets cannot use FastAPI Depends easily, so open a DB session manually if needed.
-    # Example (pseudo):
-    #   async with some_session() as db: check device.owner==subject -> if not, close
-    # For now we accept authenticated users; add checks if required.
-
     # validate device_id format
     if device_id:
         try:
@@ -181,9 +294,25 @@ async def ws_live(websocket: WebSocket):
             await websocket.close(code=1008)
             return
 
+    # access index lookup (core/access.py): a set membership once the
+    # user's index is cached; may hit Redis/DB on a cold cache
+    index = access.get_access_index()
+    device_ids = None
+    if device_id:
+        if not await run_in_threadpool(index.can_read, principal, device_id):
+            await websocket.close(code=1008)
+            return
+    elif not access.is_admin(principal):
+        # "all" for a non-admin means each device they can read; _follow_access
+        # keeps the subscription in step with later grant changes
+        device_ids = await run_in_threadpool(index.allowed, principal)
+
     # register in manager (manager.connect accepts and registers)
-    await manager.connect(websocket, device_id)
+    await manager.connect(websocket, device_id, device_ids=device_ids)
     logger.info(f"WebSocket connected, device_id: {device_id}")
+    recheck = None
+    if not access.is_admin(principal):
+        recheck = asyncio.create_task(_follow_access(websocket, principal, device_id, device_ids))
     try:
         while True:
             # wait for client pings or control messages (we ignore content)
@@ -193,14 +322,70 @@ async def ws_live(websocket: WebSocket):
     except Exception as e:
         logger.exception(f"Unexpected error during WebSocket communication: {str(e)}")
     finally:
+        if recheck is not None:
+            recheck.cancel()
         await manager.disconnect(websocket)
         logger.info(f"WebSocket disconnected from device {device_id}")
 
 
+async def _follow_access(websocket: WebSocket, principal, device_id: Optional[str], device_ids) -> None:
+    """Keep an open viewer in line with the user's grants: close it once
+    ``device_id`` is no longer readable, or resubscribe an "all" viewer to
+    the devices it can read now.  Re-checked every ``ACL_WS_RECHECK_S``.
+    """
+    index = access.get_access_index()
+    while True:
+        await asyncio.sleep(settings.ACL_WS_RECHECK_S)
+        try:
+            if device_id:
+                if not await run_in_threadpool(index.can_read, principal, device_id):
+                    logger.info("WebSocket closed: access to device %s revoked", device_id)
+                    await manager.disconnect(websocket)
+                    await websocket.close(code=1008)
+                    return
+            else:
+                current = await run_in_threadpool(index.allowed, principal)
+                if current != device_ids:
+                    await manager.update_devices(websocket, current)
+                    device_ids = current
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("WebSocket access re-check failed")
+
+
 # ---------- Ingest telemetry (devices) ----------
+def admit(response: Response, device_id: str, device_type: Optional[str], cost: int = 1) -> None:
+    """Charge the device's token bucket; 429 with Retry-After when it (or the fleet) is over its limit.
+
+    Runs after the token check, so nobody can drain another device's bucket.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    _, burst = ratelimit.limits_for(device_type)
+    response.headers["X-RateLimit-Limit"] = str(int(burst))
+    if cost > burst:
+        # could never be admitted; the client has to split the batch
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch larger than the device burst ({int(burst)} readings)",
+            headers={"X-RateLimit-Limit": str(int(burst))},
+        )
+    decision = ratelimit.get_rate_limiter().check(device_id, device_type, cost)
+    if not decision.admitted:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded ({decision.scope})",
+            headers={"Retry-After": decision.retry_after_header, "X-RateLimit-Limit": str(int(burst))},
+        )
+    if decision.remaining is not None:
+        response.headers["X-RateLimit-Remaining"] = str(int(decision.remaining))
+
+
 @router.post("/api/v1/telemetry", status_code=202)
 def ingest_telemetry(
     payload: TelemetryIn,
+    response: Response,
     token: str | None = Header(default=None, alias="X-Device-Token"),
     db: Session = Depends(get_db)
 ):
@@ -208,25 +393,128 @@ def ingest_telemetry(
     Device ingestion endpoint:
       - validates device exists
       - validates device's token (per-device or global in dev)
+      - admits it through the device / global token buckets (429 + Retry-After)
       - pushes a Celery job for processing (DB insert + Redis pub)
     """
-    device_uuid = payload.device_id
-    device = db.query(models.Device).filter(models.Device.id == device_uuid).one_or_none()
+    t0 = time.perf_counter()
+    received_at = time.time()
+    outcome = "error"
+    try:
+        device_uuid = payload.device_id
+        with metrics.timed(metrics.DEVICE_LOOKUP_SECONDS):
+            device = db.query(models.Device).filter(models.Device.id == device_uuid).one_or_none()
+        if device is None:
+            raise DeviceNotFoundError()
+            #raise HTTPException(status_code=404, detail="device not found")
+
+        _verify_device_token_for_device(token, device)
+        admit(response, str(device_uuid), device.device_type)
+
+        job_payload = {
+            "received_at": received_at,
+            "device_id": str(device_uuid),
+            "message_id": payload.message_id,
+            "timestamp": payload.timestamp.isoformat(),
+            "measurements": payload.measurements.model_dump(),
+            "meta": payload.meta,
+        }
+        trace_ctx = tracing.start_trace()
+        if trace_ctx is not None:
+            tracing.record_span(trace_ctx, "ingest.http", received_at, device_id=job_payload["device_id"])
+            job_payload["trace"] = tracing.carry(trace_ctx, enqueued_at=time.time())
+        # imported here: the task module pulls in Celery, boto3, Pillow and
+        # NumPy, none of which the API needs at start-up
+        from app.workers.tasks import process_measurement
+
+        with metrics.timed(metrics.ENQUEUE_SECONDS):
+            process_measurement.delay(job_payload)
+        outcome = "accepted"
+        return {"status": "accepted"}
+    except HTTPException as exc:
+        outcome = str(exc.status_code)
+        raise
+    finally:
+        metrics.INGEST_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - t0)
+
+
+async def _read_batch(request: Request) -> TelemetryBatchIn:
+    """Batch body, gunzipped when ``Content-Encoding: gzip``; decoded size is capped."""
+    limit = settings.TELEMETRY_BATCH_MAX_BYTES
+    body = await request.body()
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding == "gzip":
+        inflater = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            raw = inflater.decompress(body, limit + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Invalid gzip body")
+        if len(raw) > limit or inflater.unconsumed_tail:
+            raise HTTPException(status_code=413, detail="Batch body too large")
+        body = raw
+    elif encoding != "identity":
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    elif len(body) > limit:
+        raise HTTPException(status_code=413, detail="Batch body too large")
+    try:
+        return TelemetryBatchIn.model_validate_json(body)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False, include_input=False))
+
+
+@router.post("/api/v1/telemetry/batch", status_code=202)
+async def ingest_telemetry_batch(
+    request: Request,
+    response: Response,
+    token: str | None = Header(default=None, alias="X-Device-Token"),
+    db: Session = Depends(get_db),
+):
+    """
+    Several readings of one device in one request (gateways catching up
+    after an outage).  Same checks as the single-reading endpoint; the whole
+    batch is charged to the device's token bucket, so a batch larger than
+    the burst is refused with 413 (``X-RateLimit-Limit`` says the burst).
+    Each reading is enqueued as its own job, so dedupe on ``message_id`` and
+    everything downstream work exactly as for single readings.
+    """
+    t0 = time.perf_counter()
+    received_at = time.time()
+    outcome = "error"
+    try:
+        payload = await _read_batch(request)
+        result = await run_in_threadpool(_accept_batch, payload, response, token, db, received_at)
+        outcome = "accepted"
+        return result
+    except HTTPException as exc:
+        outcome = str(exc.status_code)
+        raise
+    finally:
+        metrics.INGEST_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - t0)
+
+
+def _accept_batch(payload: TelemetryBatchIn, response: Response, token: str | None, db: Session,
+                  received_at: float) -> dict:
+    with metrics.timed(metrics.DEVICE_LOOKUP_SECONDS):
+        device = db.query(models.Device).filter(models.Device.id == payload.device_id).one_or_none()
     if device is None:
         raise DeviceNotFoundError()
-        #raise HTTPException(status_code=404, detail="device not found")
-
     _verify_device_token_for_device(token, device)
+    admit(response, str(payload.device_id), device.device_type, cost=len(payload.readings))
 
-    job_payload = {
-        "device_id": str(device_uuid),
-        "message_id": payload.message_id,
-        "timestamp": payload.timestamp.isoformat(),
-        "measurements": payload.measurements.model_dump(),
-        "meta": payload.meta,
-    }
-    process_measurement.delay(job_payload)
-    return {"status": "accepted"}
+    from app.workers.tasks import process_measurement
+
+    device_id = str(payload.device_id)
+    with metrics.timed(metrics.ENQUEUE_SECONDS):
+        for r in payload.readings:
+            process_measurement.delay({
+                "received_at": received_at,
+                "device_id": device_id,
+                "message_id": r.message_id,
+                "timestamp": r.timestamp.isoformat(),
+                "measurements": r.measurements.model_dump(),
+                "meta": r.meta,
+            })
+    metrics.INGEST_BATCH_SIZE.observe(len(payload.readings))
+    return {"status": "accepted", "count": len(payload.readings)}
 
 
 # ---------- Helpers to serialize DB rows ----------
@@ -250,18 +538,13 @@ def serialize_measurement(row: models.Measurement) -> dict:
 @router.get("/api/v1/devices/{device_id}/latest")
 def get_latest(device_id: UUID, db: Session = Depends(get_db), user = Depends(get_current_user)):
     """
-    Protected: only authenticated users (use `user` to enforce more fine-grained permissions).
+    Protected: only users with access to the device (core/access.py).
     """
-    # TODO: enforce user->device access here if you have device ownership
-    row = (
-        db.query(models.Measurement)
-        .filter(models.Measurement.device_id == device_id)
-        .order_by(models.Measurement.time.desc(), models.Measurement.id.desc())
-        .first()
-    )
+    access.require_device(user, device_id, db)
+    row = reads.latest_measurement(db, device_id)
     if not row:
         raise HTTPException(status_code=404, detail="No data for device")
-    return serialize_measurement(row)
+    return ORJSONResponse(row)
 
 
 @router.get("/api/v1/devices/{device_id}/summary")
@@ -269,7 +552,7 @@ def get_summary(device_id: UUID, hours: int = 24, db: Session = Depends(get_db),
     """
     Protected endpoint: returns min/max/avg over a sliding window.
     """
-    # TODO: enforce user->device access here if you have device ownership
+    access.require_device(user, device_id, db)
     since = datetime.now(timezone.utc) - timedelta(hours=hours)
     q = (
         db.query(
@@ -310,12 +593,12 @@ def get_summary(device_id: UUID, hours: int = 24, db: Session = Depends(get_db),
     }
 
 @router.get("/api/v1/devices")
-def get_devices(db: Session = Depends(get_db)):
-    """Fetch all registered devices."""
-    devices = db.query(models.Device).all()
+def get_devices(db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Fetch the registered devices the caller can read."""
+    devices = reads.list_devices(db, access.get_access_index().allowed(user, db))
     if not devices:
         raise HTTPException(status_code=404, detail="No devices found")
-    return [{"id": device.id, "name": device.name} for device in devices]
+    return ORJSONResponse(devices)
 
 
 @router.get("/api/v1/devices/{device_id}/measurements")
@@ -323,111 +606,164 @@ def get_measurements(device_id: UUID, hours: int = 24, db: Session = Depends(get
     """
     Returns a list of measurements for a device within the last `hours`.
     """
+    access.require_device(user, device_id, db)
     since = datetime.now(timezone.utc) - timedelta(hours=hours)
-    rows = (
-        db.query(models.Measurement)
-        .filter(
-            models.Measurement.device_id == device_id,
-            models.Measurement.time >= since,
-        )
-        .order_by(models.Measurement.time.asc())
-        .all()
-    )
-    return [serialize_measurement(r) for r in rows]
+    # column tuples straight to orjson: no ORM instances, no jsonable_encoder
+    return ORJSONResponse(reads.measurements_since(db, device_id, since))
 
 
 
 logger = logging.getLogger(__name__)
 
+_CHANNEL_PREFIX = "telemetry:"
 _PSUB_PATTERN = "telemetry:*"
 _pubsub_task: Optional[asyncio.Task] = None
-_pubsub_redis: Optional[aioredis.Redis] = None
+_hub: Optional["TelemetryPubSubHub"] = None
 
-async def _redis_pubsub_loop():
-    global _pubsub_redis
-    backoff = 1.0
-    retries = 0
-    max_retries = 10
-    try:
-        while retries < max_retries:
-            try:
-                logger.info("Telemetry pubsub: connecting to Redis...")
-                _pubsub_redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
-                pubsub = _pubsub_redis.pubsub(ignore_subscribe_messages=True)
-                await pubsub.psubscribe(_PSUB_PATTERN)
-                logger.info("Telemetry pubsub: subscribed to %s", _PSUB_PATTERN)
-
-                async for msg in pubsub.listen():
-                    if not msg:
-                        continue
-                    mtype = msg.get("type")
-                    if mtype not in ("pmessage", "message"):
-                        continue
-                    channel = msg.get("channel")
-                    data = msg.get("data")
-                    if not channel or data is None:
-                        continue
-                    # tasks.py publishes JSON strings; parse
+
+class TelemetryPubSubHub:
+    """Redis -> WebSocket bridge that only subscribes to what local viewers watch.
+
+    Instead of psubscribing ``telemetry:*`` unconditionally (so every API
+    process receives and decodes every device's messages), the hub keeps one
+    ``telemetry:<device_id>`` subscription per device that has at least one
+    local socket, and falls back to the wildcard pattern only while some
+    local client is subscribed to "all".  With no viewers it holds no
+    subscriptions at all.
+    """
+
+    poll_timeout = 0.5
+
+    def __init__(self, manager: ConnectionManager, redis_client: Optional[aioredis.Redis] = None, max_retries: int = 10):
+        self.manager = manager
+        # defaults to the process-wide pool (app.core.redis)
+        self.redis_client = redis_client
+        self.max_retries = max_retries
+        self.messages_received = 0
+        self._channels: set[str] = set()
+        self._patterns: set[str] = set()
+
+    def _desired(self) -> tuple[set[str], set[str]]:
+        wants_all, device_ids = self.manager.interest()
+        if wants_all:
+            # the pattern already covers every device channel
+            return set(), {_PSUB_PATTERN}
+        return {f"{_CHANNEL_PREFIX}{did}" for did in device_ids}, set()
+
+    async def sync_subscriptions(self, pubsub) -> None:
+        """Diff the desired subscriptions against the current ones and apply."""
+        channels, patterns = self._desired()
+        # subscribe before unsubscribing so a switch between "all" and
+        # per-device mode never leaves a gap
+        if channels - self._channels:
+            await pubsub.subscribe(*(channels - self._channels))
+        if patterns - self._patterns:
+            await pubsub.psubscribe(*(patterns - self._patterns))
+        if self._channels - channels:
+            await pubsub.unsubscribe(*(self._channels - channels))
+        if self._patterns - patterns:
+            await pubsub.punsubscribe(*(self._patterns - patterns))
+        if (channels, patterns) != (self._channels, self._patterns):
+            logger.info(
+                "Telemetry pubsub: %d channel(s), pattern(s) %s",
+                len(channels), sorted(patterns) or "none",
+            )
+        self._channels, self._patterns = channels, patterns
+
+    async def dispatch(self, msg: dict) -> None:
+        if msg.get("type") not in ("pmessage", "message"):
+            return
+        channel = msg.get("channel")
+        data = msg.get("data")
+        if not channel or data is None:
+            return
+        # skip global channel to avoid dupes (we only handle device channels)
+        if channel == "telemetry:all":
+            return
+        self.messages_received += 1
+        metrics.PUBSUB_MESSAGES.inc()
+        # tasks.py publishes JSON strings; parse
+        try:
+            payload = json.loads(data) if isinstance(data, str) else data
+        except Exception:
+            metrics.DROPPED_MESSAGES.labels(reason="invalid_json").inc()
+            logger.exception("Invalid JSON in pubsub message on %s", channel)
+            return
+
+        device_id = None
+        if isinstance(channel, str) and channel.startswith(_CHANNEL_PREFIX):
+            device_id = channel[len(_CHANNEL_PREFIX):]
+        try:
+            await self.manager.broadcast(device_id, payload)
+        except Exception:
+            logger.exception("Error broadcasting telemetry for device %s", device_id)
+
+    async def _listen(self, pubsub) -> None:
+        self.manager.consume_interest_changed()
+        await self.sync_subscriptions(pubsub)
+        while True:
+            if not (self._channels or self._patterns):
+                # nothing to listen to: park until a viewer shows up
+                if await self.manager.wait_interest_changed(timeout=5.0):
+                    await self.sync_subscriptions(pubsub)
+                continue
+            msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.poll_timeout)
+            if msg:
+                await self.dispatch(msg)
+            if self.manager.consume_interest_changed():
+                await self.sync_subscriptions(pubsub)
+
+    async def run(self) -> None:
+        backoff = 1.0
+        retries = 0
+        pubsub = None
+        try:
+            while retries < self.max_retries:
+                try:
+                    logger.info("Telemetry pubsub: connecting to Redis...")
+                    # the pubsub holds one connection from the shared pool
+                    pubsub = (self.redis_client or get_async_redis()).pubsub(ignore_subscribe_messages=True)
+                    self._channels, self._patterns = set(), set()
+                    await self._listen(pubsub)
+                except asyncio.CancelledError:
+                    logger.info("Telemetry pubsub: cancelled")
+                    raise
+                except Exception:
+                    logger.exception("Telemetry pubsub: connection error; reconnecting in %.1fs", backoff)
+                    retries += 1
+                    logger.exception(f"Redis connection error (Attempt {retries}/{self.max_retries})")
+                    if retries >= self.max_retries:
+                        logger.error("Max retries reached, giving up.")
+                        break
                     try:
-                        payload = json.loads(data) if isinstance(data, str) else data
+                        if pubsub is not None:
+                            await pubsub.reset()
                     except Exception:
-                        logger.exception("Invalid JSON in pubsub message on %s", channel)
-                        continue
-
-                    # skip global channel to avoid dupes (we only handle device channels)
-                    if channel == "telemetry:all":
-                        continue
-
-                    if isinstance(channel, str) and channel.startswith("telemetry:"):
-                        device_id = channel.split(":", 1)[1]
-                        try:
-                            await manager.broadcast(device_id, payload)
-                        except Exception:
-                            logger.exception("Error broadcasting telemetry for device %s", device_id)
-                    else:
-                        try:
-                            await manager.broadcast(None, payload)
-                        except Exception:
-                            logger.exception("Error broadcasting telemetry (global)")
-                logger.warning("Telemetry pubsub: listen loop exited, reconnecting...")
-            
-            
-            except asyncio.CancelledError:
-                logger.info("Telemetry pubsub: cancelled")
-                raise
+                        pass
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+        finally:
+            try:
+                if pubsub is not None:
+                    await pubsub.reset()
             except Exception:
-                logger.exception("Telemetry pubsub: connection error; reconnecting in %.1fs", backoff)
-                retries += 1
-                logger.exception(f"Redis connection error (Attempt {retries}/{max_retries})")
-                if retries >= max_retries:
-                    logger.error("Max retries reached, giving up.")
-                    break
-                try:
-                    if _pubsub_redis is not None:
-                        await _pubsub_redis.close()
-                except Exception:
-                    pass
-                await asyncio.sleep(backoff)
-                backoff = min(backoff * 2, 30.0)
-    finally:
-        try:
-            if _pubsub_redis is not None:
-                await _pubsub_redis.close()
-        except Exception:
-            pass
-        logger.info("Telemetry pubsub: stopped")
+                pass
+            logger.info("Telemetry pubsub: stopped")
+
 
 async def start_telemetry_pubsub_listener(app):
     """Call on FastAPI startup"""
-    global _pubsub_task
+    global _pubsub_task, _hub
     if _pubsub_task is None:
-        _pubsub_task = asyncio.create_task(_redis_pubsub_loop())
+        manager.bind_loop()
+        _hub = TelemetryPubSubHub(manager)
+        _pubsub_task = asyncio.create_task(_hub.run(), name="telemetry-pubsub")
         app.state.telemetry_pubsub_task = _pubsub_task
         logger.info("Telemetry pubsub listener started")
 
 async def stop_telemetry_pubsub_listener():
     """Call on shutdown"""
-    global _pubsub_task
+    global _pubsub_task, _hub
     if _pubsub_task:
         _pubsub_task.cancel()
         try:
@@ -435,4 +771,5 @@ async def stop_telemetry_pubsub_listener():
         except asyncio.CancelledError:
             pass
         _pubsub_task = None
-        logger.info("Telemetry pubsub listener stopped")
\ No newline at end of file
+        _hub = None
+        logger.info("Telemetry pubsub listener stopped")
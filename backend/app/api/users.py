@@ -6,8 +6,11 @@ from app.db.session import get_db
 from app.schemas.user import UserOut, UserCreate, UserUpdate
 from app.crud import users as crud_users
 from app.deps.auth import get_current_user  # returns user model or schema
-from app.models import User as UserModel
+from app.core.principals import PrincipalPublishError
 from app.core.security import hash_password
+from datetime import datetime
+from uuid import UUID
+import base64
 
 router = APIRouter()
 
@@ -19,16 +22,41 @@ def get_counts(db: Session = Depends(get_db), current=Depends(get_current_user))
         raise HTTPException(status_code=403, detail="Requires admin")
     return crud_users.counts(db)
 
-# List with pagination & filters
+def _encode_cursor(user) -> str:
+    raw = f"{user.created_at.isoformat()}|{user.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, user_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), UUID(user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# List with keyset pagination & filters
 @router.get("/api/v1/users")
-def list_users(query: Optional[str] = None, role: Optional[str] = None, status: Optional[str] = None, page: int = 1, per_page: int = 25, db: Session = Depends(get_db), current=Depends(get_current_user)):
+def list_users(query: Optional[str] = None, role: Optional[str] = None, status: Optional[str] = None, page: int = 1, per_page: int = 25, cursor: Optional[str] = None, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    """
+    Pass ``next_cursor`` back as ``cursor`` to page; ``page`` is kept for old
+    clients but costs an OFFSET scan. ``total`` stops at crud COUNT_CAP
+    (``total_capped`` tells the UI to show "N+").
+    """
     if current.role != "Administrador":
         # you could allow operators to list only their team etc.
         raise HTTPException(status_code=403, detail="Requires admin")
 
-    offset = (page - 1) * per_page
-    rows, total = crud_users.list_users(db, query=query, role=role, status=status, offset=offset, limit=per_page)
-    return {"users": rows, "total": total}
+    per_page = max(1, min(per_page, 200))
+    after = _decode_cursor(cursor) if cursor else None
+    offset = 0 if after else (max(page, 1) - 1) * per_page
+    rows, total, capped = crud_users.list_users(db, query=query, role=role, status=status, offset=offset, limit=per_page, after=after)
+    next_cursor = _encode_cursor(rows[-1]) if len(rows) == per_page and rows[-1].created_at else None
+    return {
+        "users": [UserOut.model_validate(u) for u in rows],
+        "total": total,
+        "total_capped": capped,
+        "next_cursor": next_cursor,
+    }
 
 # Create user (admin)
 @router.post("/api/v1/users", response_model=UserOut)
@@ -66,5 +94,9 @@ def patch_user(user_id: str, payload: UserUpdate, db: Session = Depends(get_db),
     update_fields = payload.dict(exclude_unset=True)
     if ("role" in update_fields or "status" in update_fields) and current.role != "Administrador":
         raise HTTPException(status_code=403, detail="Only admin can change role/status")
-    updated = crud_users.update_user(db, user, **update_fields)
+    try:
+        updated = crud_users.update_user(db, user, **update_fields)
+    except PrincipalPublishError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Could not apply role/status change, retry shortly",
+                            headers={"Retry-After": "1"})
     return updated
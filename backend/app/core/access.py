@@ -0,0 +1,291 @@
+# app/core/access.py
+"""
+Per-user device access index, so authorization is a set lookup instead of
+an ownership/grant join on every read and WebSocket subscribe.
+
+A user sees a device when they own it (``Device.owner_id``), or a
+``device_grants`` row gives it (or its field) to the user or to the user's
+role.  Administrators see everything and have no index.
+
+The resolved ids live in ``acl:user:<id>``, a Redis set with a sentinel
+member so "built but empty" is distinguishable from "not built".  It is
+built lazily from one UNION query the first time it is needed, and only
+created if absent, so a slow build cannot overwrite a newer one.  Grant
+changes only touch the affected users:
+
+  * something became visible  -> ``SADD`` to the users whose set exists
+  * something may have gone   -> the users' sets are dropped and rebuilt
+                                 on next use (another grant may still cover
+                                 the device, so a plain ``SREM`` is wrong)
+
+Every grant change also bumps the user's generation counter
+``acl:gen:<id>``.  A build reads the counter before its query and only
+stores its result if the counter is unchanged, so a grant or revoke that
+lands while a build is running cannot be overwritten by the stale result.
+
+An in-process TTL cache sits in front of Redis, like the principal cache:
+other processes see a change up to ``ACL_LOCAL_TTL_S`` late.  Without Redis
+the index is computed from the database.  A grant change that cannot reach
+Redis fails closed: the process reads those users from the database and
+retries dropping their sets on every later index load until it succeeds.
+"""
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, union
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.db import models
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ROLE = "Administrador"
+_KEY = "acl:user:{}"
+_GEN = "acl:gen:{}"
+_BUILT = "*"
+
+# KEYS: user sets, then their generations; ARGV: ttl, device ids.  Only sets
+# that were built get the ids; every generation is bumped, so a build that
+# started before the grant cannot store a set without it.
+ADD_LUA = """
+local n = #KEYS / 2
+local added = 0
+for i = 1, n do
+  if redis.call('EXISTS', KEYS[i]) == 1 then
+    redis.call('SADD', KEYS[i], unpack(ARGV, 2))
+    added = added + 1
+  end
+  redis.call('INCR', KEYS[n + i])
+  redis.call('EXPIRE', KEYS[n + i], tonumber(ARGV[1]))
+end
+return added
+"""
+
+# KEYS: user set, generation; ARGV: generation read before the build, ttl, ids...
+# Creates the set only if nobody did meanwhile and no revoke happened since.
+FILL_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then return 0 end
+redis.call('SADD', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+def is_admin(principal) -> bool:
+    return principal.role == ADMIN_ROLE
+
+
+# ---------- database side ----------
+def _subject_clause(user_id, role: str):
+    G = models.DeviceGrant
+    return or_(
+        and_(G.subject_type == "user", G.subject == str(user_id)),
+        and_(G.subject_type == "role", G.subject == role),
+    )
+
+
+def accessible_device_ids(db: Session, user_id, role: str) -> set[str]:
+    """Owned devices plus device and field grants of the user or their role (one query)."""
+    D, G = models.Device, models.DeviceGrant
+    subject = _subject_clause(user_id, role)
+    stmt = union(
+        select(D.id).where(D.owner_id == user_id),
+        select(G.scope_id).where(G.scope_type == "device", subject),
+        select(D.id).join(G, and_(G.scope_type == "field", G.scope_id == D.field_id)).where(subject),
+    )
+    return {str(r[0]) for r in db.execute(stmt)}
+
+
+def grant_users(db: Session, subject_type: str, subject: str) -> list[str]:
+    """Users a grant subject stands for."""
+    if subject_type == "user":
+        return [subject]
+    return [str(u) for u in db.execute(select(models.User.id).where(models.User.role == subject)).scalars()]
+
+
+def scope_devices(db: Session, scope_type: str, scope_id) -> list[str]:
+    """Devices a grant scope covers."""
+    if scope_type == "device":
+        return [str(scope_id)]
+    D = models.Device
+    return [str(d) for d in db.execute(select(D.id).where(D.field_id == scope_id)).scalars()]
+
+
+def field_grant_users(db: Session, field_ids: Iterable) -> list[str]:
+    """Users holding a grant (directly or by role) on any of ``field_ids``."""
+    ids = [f for f in field_ids if f is not None]
+    if not ids:
+        return []
+    G = models.DeviceGrant
+    users: set[str] = set()
+    rows = db.execute(select(G.subject_type, G.subject).where(G.scope_type == "field", G.scope_id.in_(ids)).distinct())
+    for subject_type, subject in rows:
+        users.update(grant_users(db, subject_type, subject))
+    return sorted(users)
+
+
+# ---------- index ----------
+class AccessIndex:
+    def __init__(self, redis_client=None):
+        self._redis_client = redis_client
+        self._local: dict[str, tuple[frozenset, float]] = {}
+        self._lock = threading.Lock()
+        self._add = None
+        self._fill = None
+        self._pending: set[str] = set()      # users whose set could not be dropped yet
+
+    @property
+    def redis(self):
+        return self._redis_client or get_sync_redis()
+
+    def _scripts(self):
+        if self._add is None:
+            self._add = self.redis.register_script(ADD_LUA)
+            self._fill = self.redis.register_script(FILL_LUA)
+        return self._add, self._fill
+
+    def forget_local(self, user_ids: Iterable[str]) -> None:
+        with self._lock:
+            for u in user_ids:
+                self._local.pop(str(u), None)
+
+    def allowed(self, principal, db: Optional[Session] = None) -> Optional[frozenset]:
+        """Device ids the principal may read, or ``None`` for "all" (admins)."""
+        if is_admin(principal):
+            return None
+        uid = str(principal.id)
+        hit = self._local.get(uid)
+        if hit and hit[1] > time.monotonic():
+            return hit[0]
+        ids = self._load(uid, principal.role, db)
+        with self._lock:
+            if len(self._local) >= settings.ACL_LOCAL_SIZE:
+                self._local.clear()
+            self._local[uid] = (ids, time.monotonic() + settings.ACL_LOCAL_TTL_S)
+        return ids
+
+    def _load(self, uid: str, role: str, db: Optional[Session]) -> frozenset:
+        self._retry_pending()
+        if uid in self._pending:
+            return frozenset(self._compute(uid, role, db))
+        key, gen_key = _KEY.format(uid), _GEN.format(uid)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.smembers(key)
+            pipe.get(gen_key)
+            members, gen = pipe.execute()
+        except Exception:
+            logger.warning("Access index: Redis unavailable, reading grants from DB", exc_info=True)
+            return frozenset(self._compute(uid, role, db))
+        if members:
+            return frozenset(m.decode() if isinstance(m, bytes) else m for m in members) - {_BUILT}
+        gen = gen.decode() if isinstance(gen, bytes) else (gen or "0")
+        ids = self._compute(uid, role, db)
+        try:
+            _, fill = self._scripts()
+            fill(keys=[key, gen_key], args=[gen, settings.ACL_TTL_S, _BUILT, *ids], client=self.redis)
+        except Exception:
+            logger.warning("Access index: could not store set for user %s", uid, exc_info=True)
+        return frozenset(ids)
+
+    @staticmethod
+    def _compute(uid: str, role: str, db: Optional[Session]) -> set[str]:
+        if db is not None:
+            return accessible_device_ids(db, UUID(uid), role)
+        own = SessionLocal()
+        try:
+            return accessible_device_ids(own, UUID(uid), role)
+        finally:
+            own.close()
+
+    def can_read(self, principal, device_id, db: Optional[Session] = None) -> bool:
+        ids = self.allowed(principal, db)
+        return ids is None or str(device_id) in ids
+
+    # ----- grant changes (call after commit; they never raise) -----
+    def added(self, user_ids: list[str], device_ids: list[str]) -> None:
+        """``device_ids`` became visible to ``user_ids``."""
+        if not user_ids or not device_ids:
+            return
+        try:
+            add, _ = self._scripts()
+            add(keys=[*(_KEY.format(u) for u in user_ids), *(_GEN.format(u) for u in user_ids)],
+                args=[settings.ACL_TTL_S, *device_ids], client=self.redis)
+        except Exception:
+            logger.warning("Access index: could not add devices, dropping sets instead", exc_info=True)
+            self.revoked(user_ids)
+            return
+        self.forget_local(user_ids)
+
+    def revoked(self, user_ids: Iterable[str]) -> None:
+        """Access of ``user_ids`` may have shrunk: rebuild their sets on next use."""
+        users = [str(u) for u in user_ids]
+        if not users:
+            return
+        self.forget_local(users)
+        try:
+            self._drop(users)
+        except Exception:
+            logger.error("Access index: could not drop sets of %s, reading them from DB until it works",
+                         users, exc_info=True)
+            with self._lock:
+                self._pending.update(users)
+
+    def _drop(self, users: list[str]) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        for u in users:
+            pipe.delete(_KEY.format(u))
+            pipe.incr(_GEN.format(u))
+            pipe.expire(_GEN.format(u), settings.ACL_TTL_S)
+        pipe.execute()
+
+    def _retry_pending(self) -> None:
+        if not self._pending:
+            return
+        with self._lock:
+            users = sorted(self._pending)
+        try:
+            self._drop(users)
+        except Exception:
+            return
+        with self._lock:
+            self._pending.difference_update(users)
+        logger.info("Access index: dropped pending sets of %s", users)
+
+
+_index: Optional[AccessIndex] = None
+
+
+def get_access_index() -> AccessIndex:
+    global _index
+    if _index is None:
+        _index = AccessIndex()
+    return _index
+
+
+def require_device(principal, device_id, db: Optional[Session] = None) -> None:
+    """403 unless the principal may read ``device_id``."""
+    if not get_access_index().can_read(principal, device_id, db):
+        raise HTTPException(status_code=403, detail="No access to device")
+
+
+def visible(principal, items: Iterable, db: Optional[Session] = None, key=None) -> list:
+    """The ``items`` (device ids, or rows with ``key(row)`` -> id) the principal may read, order kept."""
+    ids = get_access_index().allowed(principal, db)
+    if ids is None:
+        return list(items)
+    key = key or (lambda item: item)
+    return [item for item in items if str(key(item)) in ids]
+
+
+def revoke_user_access(user_id) -> None:
+    """Role change: drop the user's index."""
+    get_access_index().revoked([str(user_id)])
@@ -3,6 +3,10 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_URL: str = "redis://redis:6379/0"
+    # per-process pool sizing (app/core/redis.py); one async + one sync pool
+    REDIS_MAX_CONNECTIONS: int = 32
+    REDIS_POOL_TIMEOUT_S: float = 5.0
+    REDIS_CONNECT_TIMEOUT_S: float = 5.0
     MINIO_ENDPOINT: str
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
@@ -15,10 +19,108 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # password hashing: cost and the pool that keeps it off the event loop
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    # in-process principal cache in front of Redis (see core/principals.py)
+    PRINCIPAL_CACHE_LOCAL_TTL_S: float = 5.0
+    PRINCIPAL_CACHE_LOCAL_SIZE: int = 10000
     # cookie settings (set secure=True in production with https)
     COOKIE_SECURE: bool = False
     COOKIE_SAMESITE: str = "lax"
     COOKIE_PATH: str = "/api/auth"
+    # image pipeline (longest edge in px per derived rendition)
+    IMAGE_DERIVED_SIZES: dict[str, int] = {"preview": 1280, "thumb": 256}
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PROCESS_WORKERS: int = 2
+    IMAGE_PROCESS_TIMEOUT_S: float = 120.0
+    IMAGE_ANALYSIS_TILE: int = 512
+    IMAGE_ANALYSIS_MAX_EDGE: int = 2048      # JPEGs are analysed at a draft scale covering this
+    IMAGE_CANOPY_EXG_THRESHOLD: float = 0.1
+    UPLOAD_URL_EXPIRE_S: int = 3600
+    MAX_UPLOAD_BATCH: int = 1000
+    DOWNLOAD_URL_EXPIRE_S: int = 3600
+    DOWNLOAD_URL_REUSE_MARGIN_S: int = 300
+    DOWNLOAD_URL_CACHE_SIZE: int = 20000
+    # sampled ingest -> WebSocket traces (core/tracing.py); 0 disables
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_EXPORTER: str = "none"   # none | stdout | file
+    TRACE_FILE: str = "/tmp/crop-traces/spans.jsonl"
+    # alert rules (workers/alerts.py): how often a worker checks for rule changes
+    ALERT_RULES_REFRESH_S: float = 5.0
+    # streaming anomaly detectors (workers/anomaly.py): EWMA z-score + stuck sensor
+    ANOMALY_ENABLED: bool = True
+    ANOMALY_EWMA_ALPHA: float = 0.05
+    ANOMALY_Z_THRESHOLD: float = 4.0
+    ANOMALY_WARMUP: int = 30
+    ANOMALY_RESET_GAP_S: float = 6 * 3600
+    ANOMALY_STUCK_S: float = 3600
+    ANOMALY_STUCK_MIN_COUNT: int = 10
+    ANOMALY_SEVERITY: str = "Media"
+    ANOMALY_COOLDOWN_S: int = 3600
+    # daily agronomic indicators (workers/indicators.py); days are local to INDICATORS_TZ
+    INDICATORS_ENABLED: bool = True
+    INDICATORS_TZ: str = "America/Lima"
+    INDICATORS_MAX_GAP_S: float = 900
+    INDICATORS_FROST_C: float = 0.0
+    INDICATORS_MIN_COVERAGE: float = 0.8
+    INDICATORS_RECOMPUTE_DELAY_S: int = 60
+    INDICATORS_GDD_BASE_C: float = 10.0
+    INDICATORS_GDD_CAP_C: float = 30.0
+    SITE_LATITUDE_DEG: float = -7.49
+    SITE_ELEVATION_M: float = 100.0
+    WIND_SENSOR_HEIGHT_M: float = 2.0
+    # fleet health (workers/fleet.py): per-device state in Redis, offline sweep via celery beat
+    HEALTH_ENABLED: bool = True
+    HEALTH_RATE_TAU_S: float = 900
+    HEALTH_EWMA_ALPHA: float = 0.05
+    HEALTH_GAP_S: float = 300
+    HEALTH_BATTERY_TREND_S: float = 1800
+    HEALTH_TREND_ALPHA: float = 0.3
+    HEALTH_STALE_S: float = 300
+    HEALTH_OFFLINE_S: float = 900
+    HEALTH_SWEEP_S: float = 60
+    HEALTH_OFFLINE_SEVERITY: str = "Alta"
+    HEALTH_OFFLINE_COOLDOWN_S: int = 6 * 3600
+    # ingest admission control (core/ratelimit.py): token buckets in Redis, per device and global
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEVICE_RATE: float = 1.0      # readings per second
+    RATE_LIMIT_DEVICE_BURST: float = 60
+    RATE_LIMIT_BY_TYPE: dict[str, tuple[float, float]] = {}   # device_type -> (rate, burst), JSON in env
+    RATE_LIMIT_GLOBAL_RATE: float = 1000
+    RATE_LIMIT_GLOBAL_BURST: float = 5000
+    RATE_LIMIT_LEASE_MAX: int = 10
+    RATE_LIMIT_LEASE_HEADROOM: float = 0.5   # lease only while both buckets stay above this share of burst
+    RATE_LIMIT_LEASE_TTL_S: float = 1.0
+    RATE_LIMIT_LOCAL_SIZE: int = 10000
+    # batched ingest (POST /api/v1/telemetry/batch, optionally gzip-encoded)
+    TELEMETRY_BATCH_MAX: int = 500
+    TELEMETRY_BATCH_MAX_BYTES: int = 4_000_000   # decoded body
+    # device access index (core/access.py): Redis set per user, local TTL cache in front
+    ACL_TTL_S: int = 6 * 3600
+    ACL_LOCAL_TTL_S: float = 5.0
+    ACL_LOCAL_SIZE: int = 10000
+    ACL_WS_RECHECK_S: float = 5.0   # open /ws/live sockets follow grant changes this often
+    # map endpoints (api/geo.py): in-process grid index, reloaded when geo:version changes
+    GEO_GRID_CELL_DEG: float = 0.01
+    GEO_REFRESH_S: float = 5
+    GEO_MAX_AGE_S: float = 300
+    GEO_MAX_FEATURES: int = 5000
+    # field heatmaps (api/heatmap.py): IDW grid, per-process LRU/TTL tile cache
+    HEATMAP_IDW_POWER: float = 2.0
+    HEATMAP_MAX_PX: int = 512
+    HEATMAP_LATEST_MAX_AGE_S: float = 3600
+    HEATMAP_CACHE_SIZE: int = 256
+    HEATMAP_CACHE_TTL_S: float = 300
+    # request profiling (core/profiling.py); off = no middleware, no SQL hooks
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: str = ""          # "X-Profile: <token>" samples that request; empty disables the header
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_S: float = 0.005
+    PROFILING_DIR: str = "/tmp/crop-profiles"
+    PROFILING_SLOW_SQL_MS: float = 100.0
+    PROFILING_N_PLUS_ONE: int = 10     # same statement this many times in one request
 
     class Config:
         env_file = ".env"
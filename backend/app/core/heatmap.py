@@ -0,0 +1,150 @@
+# app/core/heatmap.py
+"""
+Field heatmaps: inverse-distance-weighted (IDW) interpolation of sensor
+readings onto a regular lon/lat grid, clipped to the field polygon.
+
+NumPy and Pillow are imported here at module level, so the API imports this
+module inside the heatmap handler only; neither is loaded at API start-up
+(test/test_import_time.py checks both).
+
+The grid covers the field's bounding box at roughly the ground resolution
+of web-map zoom ``z`` (capped at ``HEATMAP_MAX_PX`` per side).  Distances are
+measured in local metres (equirectangular around the field centre, which is
+exact enough at field scale).  The weight matrix is built in row chunks of
+at most ``_CHUNK`` cells x samples, so memory stays bounded for big grids.
+"""
+import io
+import math
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+_M_PER_DEG_LAT = 110_540.0
+_M_PER_DEG_LON = 111_320.0
+# web-mercator metres per pixel at zoom 0 on the equator
+_MPP_Z0 = 156_543.03392
+_CHUNK = 4_000_000
+
+# blue -> cyan -> green -> yellow -> red
+_STOPS = np.array([
+    [0.00, 49, 54, 149],
+    [0.25, 69, 187, 214],
+    [0.50, 102, 189, 99],
+    [0.75, 253, 219, 84],
+    [1.00, 215, 48, 39],
+])
+
+
+def _lut() -> np.ndarray:
+    x = np.linspace(0.0, 1.0, 256)
+    return np.stack([np.interp(x, _STOPS[:, 0], _STOPS[:, c]) for c in (1, 2, 3)], axis=1).astype(np.uint8)
+
+
+LUT = _lut()
+
+
+@dataclass
+class Raster:
+    values: np.ndarray          # float32 (height, width), row 0 = north, NaN outside the field
+    bbox: tuple                 # (min_lon, min_lat, max_lon, max_lat)
+    vmin: float
+    vmax: float
+    samples: int
+
+
+def grid_shape(bbox: tuple, zoom: int, max_px: int, min_px: int = 8) -> tuple[int, int]:
+    """(height, width) of the grid for ``bbox`` at web-map zoom ``zoom``."""
+    lat0 = math.radians((bbox[1] + bbox[3]) / 2)
+    width_m = (bbox[2] - bbox[0]) * _M_PER_DEG_LON * math.cos(lat0)
+    height_m = (bbox[3] - bbox[1]) * _M_PER_DEG_LAT
+    mpp = _MPP_Z0 * math.cos(lat0) / 2 ** zoom
+    w, h = max(width_m / mpp, 1.0), max(height_m / mpp, 1.0)
+    scale = min(1.0, max_px / max(w, h))
+    return (max(min_px, round(h * scale)), max(min_px, round(w * scale)))
+
+
+def cell_centres(bbox: tuple, shape: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """Lon of each column and lat of each row (north first)."""
+    h, w = shape
+    dx, dy = (bbox[2] - bbox[0]) / w, (bbox[3] - bbox[1]) / h
+    lons = bbox[0] + dx * (np.arange(w) + 0.5)
+    lats = bbox[3] - dy * (np.arange(h) + 0.5)
+    return lons, lats
+
+
+def polygon_mask(geometry: dict, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Boolean (rows, cols) grid: cell centre inside the (Multi)Polygon, holes excluded."""
+    X, Y = np.meshgrid(lons, lats)
+    polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    inside = np.zeros(X.shape, dtype=bool)
+    for rings in polygons:
+        poly = np.zeros(X.shape, dtype=bool)
+        # even-odd over every ring makes holes fall out
+        for ring in rings:
+            r = np.asarray(ring, dtype=np.float64)[:, :2]
+            xi, yi = r[:, 0], r[:, 1]
+            xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+            for k in range(len(r)):
+                if yi[k] == yj[k]:
+                    continue
+                crosses = (yi[k] > Y) != (yj[k] > Y)
+                x_at = (xj[k] - xi[k]) * (Y - yi[k]) / (yj[k] - yi[k]) + xi[k]
+                poly ^= crosses & (X < x_at)
+        inside |= poly
+    return inside
+
+
+def idw(sx: np.ndarray, sy: np.ndarray, sv: np.ndarray, gx: np.ndarray, gy: np.ndarray,
+        power: float = 2.0) -> np.ndarray:
+    """IDW of samples ``(sx, sy, sv)`` at flat grid points ``(gx, gy)``; same units for both.
+
+    A grid point that coincides with a sample takes its value exactly.
+    """
+    out = np.empty(gx.shape, dtype=np.float64)
+    step = max(1, _CHUNK // max(1, sx.size))
+    for a in range(0, gx.size, step):
+        d2 = (gx[a:a + step, None] - sx[None, :]) ** 2 + (gy[a:a + step, None] - sy[None, :]) ** 2
+        with np.errstate(divide="ignore"):
+            w = d2 ** (-power / 2)
+        hit = np.isinf(w)
+        exact = hit.any(axis=1)
+        w[exact] = hit[exact]
+        out[a:a + step] = (w @ sv) / w.sum(axis=1)
+    return out
+
+
+def interpolate(geometry: dict, bbox: tuple, samples: list[tuple[float, float, float]],
+                zoom: int, max_px: int, power: float = 2.0) -> Raster:
+    """Grid of ``samples`` (lon, lat, value) over ``bbox``, clipped to ``geometry``."""
+    shape = grid_shape(bbox, zoom, max_px)
+    lons, lats = cell_centres(bbox, shape)
+    lon0, lat0 = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    kx, ky = _M_PER_DEG_LON * math.cos(math.radians(lat0)), _M_PER_DEG_LAT
+
+    s = np.asarray(samples, dtype=np.float64).reshape(-1, 3)
+    mask = polygon_mask(geometry, lons, lats)
+    X, Y = np.meshgrid((lons - lon0) * kx, (lats - lat0) * ky)
+    values = np.full(shape, np.nan, dtype=np.float32)
+    values[mask] = idw((s[:, 0] - lon0) * kx, (s[:, 1] - lat0) * ky, s[:, 2], X[mask], Y[mask], power)
+    vmin, vmax = float(s[:, 2].min()), float(s[:, 2].max())
+    return Raster(values=values, bbox=tuple(bbox), vmin=vmin, vmax=vmax, samples=len(s))
+
+
+def to_png(raster: Raster, vmin: float, vmax: float, alpha: int = 190) -> bytes:
+    """RGBA PNG of the grid; cells outside the field are transparent."""
+    span = vmax - vmin if vmax > vmin else 1.0
+    v = raster.values
+    inside = ~np.isnan(v)
+    idx = np.clip((np.nan_to_num(v, nan=vmin) - vmin) / span * 255, 0, 255).astype(np.uint8)
+    rgba = np.zeros(v.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = LUT[idx]
+    rgba[..., 3] = np.where(inside, alpha, 0)
+    buf = io.BytesIO()
+    Image.fromarray(rgba, mode="RGBA").save(buf, format="PNG", optimize=False)
+    return buf.getvalue()
+
+
+def to_f32(raster: Raster) -> bytes:
+    """Row-major little-endian float32, NaN outside the field."""
+    return raster.values.astype("<f4", copy=False).tobytes()
@@ -0,0 +1,131 @@
+# app/core/metrics.py
+"""
+Prometheus metrics for the ingest -> worker -> pubsub -> WebSocket pipeline.
+
+Works across processes: when ``PROMETHEUS_MULTIPROC_DIR`` is set (it must be
+set before this module is imported, and shared by the API and Celery
+containers) every process writes its samples to mmap files in that directory
+and ``/metrics`` aggregates them with ``MultiProcessCollector``.  The
+directory is emptied once per deploy (compose ``migrate`` service) and every
+API / Celery process marks itself dead on exit, so live gauges of dead pids
+are not summed.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+
+_NS = "crop"
+_FAST = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_LAG = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# ---------- ingest (API) ----------
+INGEST_SECONDS = Histogram(
+    "ingest_request_seconds", "Telemetry ingest request latency by outcome",
+    ["outcome"], namespace=_NS, buckets=_FAST,
+)
+DEVICE_LOOKUP_SECONDS = Histogram(
+    "ingest_device_lookup_seconds", "Device row lookup during ingest", namespace=_NS, buckets=_FAST,
+)
+ENQUEUE_SECONDS = Histogram(
+    "ingest_enqueue_seconds", "Celery enqueue time during ingest", namespace=_NS, buckets=_FAST,
+)
+INGEST_BATCH_SIZE = Histogram(
+    "ingest_batch_readings", "Readings per accepted batch request", namespace=_NS,
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+RATE_LIMIT_DECISIONS = Counter(
+    "ingest_rate_limit_total", "Ingest admission decisions (admitted / admitted_local / limited_* / error)",
+    ["decision", "device_type"], namespace=_NS,
+)
+
+# ---------- worker ----------
+WORKER_INSERT_SECONDS = Histogram(
+    "worker_insert_seconds", "Measurement insert + commit latency", namespace=_NS, buckets=_FAST,
+)
+WORKER_RESULTS = Counter(
+    "worker_measurements_total", "Processed measurements by result", ["result"], namespace=_NS,
+)
+
+# ---------- end-to-end ----------
+PIPELINE_LAG_SECONDS = Histogram(
+    "pipeline_lag_seconds", "Lag from the reading's device timestamp to a pipeline stage",
+    ["stage"], namespace=_NS, buckets=_LAG,
+)
+
+# ---------- realtime fan-out ----------
+BROADCAST_SECONDS = Histogram(
+    "ws_broadcast_seconds", "Fan-out duration of one message to local sockets", namespace=_NS, buckets=_FAST,
+)
+WS_CONNECTIONS = Gauge(
+    "ws_connections", "Live viewer WebSockets", ["scope"], namespace=_NS, multiprocess_mode="livesum",
+)
+PUBSUB_MESSAGES = Counter(
+    "pubsub_messages_total", "Redis pubsub messages received by this API process", namespace=_NS,
+)
+DROPPED_MESSAGES = Counter(
+    "dropped_messages_total", "Messages dropped in the realtime path", ["reason"], namespace=_NS,
+)
+QUEUE_DEPTH = Gauge(
+    "celery_queue_depth", "Pending Celery messages per queue (sampled at scrape)", ["queue"],
+    namespace=_NS, multiprocess_mode="mostrecent",
+)
+
+# ---------- shared resources ----------
+PASSWORD_HASH_QUEUE_SECONDS = Histogram(
+    "password_hash_queue_seconds", "Wait for a password hash worker", namespace=_NS, buckets=_FAST,
+)
+REDIS_POOL_WAIT_SECONDS = Histogram(
+    "redis_pool_wait_seconds", "Wait to acquire a pooled Redis connection", ["pool"], namespace=_NS, buckets=_FAST,
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Pooled Redis connections by state", ["pool", "state"],
+    namespace=_NS, multiprocess_mode="livesum",
+)
+
+# ---------- map (API) ----------
+HEATMAP_CACHE = Counter(
+    "heatmap_cache_total", "Field heatmap requests by tile cache result", ["result"], namespace=_NS,
+)
+HEATMAP_RENDER_SECONDS = Histogram(
+    "heatmap_render_seconds", "Interpolate + encode time of one field heatmap", namespace=_NS, buckets=_FAST,
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - t0)
+
+
+def observe_lag(stage: str, reading_time) -> None:
+    """Record now minus a reading's timestamp (datetime or epoch seconds)."""
+    if reading_time is None:
+        return
+    ts = reading_time if isinstance(reading_time, (int, float)) else reading_time.timestamp()
+    PIPELINE_LAG_SECONDS.labels(stage=stage).observe(max(time.time() - ts, 0.0))
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Exposition payload for ``/metrics`` (aggregated across processes if configured)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop a finished process's live gauges (Celery child / server worker exit)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,148 @@
+# app/core/principals.py
+"""
+Authenticated principal resolution without a `users` query per request.
+
+Access tokens carry ``role`` and ``st`` (status) as signed claims.  Whenever
+an admin changes a user's role or status, ``publish_principal`` writes the new
+values to ``principal:<id>`` in Redis with a TTL equal to the access-token
+lifetime, before the change is committed (no record, no change).  So for any
+still-valid token:
+
+  * a Redis record exists  -> the user changed since (some) tokens were
+    issued; the record is authoritative
+  * no record              -> nothing changed during the token's lifetime;
+    the claims are current
+
+A small in-process TTL cache sits in front of Redis; other processes may see a
+change up to ``PRINCIPAL_CACHE_LOCAL_TTL_S`` late.
+"""
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+_KEY = "principal:{}"
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: UUID
+    role: str
+    status: str
+    name: Optional[str] = None
+    email: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(id=user.id, role=user.role, status=user.status or "activo", name=user.name, email=user.email)
+
+    @classmethod
+    def from_claims(cls, claims: dict) -> Optional["Principal"]:
+        if not claims.get("role") or not claims.get("st"):
+            return None
+        return cls(id=UUID(claims["sub"]), role=claims["role"], status=claims["st"])
+
+    def to_json(self) -> str:
+        d = asdict(self)
+        d["id"] = str(self.id)
+        return json.dumps(d)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Principal":
+        d = json.loads(raw)
+        d["id"] = UUID(d["id"])
+        return cls(**d)
+
+
+# ---------- in-process layer ----------
+_local: dict[str, tuple[Principal, float]] = {}
+_local_lock = threading.Lock()
+
+
+def _local_get(sub: str) -> Optional[Principal]:
+    hit = _local.get(sub)
+    if hit and hit[1] > time.monotonic():
+        return hit[0]
+    return None
+
+
+def _local_put(sub: str, principal: Principal) -> None:
+    with _local_lock:
+        if len(_local) >= settings.PRINCIPAL_CACHE_LOCAL_SIZE:
+            _local.clear()
+        _local[sub] = (principal, time.monotonic() + settings.PRINCIPAL_CACHE_LOCAL_TTL_S)
+
+
+def forget_local(sub: str) -> None:
+    with _local_lock:
+        _local.pop(str(sub), None)
+
+
+# ---------- Redis layer ----------
+def _record_ttl() -> int:
+    return settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+
+async def resolve_principal(claims: dict, redis_client, load_from_db) -> Optional[Principal]:
+    """
+    Resolve the principal for verified token ``claims``.
+
+    ``load_from_db`` is an awaitable factory returning a Principal (or None)
+    and is only called for tokens without role/status claims or when Redis is
+    unavailable.
+    """
+    sub = claims["sub"]
+    principal = _local_get(sub)
+    if principal is not None:
+        return principal
+
+    try:
+        raw = await redis_client.get(_KEY.format(sub))
+        redis_ok = True
+    except Exception:
+        logger.warning("Principal cache: Redis unavailable, falling back to DB", exc_info=True)
+        raw, redis_ok = None, False
+
+    if raw:
+        principal = Principal.from_json(raw)
+    elif redis_ok:
+        principal = Principal.from_claims(claims)
+
+    if principal is None:
+        principal = await load_from_db()
+        if principal is None:
+            return None
+        if redis_ok:
+            try:
+                # NX: a fill must never overwrite a change published meanwhile
+                await redis_client.set(_KEY.format(sub), principal.to_json(), ex=_record_ttl(), nx=True)
+            except Exception:
+                pass
+
+    _local_put(sub, principal)
+    return principal
+
+
+class PrincipalPublishError(Exception):
+    """A role/status change could not be written to Redis."""
+
+
+def publish_principal(principal: Principal) -> None:
+    """Make ``principal`` override the claims of tokens issued before a change.
+
+    ``crud.users.update_user`` calls this before it commits, so a change that
+    cannot be published is not made either.  Raises :class:`PrincipalPublishError`.
+    """
+    forget_local(str(principal.id))
+    try:
+        get_sync_redis().set(_KEY.format(principal.id), principal.to_json(), ex=_record_ttl())
+    except Exception as exc:
+        raise PrincipalPublishError(f"could not publish principal {principal.id}") from exc
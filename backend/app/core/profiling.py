@@ -0,0 +1,272 @@
+# app/core/profiling.py
+"""
+Opt-in request profiling: SQL accounting per request and an on-demand
+sampling profiler.
+
+Nothing here is installed unless ``PROFILING_ENABLED`` is set; with it off
+there is no middleware and no engine hook, so the cost is zero.  With it on:
+
+* every HTTP request gets a :class:`RequestProfile` in a context variable;
+  the engine hooks in ``app/db/session.py`` add each statement's duration to
+  it (the context is copied into the threadpool that runs sync endpoints, so
+  the hooks see the same object);
+* statements slower than ``PROFILING_SLOW_SQL_MS`` are kept, and a statement
+  text repeated ``PROFILING_N_PLUS_ONE`` times or more in one request is
+  flagged as a likely N+1 (a lazy load or a per-row query in a loop);
+* a request with ``X-Profile: <PROFILING_TOKEN>`` (or picked at
+  ``PROFILING_SAMPLE_RATE``) also runs the stack sampler and writes a
+  collapsed-stack file (``*.folded``, one ``frame;frame;frame count`` line
+  per stack) to ``PROFILING_DIR`` for flamegraph.pl, speedscope or inferno.
+
+Aggregates are per endpoint (route template, not the concrete path) and per
+process; ``GET /api/v1/admin/profiling`` returns them.  The sampler sees all
+busy threads of the process, so concurrent requests show up in the same
+profile; trigger it on a quiet replica when the picture matters.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+
+class RequestProfile:
+    """SQL activity of one request (filled by the engine hooks)."""
+    __slots__ = ("queries", "sql_seconds", "slow", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slow: list[tuple[str, float]] = []
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.statements[statement] += 1
+        if seconds * 1000 >= settings.PROFILING_SLOW_SQL_MS:
+            self.slow.append((statement, seconds))
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+# ---------- engine hooks (registered by app.db.session when enabled) ----------
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profiling_t0", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    starts = conn.info.get("profiling_t0")
+    if starts:
+        profile.record(statement, time.perf_counter() - starts.pop())
+
+
+def handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("profiling_t0"):
+        conn.info["profiling_t0"].pop()
+
+
+# ---------- sampling profiler ----------
+_STDLIB = sysconfig.get_paths()["stdlib"]
+# leaf functions of a thread that is parked, not working
+_IDLE_LEAVES = {"wait", "select", "poll", "epoll", "_worker", "get", "accept", "sleep", "_wait_for_tstate_lock"}
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_name in _IDLE_LEAVES and frame.f_code.co_filename.startswith(_STDLIB)
+
+
+def _collapse(frame, thread_name: str) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    frames.append(thread_name)
+    return ";".join(reversed(frames))
+
+
+class StackSampler:
+    """Samples every busy thread's stack every ``interval`` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me or _is_idle(frame):
+                    continue
+                self.stacks[_collapse(frame, names.get(tid, str(tid)))] += 1
+            self.samples += 1
+
+
+def write_folded(stacks: Counter, path: str) -> None:
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+# ---------- per-endpoint aggregates ----------
+class EndpointStats:
+    __slots__ = ("requests", "seconds_total", "seconds_max", "queries_total", "queries_max",
+                 "sql_seconds_total", "slow_statements", "n_plus_one", "profiles")
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+        self.queries_total = 0
+        self.queries_max = 0
+        self.sql_seconds_total = 0.0
+        self.slow_statements: deque = deque(maxlen=10)
+        self.n_plus_one: deque = deque(maxlen=10)
+        self.profiles: deque = deque(maxlen=10)
+
+    def to_dict(self) -> dict:
+        n = self.requests or 1
+        return {
+            "requests": self.requests,
+            "avg_ms": round(self.seconds_total / n * 1000, 3),
+            "max_ms": round(self.seconds_max * 1000, 3),
+            "avg_queries": round(self.queries_total / n, 2),
+            "max_queries": self.queries_max,
+            "avg_sql_ms": round(self.sql_seconds_total / n * 1000, 3),
+            "sql_share": round(self.sql_seconds_total / self.seconds_total, 3) if self.seconds_total else None,
+            "slow_statements": list(self.slow_statements),
+            "n_plus_one": list(self.n_plus_one),
+            "profiles": list(self.profiles),
+        }
+
+
+_stats: dict[str, EndpointStats] = {}
+_stats_lock = threading.Lock()
+# one sampler at a time: overlapping profiles would sample each other
+_sampler_lock = threading.Lock()
+
+
+def _observe(endpoint: str, seconds: float, profile: RequestProfile, profile_path: Optional[str]) -> None:
+    repeated = profile.repeated(settings.PROFILING_N_PLUS_ONE)
+    with _stats_lock:
+        s = _stats.get(endpoint)
+        if s is None:
+            s = _stats[endpoint] = EndpointStats()
+        s.requests += 1
+        s.seconds_total += seconds
+        s.seconds_max = max(s.seconds_max, seconds)
+        s.queries_total += profile.queries
+        s.queries_max = max(s.queries_max, profile.queries)
+        s.sql_seconds_total += profile.sql_seconds
+        for statement, secs in profile.slow:
+            s.slow_statements.append({"statement": statement, "ms": round(secs * 1000, 3)})
+        for statement, count in repeated:
+            s.n_plus_one.append({"statement": statement, "count": count})
+        if profile_path:
+            s.profiles.append(profile_path)
+    if repeated:
+        logger.warning("Possible N+1 in %s: %s", endpoint, ", ".join(f"{n}x {s[:80]!r}" for s, n in repeated))
+
+
+def endpoint_stats() -> dict:
+    with _stats_lock:
+        return {name: s.to_dict() for name, s in sorted(_stats.items())}
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def _endpoint_name(scope) -> str:
+    route = scope.get("route")
+    return f"{scope.get('method')} {getattr(route, 'path', None) or scope.get('path')}"
+
+
+def _wants_profile(scope) -> bool:
+    token = settings.PROFILING_TOKEN
+    if token:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return value.decode("latin-1") == token
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0.0 and random.random() < rate
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; see the module docstring."""
+
+    def __init__(self, app):
+        self.app = app
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        sampler = None
+        if _wants_profile(scope) and _sampler_lock.acquire(blocking=False):
+            sampler = StackSampler(settings.PROFILING_INTERVAL_S).start()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            endpoint = _endpoint_name(scope)
+            path = None
+            if sampler is not None:
+                try:
+                    stacks = sampler.stop()
+                    slug = re.sub(r"[^A-Za-z0-9]+", "_", endpoint).strip("_")
+                    path = os.path.join(
+                        settings.PROFILING_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{os.getpid()}.folded",
+                    )
+                    write_folded(stacks, path)
+                except Exception:
+                    logger.exception("Could not write profile for %s", endpoint)
+                    path = None
+                finally:
+                    _sampler_lock.release()
+            _observe(endpoint, elapsed, profile, path)
@@ -0,0 +1,177 @@
+# app/core/ratelimit.py
+"""
+Admission control for device ingest: a token bucket per device plus one for
+the whole fleet, checked and charged atomically by one Lua script.
+
+A bucket is a Redis hash ``{tokens, ts}`` refilled lazily from the Redis
+clock (``TIME``), so every API process shares it and no process's clock
+matters.  A request is admitted only if both buckets hold ``cost`` tokens; a
+refusal writes nothing and reports how long until the emptier bucket has
+enough (the ``Retry-After``).  Idle buckets expire once they would be full.
+
+Fast path: when both buckets are well above ``RATE_LIMIT_LEASE_HEADROOM`` of
+their burst after a charge, the script also hands the calling process up to
+``RATE_LIMIT_LEASE_MAX`` extra tokens, already deducted.  The process spends
+them locally for at most ``RATE_LIMIT_LEASE_TTL_S`` without asking Redis, so
+a device that is clearly under its limit costs one round trip per lease, not
+per message.  Unspent leases simply lapse: the limit is never exceeded, only
+briefly under-used.
+
+Limits are tokens per second and burst size, per ``Device.device_type``
+(``RATE_LIMIT_BY_TYPE``) with ``RATE_LIMIT_DEVICE_*`` as the default.
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = "rl:global"
+
+# KEYS: device bucket, global bucket
+# ARGV: rate, burst, global rate, global burst, cost, lease max, headroom (fraction of burst)
+# -> {admitted 0/1, lease, device tokens left, retry after s, limiting scope}
+TAKE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local function level(key, rate, burst)
+  local s = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens, ts = tonumber(s[1]), tonumber(s[2])
+  if not tokens then return burst end
+  return math.min(burst, tokens + math.max(0, now - ts) * rate)
+end
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local grate, gburst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+local dev = level(KEYS[1], rate, burst)
+local glob = level(KEYS[2], grate, gburst)
+
+local wait_dev = dev < cost and (cost - dev) / rate or 0
+local wait_glob = glob < cost and (cost - glob) / grate or 0
+if wait_dev > 0 or wait_glob > 0 then
+  local scope = wait_dev >= wait_glob and 'device' or 'global'
+  return {0, 0, tostring(dev), tostring(math.max(wait_dev, wait_glob)), scope}
+end
+
+dev = dev - cost
+glob = glob - cost
+local headroom = tonumber(ARGV[7])
+local lease = math.floor(math.min(tonumber(ARGV[6]), dev - burst * headroom, glob - gburst * headroom))
+if lease > 0 then
+  dev = dev - lease
+  glob = glob - lease
+else
+  lease = 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(dev), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - dev) / rate * 1000) + 1000)
+redis.call('HSET', KEYS[2], 'tokens', tostring(glob), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[2], math.ceil((gburst - glob) / grate * 1000) + 1000)
+return {1, lease, tostring(dev), '0', ''}
+"""
+
+
+def _device_key(device_id: str) -> str:
+    return f"rl:dev:{device_id}"
+
+
+@dataclass
+class Decision:
+    admitted: bool
+    retry_after_s: float = 0.0
+    remaining: Optional[float] = None      # device tokens left (None: not known)
+    scope: Optional[str] = None            # "device" | "global" when refused
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after_s)))
+
+
+def limits_for(device_type: Optional[str]) -> tuple[float, float]:
+    """(tokens per second, burst) for a device type."""
+    rate, burst = settings.RATE_LIMIT_BY_TYPE.get(
+        device_type or "", (settings.RATE_LIMIT_DEVICE_RATE, settings.RATE_LIMIT_DEVICE_BURST)
+    )
+    return float(rate), float(burst)
+
+
+class RateLimiter:
+    def __init__(self, redis_client=None):
+        self._redis_client = redis_client
+        self._script = None
+        self._leases: dict[str, list] = {}      # device id -> [tokens, expires (monotonic)]
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return self._redis_client or get_sync_redis()
+
+    def _take_lease(self, device_id: str, cost: int) -> bool:
+        with self._lock:
+            lease = self._leases.get(device_id)
+            if lease is None:
+                return False
+            if lease[1] <= time.monotonic():
+                del self._leases[device_id]
+                return False
+            if lease[0] < cost:
+                return False
+            lease[0] -= cost
+            return True
+
+    def _store_lease(self, device_id: str, tokens: int) -> None:
+        with self._lock:
+            if len(self._leases) >= settings.RATE_LIMIT_LOCAL_SIZE:
+                self._leases.clear()
+            self._leases[device_id] = [tokens, time.monotonic() + settings.RATE_LIMIT_LEASE_TTL_S]
+
+    def check(self, device_id: str, device_type: Optional[str], cost: int = 1) -> Decision:
+        """Admit (and charge) ``cost`` readings for the device, or say when to retry.
+
+        Redis errors admit the request: shedding is a protection, not a
+        reason to lose data.
+        """
+        kind = device_type or "default"
+        if self._take_lease(device_id, cost):
+            metrics.RATE_LIMIT_DECISIONS.labels(decision="admitted_local", device_type=kind).inc()
+            return Decision(admitted=True)
+        rate, burst = limits_for(device_type)
+        try:
+            if self._script is None:
+                self._script = self.redis.register_script(TAKE_LUA)
+            admitted, lease, remaining, retry, scope = self._script(
+                keys=[_device_key(device_id), GLOBAL_KEY],
+                args=[rate, burst, settings.RATE_LIMIT_GLOBAL_RATE, settings.RATE_LIMIT_GLOBAL_BURST, cost,
+                      settings.RATE_LIMIT_LEASE_MAX, settings.RATE_LIMIT_LEASE_HEADROOM],
+                client=self.redis,
+            )
+        except Exception:
+            logger.warning("Rate limiter unavailable, admitting %s", device_id, exc_info=True)
+            metrics.RATE_LIMIT_DECISIONS.labels(decision="error", device_type=kind).inc()
+            return Decision(admitted=True)
+        remaining = float(remaining)
+        if not admitted:
+            scope = scope.decode() if isinstance(scope, bytes) else scope
+            metrics.RATE_LIMIT_DECISIONS.labels(decision=f"limited_{scope}", device_type=kind).inc()
+            return Decision(admitted=False, retry_after_s=float(retry), remaining=remaining, scope=scope)
+        if lease:
+            self._store_lease(device_id, int(lease))
+        metrics.RATE_LIMIT_DECISIONS.labels(decision="admitted", device_type=kind).inc()
+        return Decision(admitted=True, remaining=remaining + int(lease))
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,212 @@
+# app/core/redis.py
+"""
+Shared Redis connection pools, one async and one sync per process.
+
+Everything that talks to Redis (auth refresh tokens, principal cache, the
+telemetry pubsub hub, Celery tasks) goes through ``get_async_redis`` /
+``get_sync_redis`` instead of calling ``from_url`` itself, so the number of
+connections per replica is bounded by ``REDIS_MAX_CONNECTIONS`` per pool.
+Pools are blocking: when all connections are busy a caller waits (up to
+``REDIS_POOL_TIMEOUT_S``) instead of opening more, and that wait is recorded.
+"""
+import threading
+import time
+from typing import Iterable, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class _WaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float) -> None:
+        with self._lock:
+            self.acquired += 1
+            self.wait_seconds_total += waited
+            if waited > self.wait_seconds_max:
+                self.wait_seconds_max = waited
+
+
+class _PoolMetrics:
+    """Connection accounting kept by our own get_connection/release overrides,
+    so it does not depend on how redis-py stores idle connections."""
+    kind = ""
+
+    def reset(self):
+        # called by the pool's __init__ and again after a fork
+        self._usage_lock = threading.Lock()
+        self._busy: set = set()
+        self._idle: set = set()
+        super().reset()
+
+    def _checked_out(self, connection) -> None:
+        with self._usage_lock:
+            self._idle.discard(connection)
+            self._busy.add(connection)
+
+    def _checked_in(self, connection) -> None:
+        with self._usage_lock:
+            # a connection from before a reset is not the pool's any more
+            if connection in self._busy:
+                self._busy.discard(connection)
+                self._idle.add(connection)
+
+    def usage(self) -> tuple[int, int]:
+        """``(in_use, idle)`` connections of this pool."""
+        with self._usage_lock:
+            return len(self._busy), len(self._idle)
+
+    def _publish(self, waited: Optional[float] = None) -> None:
+        if waited is not None:
+            self.wait_stats.record(waited)
+            metrics.REDIS_POOL_WAIT_SECONDS.labels(pool=self.kind).observe(waited)
+        in_use, idle = self.usage()
+        metrics.REDIS_POOL_CONNECTIONS.labels(pool=self.kind, state="in_use").set(in_use)
+        metrics.REDIS_POOL_CONNECTIONS.labels(pool=self.kind, state="idle").set(idle)
+
+
+class _SyncPool(_PoolMetrics, redis.BlockingConnectionPool):
+    kind = "sync"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = _WaitStats()
+
+    def get_connection(self, command_name, *keys, **options):
+        t0 = time.perf_counter()
+        conn = super().get_connection(command_name, *keys, **options)
+        self._checked_out(conn)
+        self._publish(time.perf_counter() - t0)
+        return conn
+
+    def release(self, connection):
+        super().release(connection)
+        self._checked_in(connection)
+        self._publish()
+
+
+class _AsyncPool(_PoolMetrics, aioredis.BlockingConnectionPool):
+    kind = "async"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = _WaitStats()
+
+    async def get_connection(self, command_name, *keys, **options):
+        t0 = time.perf_counter()
+        conn = await super().get_connection(command_name, *keys, **options)
+        self._checked_out(conn)
+        self._publish(time.perf_counter() - t0)
+        return conn
+
+    async def release(self, connection):
+        await super().release(connection)
+        self._checked_in(connection)
+        self._publish()
+
+
+_async_client: Optional[aioredis.Redis] = None
+_sync_client: Optional[redis.Redis] = None
+_sync_lock = threading.Lock()
+
+
+def _pool_kwargs() -> dict:
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_POOL_TIMEOUT_S,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT_S,
+        "decode_responses": True,
+    }
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Process-wide asyncio client (API process). Created on first use."""
+    global _async_client
+    if _async_client is None:
+        pool = _AsyncPool.from_url(settings.REDIS_URL, **_pool_kwargs())
+        _async_client = aioredis.Redis(connection_pool=pool)
+    return _async_client
+
+
+def get_sync_redis() -> redis.Redis:
+    """Process-wide blocking client (Celery workers, sync endpoints/crud)."""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                pool = _SyncPool.from_url(settings.REDIS_URL, **_pool_kwargs())
+                _sync_client = redis.Redis(connection_pool=pool)
+    return _sync_client
+
+
+async def close_redis() -> None:
+    """Release both pools (FastAPI shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        try:
+            await _async_client.close(close_connection_pool=True)
+        except Exception:
+            pass
+        _async_client = None
+    close_sync_redis()
+
+
+def close_sync_redis() -> None:
+    global _sync_client
+    if _sync_client is not None:
+        try:
+            _sync_client.connection_pool.disconnect()
+        except Exception:
+            pass
+        _sync_client = None
+
+
+# ---------- pipelining helpers ----------
+def pipelined(command: str, keys: Iterable[str], *args, client: Optional[redis.Redis] = None) -> list:
+    """Run ``command(key, *args)`` for every key in one round trip (sync)."""
+    client = client or get_sync_redis()
+    with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            getattr(pipe, command)(key, *args)
+        return pipe.execute()
+
+
+async def apipelined(command: str, keys: Iterable[str], *args, client: Optional[aioredis.Redis] = None) -> list:
+    """Async variant of :func:`pipelined`."""
+    client = client or get_async_redis()
+    async with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            getattr(pipe, command)(key, *args)
+        return await pipe.execute()
+
+
+# ---------- pool usage ----------
+def _stats(kind: str, client) -> Optional[dict]:
+    if client is None:
+        return None
+    pool = client.connection_pool
+    in_use, idle = pool.usage()
+    ws = pool.wait_stats
+    return {
+        "pool": kind,
+        "max": pool.max_connections,
+        "created": in_use + idle,
+        "idle": idle,
+        "in_use": in_use,
+        "acquired": ws.acquired,
+        "wait_seconds_total": ws.wait_seconds_total,
+        "wait_seconds_max": ws.wait_seconds_max,
+    }
+
+
+def pool_stats() -> list[dict]:
+    """In-use / idle / wait-time figures for the pools this process created."""
+    return [s for s in (_stats("async", _async_client), _stats("sync", _sync_client)) if s]
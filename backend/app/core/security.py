@@ -1,18 +1,21 @@
 # app/core/security.py
+import asyncio
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import jwt, JWTError
-import redis.asyncio as aioredis
 from passlib.context import CryptContext
 
+from app.core import metrics
 from app.core.config import settings
+from app.core.redis import get_async_redis
 
-# Async Redis client (single instance)
-_redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
-
-# Password hashing context (bcrypt)
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context (bcrypt). Hashes with fewer rounds than configured
+# report needs_update, which login uses to rehash transparently.
+pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def hash_password(plain: str) -> str:
     """Hash a plain password (use on user creation / password reset)."""
@@ -22,7 +25,95 @@ def verify_password(plain: str, hashed: str) -> bool:
     """Verify a plaintext password against a bcrypt hash."""
     return pwd_ctx.verify(plain, hashed)
 
-def create_access_token(subject: str, expires_minutes: Optional[int] = None) -> str:
+
+# ---------- Offloaded hashing (async callers) ----------
+class PasswordHashBusy(Exception):
+    """Too many hash operations already waiting; shed load instead of queueing."""
+
+
+class HashPoolStats:
+    """Counters for the password hash pool (queue wait vs hashing time)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+
+    def record(self, queued: float, hashing: float) -> None:
+        metrics.PASSWORD_HASH_QUEUE_SECONDS.observe(queued)
+        with self._lock:
+            self.completed += 1
+            self.queue_seconds_total += queued
+            self.queue_seconds_max = max(self.queue_seconds_max, queued)
+            self.hash_seconds_total += hashing
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = self.completed or 1
+            return {
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "in_flight": self.in_flight,
+                "queue_seconds_avg": self.queue_seconds_total / n,
+                "queue_seconds_max": self.queue_seconds_max,
+                "hash_seconds_avg": self.hash_seconds_total / n,
+            }
+
+
+hash_pool_stats = HashPoolStats()
+# bcrypt releases the GIL while hashing, so threads hash in parallel
+_hash_pool: Optional[ThreadPoolExecutor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+def _get_hash_pool() -> ThreadPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+    return _hash_pool
+
+async def _run_hashing(fn, *args):
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_PENDING)
+    if _hash_slots.locked():
+        hash_pool_stats.rejected += 1
+        raise PasswordHashBusy()
+
+    submitted = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            hash_pool_stats.record(started - submitted, time.perf_counter() - started)
+
+    async with _hash_slots:
+        hash_pool_stats.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_get_hash_pool(), timed)
+        finally:
+            hash_pool_stats.in_flight -= 1
+
+async def hash_password_async(plain: str) -> str:
+    return await _run_hashing(pwd_ctx.hash, plain)
+
+async def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify off the event loop. Returns ``(ok, new_hash)`` where ``new_hash`` is
+    set when the stored hash uses outdated parameters (e.g. fewer rounds).
+    """
+    return await _run_hashing(pwd_ctx.verify_and_update, plain, hashed)
+
+def create_access_token(subject: str, expires_minutes: Optional[int] = None, role: Optional[str] = None, status: Optional[str] = None) -> str:
+    """
+    Signed access token. ``role``/``status`` are carried as claims so
+    get_current_user can authorize without a users query (see core.principals).
+    """
     now = datetime.now(timezone.utc)
     if expires_minutes is None:
         expires_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
@@ -32,6 +123,10 @@ def create_access_token(subject: str, expires_minutes: Optional[int] = None) ->
         "iat": int(now.timestamp()),
         "exp": int(exp.timestamp()),
     }
+    if role is not None:
+        to_encode["role"] = role
+    if status is not None:
+        to_encode["st"] = status
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 async def create_refresh_token(subject: str) -> str:
@@ -41,7 +136,7 @@ async def create_refresh_token(subject: str) -> str:
     """
     jti = str(uuid.uuid4())
     key = f"refresh:{jti}"
-    await _redis.set(key, subject, ex=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600)
+    await get_async_redis().set(key, subject, ex=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600)
     return jti
 
 async def rotate_refresh_token(old_jti: Optional[str], subject: str) -> str:
@@ -51,33 +146,35 @@ async def rotate_refresh_token(old_jti: Optional[str], subject: str) -> str:
     """
     if old_jti:
         try:
-            await _redis.delete(f"refresh:{old_jti}")
+            await get_async_redis().delete(f"refresh:{old_jti}")
         except Exception:
             pass
     return await create_refresh_token(subject)
 
 async def revoke_refresh_token(jti: str):
-    await _redis.delete(f"refresh:{jti}")
+    await get_async_redis().delete(f"refresh:{jti}")
 
 async def get_subject_from_refresh_jti(jti: str) -> Optional[str]:
     if jti is None:
         return None
     key = f"refresh:{jti}"
-    return await _redis.get(key)
+    return await get_async_redis().get(key)
+
+def decode_access_token(token: str) -> dict:
+    """
+    Returns the verified claims, otherwise raises JWTError (including expired).
+    """
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    if not payload.get("sub"):
+        raise JWTError("missing sub claim")
+    return payload
 
 def verify_access_token(token: str) -> str:
     """
     Returns subject (user id) if token is valid, otherwise raises JWTError (including expired).
     """
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        sub = payload.get("sub")
-        if not sub:
-            raise JWTError("missing sub claim")
-        return sub
-    except JWTError:
-        # propagate to caller; caller will convert to HTTPException
-        raise
+    # propagate JWTError to caller; caller will convert to HTTPException
+    return decode_access_token(token)["sub"]
 
 def verify_ws_token(token: str) -> str | None:
     """
@@ -87,11 +184,3 @@ def verify_ws_token(token: str) -> str | None:
         return verify_access_token(token)
     except JWTError:
         return None
-
-# Helper to close redis on app shutdown
-async def close_redis():
-    try:
-        await _redis.close()
-        await _redis.wait_closed()
-    except Exception:
-        pass
@@ -0,0 +1,142 @@
+# app/core/spatial.py
+"""
+Small pure-Python geometry for the map endpoints (no PostGIS).
+
+Coordinates are WGS84 degrees, GeoJSON order ``(lon, lat)``; a bbox is
+``(min_lon, min_lat, max_lon, max_lat)``.  :class:`GridIndex` buckets points
+and boxes into fixed-size cells so a viewport query only looks at the cells
+it overlaps (or, when zoomed far out, at the occupied cells), independent of
+how many devices and fields are indexed elsewhere.
+"""
+import math
+from collections import defaultdict
+from typing import Hashable, Optional
+
+BBox = tuple[float, float, float, float]
+
+
+def tile_bbox(z: int, x: int, y: int) -> BBox:
+    """Bounds of slippy-map tile ``z/x/y`` (the scheme Leaflet uses)."""
+    n = 2 ** z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y))
+
+
+def polygon_rings(geometry: dict) -> list:
+    """Outer rings of a GeoJSON Polygon / MultiPolygon."""
+    kind = geometry.get("type")
+    if kind == "Polygon":
+        return [geometry["coordinates"][0]]
+    if kind == "MultiPolygon":
+        return [poly[0] for poly in geometry["coordinates"]]
+    raise ValueError("geometry must be a Polygon or MultiPolygon")
+
+
+def geometry_bbox(geometry: dict) -> BBox:
+    xs, ys = [], []
+    for ring in polygon_rings(geometry):
+        for lon, lat, *_ in ring:
+            xs.append(lon)
+            ys.append(lat)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def ring_area_m2(ring: list) -> float:
+    """Approximate area of a small lon/lat ring (equirectangular, shoelace)."""
+    if len(ring) < 3:
+        return 0.0
+    lat0 = math.radians(sum(p[1] for p in ring) / len(ring))
+    kx = 111_320.0 * math.cos(lat0)
+    ky = 110_540.0
+    s = 0.0
+    for (x1, y1, *_), (x2, y2, *_) in zip(ring, ring[1:] + ring[:1]):
+        s += (x1 * kx) * (y2 * ky) - (x2 * kx) * (y1 * ky)
+    return abs(s) / 2.0
+
+
+def point_in_ring(lon: float, lat: float, ring: list) -> bool:
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def point_in_geometry(lon: float, lat: float, geometry: dict) -> bool:
+    if geometry.get("type") == "Polygon":
+        outer, *holes = geometry["coordinates"]
+        return point_in_ring(lon, lat, outer) and not any(point_in_ring(lon, lat, h) for h in holes)
+    return any(
+        point_in_geometry(lon, lat, {"type": "Polygon", "coordinates": poly})
+        for poly in geometry.get("coordinates", ())
+    )
+
+
+def intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GridIndex:
+    """Uniform grid over lon/lat; items are points or boxes, keyed by id."""
+
+    def __init__(self, cell_deg: float):
+        self.cell = cell_deg
+        self._cells: dict[tuple[int, int], set] = defaultdict(set)
+        self._boxes: dict[Hashable, BBox] = {}
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def _span(self, bbox: BBox) -> tuple[int, int, int, int]:
+        c = self.cell
+        return (math.floor(bbox[0] / c), math.floor(bbox[1] / c), math.floor(bbox[2] / c), math.floor(bbox[3] / c))
+
+    def insert(self, key: Hashable, bbox: BBox) -> None:
+        self._boxes[key] = bbox
+        x0, y0, x1, y1 = self._span(bbox)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self._cells[(cx, cy)].add(key)
+
+    def insert_point(self, key: Hashable, lon: float, lat: float) -> None:
+        self.insert(key, (lon, lat, lon, lat))
+
+    def query(self, bbox: BBox) -> set:
+        """Ids whose point/box intersects ``bbox``."""
+        x0, y0, x1, y1 = self._span(bbox)
+        found = set()
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self._cells):
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    found.update(self._cells.get((cx, cy), ()))
+        else:
+            # zoomed far out: walking the occupied cells is cheaper
+            for (cx, cy), keys in self._cells.items():
+                if x0 <= cx <= x1 and y0 <= cy <= y1:
+                    found.update(keys)
+        return {k for k in found if intersects(self._boxes[k], bbox)}
+
+    def bbox_of(self, key: Hashable) -> Optional[BBox]:
+        return self._boxes.get(key)
+
+
+def parse_bbox(text: str) -> BBox:
+    """``"min_lon,min_lat,max_lon,max_lat"`` -> bbox, validated."""
+    try:
+        parts = tuple(float(v) for v in text.split(","))
+    except ValueError:
+        raise ValueError("bbox must be four numbers") from None
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox out of range or inverted")
+    return parts
+
@@ -0,0 +1,161 @@
+# app/core/tracing.py
+"""
+Sampled per-reading traces across ingest -> Celery -> DB -> pubsub -> WebSocket.
+
+``ingest_telemetry`` decides once per request whether to trace (with
+probability ``TRACE_SAMPLE_RATE``) and, if so, puts a small context dict in
+the job payload under ``"trace"``.  Each later stage turns the timestamps it
+sees into spans and forwards the context with its own output, so a trace
+shows where the time between the device's POST and the viewer's socket went:
+
+    ingest.http     request received -> job enqueued (API)
+    queue.wait      job enqueued -> task started (Celery queue)
+    worker.db       row insert + commit (worker)
+    pubsub.deliver  Redis PUBLISH -> received by an API process
+    ws.fanout       send to the local sockets (API)
+
+Unsampled readings carry no context, and every helper here returns at once
+for ``ctx is None``, so the cost at full ingest rate is one ``random()`` per
+request.  Timestamps are wall-clock epoch seconds because stages run in
+different processes (and containers); keep hosts NTP-synced.
+
+Spans go to the exporter chosen by ``TRACE_EXPORTER`` (``none``, ``stdout``,
+``file``); other sinks can be added with :func:`register_exporter` or
+installed directly with :func:`set_exporter`.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- exporters ----------
+class SpanExporter:
+    """Receives finished spans (plain dicts). Must be cheap and thread-safe."""
+
+    def export(self, span: dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class NullExporter(SpanExporter):
+    def export(self, span: dict) -> None:
+        pass
+
+
+class StdoutExporter(SpanExporter):
+    """One JSON object per line on stdout (shows up in ``docker compose logs``)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def export(self, span: dict) -> None:
+        line = json.dumps(span, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class FileExporter(SpanExporter):
+    """Appends JSONL to ``path``; several processes may share one file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: dict) -> None:
+        line = json.dumps(span, default=str) + "\n"
+        # one write() per line in append mode keeps lines whole across processes
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+_factories: dict[str, Callable[[], SpanExporter]] = {
+    "none": NullExporter,
+    "stdout": StdoutExporter,
+    "file": lambda: FileExporter(settings.TRACE_FILE),
+}
+_exporter: Optional[SpanExporter] = None
+
+
+def register_exporter(name: str, factory: Callable[[], SpanExporter]) -> None:
+    """Make ``TRACE_EXPORTER=<name>`` build ``factory()``."""
+    _factories[name] = factory
+
+
+def get_exporter() -> SpanExporter:
+    global _exporter
+    if _exporter is None:
+        factory = _factories.get(settings.TRACE_EXPORTER)
+        if factory is None:
+            logger.warning("Unknown TRACE_EXPORTER %r; traces disabled", settings.TRACE_EXPORTER)
+            factory = NullExporter
+        _exporter = factory()
+    return _exporter
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Install an exporter (``None`` = rebuild from settings on next use)."""
+    global _exporter
+    if _exporter is not None and _exporter is not exporter:
+        _exporter.close()
+    _exporter = exporter
+
+
+# ---------- context ----------
+def _new_id(bits: int = 64) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def start_trace(sample_rate: Optional[float] = None) -> Optional[dict]:
+    """Sampling decision for one reading: a new context, or ``None``."""
+    rate = settings.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0.0 or (rate < 1.0 and random.random() >= rate):
+        return None
+    return {"trace_id": _new_id(128), "span_id": None}
+
+
+def record_span(ctx: Optional[dict], name: str, start: float, end: Optional[float] = None, **attrs) -> None:
+    """Export one finished span and make it the parent of the next stage."""
+    if ctx is None:
+        return
+    end = time.time() if end is None else end
+    span_id = _new_id()
+    span = {
+        "trace_id": ctx["trace_id"],
+        "span_id": span_id,
+        "parent_id": ctx.get("span_id"),
+        "name": name,
+        "start": start,
+        "end": end,
+        "duration_ms": round((end - start) * 1000, 3),
+        "pid": os.getpid(),
+    }
+    if attrs:
+        span["attrs"] = attrs
+    ctx["span_id"] = span_id
+    try:
+        get_exporter().export(span)
+    except Exception:
+        logger.exception("Trace exporter failed")
+
+
+def carry(ctx: Optional[dict], **stamps) -> Optional[dict]:
+    """Context to hand to the next process, with hand-off timestamps."""
+    if ctx is None:
+        return None
+    return {"trace_id": ctx["trace_id"], "span_id": ctx.get("span_id"), **stamps}
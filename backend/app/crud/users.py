@@ -1,9 +1,21 @@
 # app/crud/users.py
+import logging
+import time
+from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, literal, or_, select, tuple_
 from app.db.models import User
+from app.core.principals import Principal, PrincipalPublishError, publish_principal
+from app.core.access import revoke_user_access
 from uuid import UUID
 
+logger = logging.getLogger(__name__)
+
+# cap for the "total" shown next to the user list; beyond it the UI shows "N+"
+COUNT_CAP = 10000
+COUNTS_TTL_S = 10.0
+_counts_cache: tuple[float, dict] | None = None
+
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(func.lower(User.email) == email.lower()).one_or_none()
 
@@ -15,34 +27,103 @@ def create_user(db: Session, name: str, email: str, role: str, department: str |
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_counts()
     return user
 
 def update_user(db: Session, user: User, **fields):
+    """Apply ``fields``; raises PrincipalPublishError (nothing changed) when a
+    role/status change cannot be published to Redis."""
+    previous = Principal.from_user(user)
     for k, v in fields.items():
         if v is not None:
             setattr(user, k, v)
     db.add(user)
-    db.commit()
+    current = Principal.from_user(user)
+    changed = (current.role, current.status) != (previous.role, previous.status)
+    if changed:
+        # tokens carry role/status claims; the record overrides them, so it
+        # goes out first: a demotion that tokens could ignore is not committed
+        try:
+            publish_principal(current)
+        except PrincipalPublishError:
+            db.rollback()
+            raise
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        if changed:
+            try:
+                publish_principal(previous)
+            except PrincipalPublishError:
+                logger.exception("Could not restore principal of user %s after a failed update", user.id)
+        raise
     db.refresh(user)
+    if changed:
+        invalidate_counts()
+    if user.role != previous.role:
+        # role grants of the old role no longer apply
+        revoke_user_access(user.id)
     return user
 
-def list_users(db: Session, query: str | None = None, role: str | None = None, status: str | None = None, offset: int = 0, limit: int = 25):
-    q = db.query(User)
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def list_users(db: Session, query: str | None = None, role: str | None = None, status: str | None = None,
+               offset: int = 0, limit: int = 25, after: tuple[datetime, UUID] | None = None):
+    """
+    One round trip: the page of users plus a capped total.
+
+    ``query`` uses ILIKE on name/email/department, served by the pg_trgm GIN
+    indexes. Pass ``after=(created_at, id)`` of the last row for keyset
+    pagination (constant cost per page); ``offset`` remains for old clients.
+    Returns ``(rows, total, capped)``.
+    """
+    conds = []
     if query:
-        term = f"%{query.lower()}%"
-        q = q.filter(func.lower(User.name).like(term) | func.lower(User.email).like(term) | func.lower(User.department).like(term))
+        term = f"%{_escape_like(query)}%"
+        conds.append(or_(User.name.ilike(term, escape="\\"), User.email.ilike(term, escape="\\"),
+                         User.department.ilike(term, escape="\\")))
     if role:
-        q = q.filter(User.role == role)
+        conds.append(User.role == role)
     if status:
-        q = q.filter(User.status == status)
-    total = q.count()
-    rows = q.order_by(User.created_at.desc()).offset(offset).limit(limit).all()
-    return rows, total
+        conds.append(User.status == status)
+
+    # counting stops at COUNT_CAP + 1 matching rows, so it never scans the table
+    capped = select(literal(1)).select_from(User).where(*conds).limit(COUNT_CAP + 1).subquery()
+    total = select(func.count()).select_from(capped).scalar_subquery()
+
+    q = db.query(User, total.label("total")).filter(*conds)
+    if after is not None:
+        q = q.filter(tuple_(User.created_at, User.id) < tuple_(*after))
+    q = q.order_by(User.created_at.desc(), User.id.desc())
+    if after is None and offset:
+        q = q.offset(offset)
+    result = q.limit(limit).all()
+
+    if result:
+        n = result[0][1]
+    else:
+        n = db.query(total).scalar()
+    return [r[0] for r in result], min(n, COUNT_CAP), n > COUNT_CAP
+
+def invalidate_counts():
+    global _counts_cache
+    _counts_cache = None
 
 def counts(db: Session):
-    total = db.query(func.count(User.id)).scalar()
-    active = db.query(func.count(User.id)).filter(User.status == "activo").scalar()
-    admins = db.query(func.count(User.id)).filter(User.role == "Administrador").scalar()
-    operators = db.query(func.count(User.id)).filter(User.role == "Operador").scalar()
-    viewers = db.query(func.count(User.id)).filter(User.role == "Visualizador").scalar()
-    return {"total": total, "active": active, "admins": admins, "operators": operators, "viewers": viewers}
+    """All dashboard counters in one aggregate, cached for COUNTS_TTL_S."""
+    global _counts_cache
+    now = time.monotonic()
+    if _counts_cache and _counts_cache[0] > now:
+        return _counts_cache[1]
+    row = db.query(
+        func.count(User.id),
+        func.count(User.id).filter(User.status == "activo"),
+        func.count(User.id).filter(User.role == "Administrador"),
+        func.count(User.id).filter(User.role == "Operador"),
+        func.count(User.id).filter(User.role == "Visualizador"),
+    ).one()
+    result = {"total": row[0], "active": row[1], "admins": row[2], "operators": row[3], "viewers": row[4]}
+    _counts_cache = (now + COUNTS_TTL_S, result)
+    return result
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Float, JSON, ForeignKey, Boolean, Index, BigInteger, Identity, TIMESTAMP, Text
+from sqlalchemy import Column, String, Integer, Date, DateTime, Float, JSON, ForeignKey, Boolean, Index, BigInteger, Identity, TIMESTAMP, Text, DDL, UniqueConstraint, event
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from sqlalchemy.sql import func
@@ -17,6 +17,24 @@ class User(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     last_login = Column(TIMESTAMP(timezone=True), nullable=True)
 
+class Field(Base):
+    """A plot on the map: GeoJSON (Multi)Polygon plus its bounding box.
+
+    The bbox columns are what the map index and any SQL prefilter use; the
+    polygon is only needed for point-in-field tests and for drawing.
+    """
+    __tablename__ = "fields"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String, nullable=False)
+    crop = Column(String, nullable=True)
+    boundary = Column(JSON, nullable=False)
+    min_lon = Column(Float, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    area_ha = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Device(Base):
     __tablename__ = "devices"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -24,6 +42,10 @@ class Device(Base):
     device_type = Column(String)
     token = Column(String, nullable=False)
     meta = Column(JSON)
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    field_id = Column(UUID(as_uuid=True), ForeignKey('fields.id'), nullable=True, index=True)
+    owner_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Measurement(Base):
@@ -79,4 +101,95 @@ class Alert(Base):
     acknowledged = Column(Boolean, default=False)
     acknowledged_by = Column(String)
 
-Index("ix_measurements_device_time", Measurement.device_id, Measurement.time.desc())
\ No newline at end of file
+class AlertRule(Base):
+    """Threshold / rate-of-change / sustained rule evaluated by workers/alerts.py.
+
+    ``device_id`` NULL applies the rule to the whole fleet.  ``value`` is the
+    threshold (for ``rate`` rules: change per minute); ``window_s`` is the
+    longest gap between readings a rate is computed over, or how long a
+    ``sustained`` condition must hold.
+    """
+    __tablename__ = 'alert_rules'
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String, nullable=False)
+    device_id = Column(UUID(as_uuid=True), ForeignKey('devices.id'), nullable=True, index=True)
+    field = Column(String, nullable=False)
+    kind = Column(String, nullable=False, default='threshold')  # threshold | rate | sustained
+    op = Column(String, nullable=False)                         # > >= < <=
+    value = Column(Float, nullable=False)
+    window_s = Column(Integer, nullable=True)
+    severity = Column(String, default='Media')
+    cooldown_s = Column(Integer, default=900)
+    enabled = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class DeviceGrant(Base):
+    """Read access to one device or to every device of a field.
+
+    ``subject`` is a user id (``subject_type='user'``) or a role name
+    (``'role'``); ``scope_id`` is a device id or a field id.  Owners
+    (``Device.owner_id``) and administrators need no grant.  Resolved per user
+    into the access index in core/access.py.
+    """
+    __tablename__ = 'device_grants'
+    __table_args__ = (UniqueConstraint('subject_type', 'subject', 'scope_type', 'scope_id', name='uq_device_grants'),)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    subject_type = Column(String, nullable=False)   # user | role
+    subject = Column(String, nullable=False)
+    scope_type = Column(String, nullable=False)     # device | field
+    scope_id = Column(UUID(as_uuid=True), nullable=False)
+    created_by = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class DailyIndicators(Base):
+    """Per-device, per-day running aggregates kept by workers/indicators.py.
+
+    Updated by one upsert per measurement (in the measurement's own
+    transaction).  Only accumulators are stored; GDD, VPD, dew point, frost
+    hours and ET0 are derived from them when read.  ``*_ts`` are epoch
+    seconds; ``needs_recompute`` marks a day that received a late reading and
+    is waiting to be rebuilt from ``measurements``.
+    """
+    __tablename__ = 'daily_indicators'
+    device_id = Column(UUID(as_uuid=True), ForeignKey('devices.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)
+    covered_s = Column(Float, nullable=False, default=0.0)
+    first_ts = Column(Float)
+    last_ts = Column(Float)
+    t_min = Column(Float)
+    t_max = Column(Float)
+    t_sum = Column(Float, nullable=False, default=0.0)
+    t_n = Column(Integer, nullable=False, default=0)
+    rh_min = Column(Float)
+    rh_max = Column(Float)
+    rh_sum = Column(Float, nullable=False, default=0.0)
+    rh_n = Column(Integer, nullable=False, default=0)
+    vpd_sum = Column(Float, nullable=False, default=0.0)
+    vpd_max = Column(Float)
+    dew_sum = Column(Float, nullable=False, default=0.0)
+    hum_n = Column(Integer, nullable=False, default=0)      # readings with both T and RH
+    wind_sum = Column(Float, nullable=False, default=0.0)
+    wind_n = Column(Integer, nullable=False, default=0)
+    solar_j_m2 = Column(Float, nullable=False, default=0.0)
+    frost_s = Column(Float, nullable=False, default=0.0)
+    last_temp = Column(Float)
+    last_solar = Column(Float)
+    needs_recompute = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True))
+
+Index("ix_devices_lon_lat", Device.lon, Device.lat)
+Index("ix_device_grants_scope", DeviceGrant.scope_type, DeviceGrant.scope_id)
+Index("ix_fields_bbox", Field.min_lon, Field.max_lon, Field.min_lat, Field.max_lat)
+Index("ix_measurements_device_time", Measurement.device_id, Measurement.time.desc())
+Index("ix_alerts_device_created", Alert.device_id, Alert.created_at.desc())
+Index("ix_images_session_capture", Image.session_id, Image.capture_time, Image.id)
+Index("ix_images_device_capture", Image.device_id, Image.capture_time, Image.id)
+# a frame is registered once per session, however often complete is called
+Index("uq_images_session_s3_key", Image.session_id, Image.s3_key, unique=True)
+
+# user directory search: trigram GIN indexes serve ILIKE '%term%'
+event.listen(User.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+for _col in ("name", "email", "department"):
+    Index(f"ix_users_{_col}_trgm", getattr(User, _col), postgresql_using="gin", postgresql_ops={_col: "gin_trgm_ops"})
+Index("ix_users_created_id", User.created_at.desc(), User.id.desc())
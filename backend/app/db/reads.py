@@ -0,0 +1,119 @@
+# app/db/reads.py
+"""
+Read-only queries for the time-series endpoints.
+
+These select plain column tuples with SQLAlchemy Core instead of loading
+``Measurement`` instances: no identity map, no attribute instrumentation, no
+per-row state.  Results are handed back as lists of dicts keyed by column
+name, ready for ``orjson`` (which encodes ``datetime`` and ``UUID`` natively),
+so the endpoints can skip both ``serialize_measurement`` and FastAPI's
+``jsonable_encoder``.
+"""
+from datetime import date, datetime
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db import models
+
+_M = models.Measurement
+
+# same keys, same order as api.telemetry.serialize_measurement
+MEASUREMENT_COLUMNS = (
+    _M.id,
+    _M.time,
+    _M.device_id,
+    _M.temperature_c,
+    _M.relative_humidity_pct,
+    _M.solar_radiance_w_m2,
+    _M.wind_speed_m_s,
+    _M.wind_direction_deg,
+    _M.battery_v,
+    _M.meta,
+    _M.message_id,
+)
+MEASUREMENT_KEYS = tuple(c.key for c in MEASUREMENT_COLUMNS)
+
+_D = models.DailyIndicators
+# accumulators only; workers.indicators.derive turns them into indicators
+DAILY_COLUMNS = tuple(c for c in _D.__table__.columns if c.key not in ("device_id", "updated_at"))
+DAILY_KEYS = tuple(c.key for c in DAILY_COLUMNS)
+
+DEVICE_COLUMNS = (models.Device.id, models.Device.name)
+DEVICE_KEYS = tuple(c.key for c in DEVICE_COLUMNS)
+
+
+_DEV = models.Device
+MAP_DEVICE_COLUMNS = (_DEV.id, _DEV.name, _DEV.device_type, _DEV.lat, _DEV.lon, _DEV.field_id)
+MAP_DEVICE_KEYS = tuple(c.key for c in MAP_DEVICE_COLUMNS)
+
+_F = models.Field
+FIELD_COLUMNS = (_F.id, _F.name, _F.crop, _F.boundary, _F.min_lon, _F.min_lat, _F.max_lon, _F.max_lat, _F.area_ha)
+FIELD_KEYS = tuple(c.key for c in FIELD_COLUMNS)
+
+
+def _as_dicts(keys: tuple, rows) -> list[dict]:
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def latest_measurement(db: Session, device_id: UUID) -> Optional[dict]:
+    stmt = (
+        select(*MEASUREMENT_COLUMNS)
+        .where(_M.device_id == device_id)
+        .order_by(_M.time.desc(), _M.id.desc())
+        .limit(1)
+    )
+    row = db.execute(stmt).first()
+    return dict(zip(MEASUREMENT_KEYS, row)) if row is not None else None
+
+
+def measurements_since(db: Session, device_id: UUID, since: datetime) -> list[dict]:
+    stmt = (
+        select(*MEASUREMENT_COLUMNS)
+        .where(_M.device_id == device_id, _M.time >= since)
+        .order_by(_M.time.asc())
+    )
+    return _as_dicts(MEASUREMENT_KEYS, db.execute(stmt))
+
+
+def list_devices(db: Session, ids: Optional[Iterable] = None) -> list[dict]:
+    """All devices, or only ``ids`` (an access set; ``None`` means all)."""
+    stmt = select(*DEVICE_COLUMNS)
+    if ids is not None:
+        if not ids:
+            return []
+        stmt = stmt.where(_DEV.id.in_([UUID(str(i)) for i in ids]))
+    return _as_dicts(DEVICE_KEYS, db.execute(stmt))
+
+
+def daily_indicators(db: Session, device_id: UUID, start: date, end: date) -> list[dict]:
+    """``daily_indicators`` rows of one device, ``start <= day <= end``, by day."""
+    stmt = (
+        select(*DAILY_COLUMNS)
+        .where(_D.device_id == device_id, _D.day >= start, _D.day <= end)
+        .order_by(_D.day.asc())
+    )
+    return _as_dicts(DAILY_KEYS, db.execute(stmt))
+
+
+def located_devices(db: Session) -> list[dict]:
+    """Devices with coordinates, for the map index."""
+    stmt = select(*MAP_DEVICE_COLUMNS).where(_DEV.lat.is_not(None), _DEV.lon.is_not(None))
+    return _as_dicts(MAP_DEVICE_KEYS, db.execute(stmt))
+
+
+def list_fields(db: Session) -> list[dict]:
+    return _as_dicts(FIELD_KEYS, db.execute(select(*FIELD_COLUMNS).order_by(_F.name)))
+
+
+def device_means(db: Session, device_ids: list, column: str, start: datetime, end: datetime) -> dict:
+    """Mean of one measurement column per device over ``[start, end)``, devices without data left out."""
+    col = getattr(_M, column)
+    stmt = (
+        select(_M.device_id, func.avg(col))
+        .where(_M.device_id.in_(device_ids), _M.time >= start, _M.time < end, col.is_not(None))
+        .group_by(_M.device_id)
+    )
+    return {str(d): float(v) for d, v in db.execute(stmt)}
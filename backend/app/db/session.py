@@ -1,13 +1,81 @@
 # app/db/session.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+"""
+Engine and session factory, both created on first use.
+
+Importing this module (and therefore the models, routers and Celery tasks)
+never touches the database: ``get_engine()`` builds the pool the first time
+a session is opened, and the schema is managed by migrations
+(``python -m app.scripts.migrate``), not at import.
+"""
+import threading
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-# recommended session config
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+_engine: Optional[Engine] = None
+_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+                if settings.PROFILING_ENABLED:
+                    _install_profiling_hooks(_engine)
+    return _engine
+
+
+def _install_profiling_hooks(engine: Engine) -> None:
+    """Per-request query count / SQL time / slow statements (core/profiling.py)."""
+    from app.core import profiling
+
+    event.listen(engine, "before_cursor_execute", profiling.before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", profiling.after_cursor_execute)
+    event.listen(engine, "handle_error", profiling.handle_error)
+
+
+def dispose_engine() -> None:
+    """Close pooled connections (app shutdown, forked workers)."""
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+class _LazySessionFactory:
+    """``SessionLocal()`` as before, but binds to the engine at first call."""
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._factory: Optional[sessionmaker] = None
+        self._bound_to: Optional[Engine] = None
+
+    def __call__(self, **overrides) -> Session:
+        engine = get_engine()
+        if self._factory is None or self._bound_to is not engine:
+            self._factory = sessionmaker(bind=engine, **self._kwargs)
+            self._bound_to = engine
+        return self._factory(**overrides)
+
+
+# recommended session config
+SessionLocal = _LazySessionFactory(autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+def __getattr__(name):
+    # ``from app.db.session import engine`` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -1,31 +1,52 @@
 # app/deps/auth.py
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError
-from sqlalchemy.orm import Session
-from app.core.security import verify_access_token
-from app.db.session import get_db
+from app.core import security
+from app.core.principals import Principal, resolve_principal
+from app.core.redis import get_async_redis
+from app.db.session import SessionLocal
 from app.db import models
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+def _load_principal(subject: str):
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.id == subject).one_or_none()
+        return Principal.from_user(user) if user else None
+    finally:
+        db.close()
+
+async def principal_from_claims(claims: dict) -> Optional[Principal]:
+    # subject should be user id (UUID string)
+    return await resolve_principal(
+        claims, get_async_redis(), lambda: run_in_threadpool(_load_principal, claims["sub"])
+    )
+
+
 async def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
-):
+) -> Principal:
+    """
+    Resolve the caller from the bearer token. Most requests are answered from
+    the token claims / principal cache; the users table is only hit for
+    legacy tokens without role claims or when Redis is down.
+    """
     if not creds or not creds.credentials:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing auth token")
     token = creds.credentials
     try:
-        subject = verify_access_token(token)  # raises JWTError on invalid/expired
+        claims = security.decode_access_token(token)  # raises JWTError on invalid/expired
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
-    # subject should be user id (UUID string)
-    user = db.query(models.User).filter(models.User.id == subject).one_or_none()
+    user = await principal_from_claims(claims)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    if getattr(user, "status", "activo") != "activo":
+    if user.status != "activo":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is inactive")
     return user
-
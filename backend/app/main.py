@@ -1,154 +1,99 @@
 # app/main.py
-from fastapi import FastAPI
+"""
+API entry point. ``create_app()`` only wires routes and middleware; the
+schema comes from migrations (``python -m app.scripts.migrate``) and the DB
+engine, Redis pools and Celery producer are created on first use, so
+importing this module (uvicorn start-up, tests) never waits on Postgres or
+Redis.  Background work that needs them starts in the lifespan handler.
+"""
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.db.session import engine, Base
-from app.api import telemetry, images
+from app.db.session import dispose_engine
+from app.api import access, admin, alerts, fleet, geo, heatmap, indicators, telemetry, images, users
 from app.routers import auth
-import asyncio
-import json
-import redis.asyncio as aioredis
-import logging
-from app.api.telemetry import manager
-from app.core.security import close_redis
-# DB init
-Base.metadata.create_all(bind=engine)
+from app.api.telemetry import manager  # noqa: F401  (re-exported for tests)
+from app.core import metrics
+from app.core.redis import close_redis, get_async_redis
 
-# App + logging
-app = FastAPI(title="Crop Monitoring API")
 logger = logging.getLogger("app.main")
-logging.basicConfig(level=logging.INFO)
-
-# Redis channel to listen to (worker publishes to telemetry:all)
-REDIS_CHANNEL = "telemetry:all"
-
-@app.on_event("startup")
-async def start_redis_pubsub():
-    """
-    Start a background reader task that:
-      - connects to Redis
-      - subscribes to REDIS_CHANNEL
-      - polls pubsub.get_message(timeout=...) in a loop (safe to cancel)
-      - on each message calls manager.broadcast(...)
-      - reconnects on errors with backoff
-    The created task is stored on app.state.redis_task so we can cancel it on shutdown.
-    """
-    async def reader():
-        while True:
-            r = None
-            pubsub = None
-            try:
-                logger.info("Connecting to Redis at %s", settings.REDIS_URL)
-                r = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
-                pubsub = r.pubsub()
-                await pubsub.subscribe(REDIS_CHANNEL)
-                logger.info("Subscribed to Redis channel %s", REDIS_CHANNEL)
-
-                # Loop and poll get_message; this is cancellable and avoids async-generator close races.
-                while True:
-                    # timeout small so we can react quickly to cancellations
-                    msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                    if not msg:
-                        # yield control; nothing to do this iteration
-                        await asyncio.sleep(0) 
-                        continue
-
-                    # msg example: {'type': 'message', 'pattern': None, 'channel': 'telemetry:all', 'data': '...'}
-                    if msg.get("type") != "message":
-                        continue
-
-                    raw = msg.get("data")
-                    try:
-                        payload = json.loads(raw)
-                    except Exception:
-                        logger.warning("Received non-JSON Redis payload: %s", raw)
-                        continue
-
-                    device_id = payload.get("device_id")
-                    try:
-                        await manager.broadcast(device_id=device_id, payload=payload)
-                    except Exception:
-                        logger.exception("Error broadcasting payload")
-
-            except asyncio.CancelledError:
-                # Cancellation requested -> clean up and exit reader loop
-                logger.info("Redis reader task cancelled; cleaning up and exiting")
-                # attempt cleanup in finally block below
-                break
-            except Exception:
-                # Log error and try to reconnect after backoff
-                logger.exception("Unexpected error in Redis reader; reconnecting in 3s")
-                await asyncio.sleep(3)
-            finally:
-                # best-effort cleanup of pubsub + connection
-                try:
-                    if pubsub is not None:
-                        try:
-                            await pubsub.unsubscribe(REDIS_CHANNEL)
-                        except Exception:
-                            pass
-                        try:
-                            await pubsub.close()
-                        except Exception:
-                            pass
-                finally:
-                    try:
-                        if r is not None:
-                            await r.close()
-                    except Exception:
-                        pass
-
-        logger.info("Redis reader exiting")
-
-    # start the reader background task and keep a reference to cancel later
-    task = asyncio.create_task(reader(), name="redis-reader")
-    app.state.redis_task = task
-    logger.info("Started redis reader background task")
-
-@app.on_event("shutdown")
-async def stop_redis_pubsub():
-    """
-    Cancel and await the redis reader task on shutdown to avoid "Task was destroyed but it is pending".
-    """
-    task = getattr(app.state, "redis_task", None)
-    if task:
-        logger.info("Cancelling redis reader task...")
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            logger.info("Redis reader cancelled and awaited successfully")
-        except Exception:
-            logger.exception("Error waiting for redis reader task to finish")
 
 # allow only your frontend origin so cookies work across ports
 FRONTEND_ORIGIN = "http://localhost:5173"
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[FRONTEND_ORIGIN],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Celery queues whose backlog is sampled on every scrape
+MONITORED_QUEUES = ("celery", "images")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await telemetry.start_telemetry_pubsub_listener(app)
+    try:
+        yield
+    finally:
+        await telemetry.stop_telemetry_pubsub_listener()
+        await close_redis()
+        metrics.mark_process_dead(os.getpid())
+        dispose_engine()
+
+
+async def prometheus_metrics():
+    """Prometheus exposition, aggregated across API and worker processes."""
+    if settings.CELERY_BROKER_URL == settings.REDIS_URL:
+        try:
+            async with get_async_redis().pipeline(transaction=False) as pipe:
+                for q in MONITORED_QUEUES:
+                    pipe.llen(q)
+                depths = await pipe.execute()
+            for q, depth in zip(MONITORED_QUEUES, depths):
+                metrics.QUEUE_DEPTH.labels(queue=q).set(depth)
+        except Exception:
+            logger.warning("Could not sample Celery queue depth", exc_info=True)
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
 
-# routers
-app.include_router(telemetry.router)
-app.include_router(images.router)
-app.include_router(auth.router)
 
-@app.get("/health")
 def health():
     return {"status": "ok"}
 
-@app.on_event("shutdown")
-async def on_shutdown():
-    await telemetry.stop_telemetry_pubsub_listener()
-    await close_redis()
 
-@app.on_event("startup")
-async def on_startup():
-    await telemetry.start_telemetry_pubsub_listener(app)
+def create_app() -> FastAPI:
+    app = FastAPI(title="Crop Monitoring API", lifespan=lifespan)
+
+    if settings.PROFILING_ENABLED:
+        from app.core.profiling import ProfilingMiddleware
+
+        app.add_middleware(ProfilingMiddleware)
 
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[FRONTEND_ORIGIN],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
-    
\ No newline at end of file
+    # routers
+    app.include_router(telemetry.router)
+    app.include_router(images.router)
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    app.include_router(alerts.router)
+    app.include_router(indicators.router)
+    app.include_router(fleet.router)
+    app.include_router(geo.router)
+    app.include_router(heatmap.router)
+    app.include_router(access.router)
+    app.include_router(admin.router)
+
+    app.add_api_route("/health", health, methods=["GET"])
+    app.add_api_route("/metrics", prometheus_metrics, methods=["GET"], include_in_schema=False)
+    return app
+
+
+logging.basicConfig(level=logging.INFO)
+app = create_app()
@@ -1,5 +1,6 @@
 # app/routers/auth.py
 from fastapi import APIRouter, HTTPException, status, Response, Request, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from datetime import datetime, timezone
@@ -18,31 +19,46 @@ class LoginIn(BaseModel):
     username: str  # email or username
     password: str
 
+def _find_user(db: Session, username: str):
+    # Find user by email (case-insensitive)
+    return db.query(models.User).filter(
+        or_(func.lower(models.User.email) == username.lower(),
+            func.lower(models.User.name) == username.lower())).one_or_none()
+
+def _record_login(db: Session, user, new_hash: str | None):
+    # update last_login (and the rehashed password, if parameters changed)
+    user.last_login = datetime.now(timezone.utc)
+    if new_hash:
+        user.password_hash = new_hash
+    db.add(user)
+    db.commit()
+
 @router.post("/login")
 async def login(payload: LoginIn, response: Response, db: Session = Depends(get_db)):
-    # Find user by email (case-insensitive)
-    user = db.query(models.User).filter(
-        or_(func.lower(models.User.email) == payload.username.lower(), 
-            func.lower(models.User.name) == payload.username.lower())).one_or_none()
+    # DB work and bcrypt both run off the event loop so a login burst
+    # doesn't stall WebSockets and other async requests in this process
+    user = await run_in_threadpool(_find_user, db, payload.username)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     # verify hashed password
-    if not security.verify_password(payload.password, user.password_hash):
+    try:
+        ok, new_hash = await security.verify_and_update_password(payload.password, user.password_hash)
+    except security.PasswordHashBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many logins, retry shortly",
+                            headers={"Retry-After": "1"})
+    if not ok:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     # check status
     if getattr(user, "status", "activo") != "activo":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is inactive")
 
-    # update last_login
-    user.last_login = datetime.now(timezone.utc)
-    db.add(user)
-    db.commit()
+    await run_in_threadpool(_record_login, db, user, new_hash)
 
     # create tokens
     user_sub = str(user.id)
-    access_token = security.create_access_token(user_sub)
+    access_token = security.create_access_token(user_sub, role=user.role, status=user.status or "activo")
     refresh_jti = await security.create_refresh_token(user_sub)
 
     # set refresh cookie (httpOnly)
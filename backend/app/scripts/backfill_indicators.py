@@ -0,0 +1,52 @@
+# backend/app/scripts/backfill_indicators.py
+"""
+Build daily_indicators for measurements stored before the table existed (or
+rebuild a range after changing INDICATORS_TZ / INDICATORS_MAX_GAP_S).
+
+Each device-day is recomputed from raw rows, one day per transaction, so it
+can run next to live ingestion.
+
+    python -m app.scripts.backfill_indicators --start 2025-01-01
+    python -m app.scripts.backfill_indicators --device <uuid> --start 2025-06-01 --end 2025-06-30
+"""
+import argparse
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+
+from app.db.session import SessionLocal
+from app.db import models
+from app.workers import indicators
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--device", type=uuid.UUID, action="append", help="repeatable; default: every device with data")
+    ap.add_argument("--start", type=date.fromisoformat, help="default: first measurement of each device")
+    ap.add_argument("--end", type=date.fromisoformat, help="default: day of the last measurement of each device")
+    args = ap.parse_args(argv)
+
+    M = models.Measurement
+    db = SessionLocal()
+    try:
+        q = select(M.device_id, func.min(M.time), func.max(M.time)).group_by(M.device_id)
+        if args.device:
+            q = q.where(M.device_id.in_(args.device))
+        spans = db.execute(q).all()
+        total = 0
+        for device_id, first, last in spans:
+            day = args.start or indicators.local_day(first.timestamp())[0]
+            end = args.end or indicators.local_day(last.timestamp())[0]
+            while day <= end:
+                indicators.recompute_day(db, device_id, day)
+                day += timedelta(days=1)
+                total += 1
+            print(f"{device_id}: done")
+    finally:
+        db.close()
+    print(f"✅ {total} device-days recomputed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# backend/app/scripts/migrate.py
+"""
+Bring the database schema to the latest migration. Run once per deploy
+(the compose ``migrate`` service) instead of at API start-up.
+
+The migration chain starts from tables that used to be created by
+``create_all`` when ``app.main`` was imported, so an empty database is
+initialised from the models and stamped at head; any other database is
+upgraded normally.
+
+    python -m app.scripts.migrate
+"""
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from app.core.config import settings
+from app.db.session import Base, get_engine
+from app.db import models  # noqa: F401  (registers the tables on Base)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini")
+
+
+def main():
+    cfg = Config(os.path.abspath(ALEMBIC_INI))
+    cfg.set_main_option("script_location", os.path.join(os.path.dirname(os.path.abspath(ALEMBIC_INI)), "migrations"))
+    cfg.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+
+    engine = get_engine()
+    tables = set(inspect(engine).get_table_names())
+    if not tables - {"alembic_version"}:
+        Base.metadata.create_all(bind=engine)
+        command.stamp(cfg, "head")
+        print("✅ empty database initialised and stamped at head")
+    else:
+        command.upgrade(cfg, "head")
+        print("✅ schema upgraded to head")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# backend/app/scripts/seed_devices.py
+"""
+Register N deterministic devices for load testing (tools/device_simulator.py).
+
+Device ids are uuid5(LOADGEN_NAMESPACE, "loadgen-<i>"), so the load generator
+can derive the same ids without talking to the DB.
+
+    python -m app.scripts.seed_devices --count 2000 --token devicetoken-example
+"""
+import argparse
+import uuid
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db.session import SessionLocal
+from app.db import models
+
+# keep in sync with tools/device_simulator.py
+LOADGEN_NAMESPACE = uuid.UUID("6f1d8a52-3c1e-4b8e-9a57-0c2f6a4e9b11")
+
+
+def loadgen_device_id(i: int) -> uuid.UUID:
+    return uuid.uuid5(LOADGEN_NAMESPACE, f"loadgen-{i}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--count", type=int, default=100)
+    ap.add_argument("--token", default="devicetoken-example")
+    ap.add_argument("--device-type", default="sensor-node")
+    args = ap.parse_args(argv)
+
+    rows = [
+        {
+            "id": loadgen_device_id(i),
+            "name": f"loadgen-{i}",
+            "device_type": args.device_type,
+            "token": args.token,
+            "meta": {"loadgen": True},
+        }
+        for i in range(args.count)
+    ]
+    db = SessionLocal()
+    try:
+        for start in range(0, len(rows), 1000):
+            db.execute(insert(models.Device).values(rows[start:start + 1000]).on_conflict_do_nothing(index_elements=["id"]))
+        db.commit()
+    finally:
+        db.close()
+    print(f"✅ {args.count} load-generator devices registered")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
-import boto3
-from botocore.client import Config
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from app.core.config import settings
 
+def derived_key(s3_key: str, name: str) -> str:
+    """S3 key of a derived rendition, e.g. ``camera/d/x.jpg`` -> ``camera/d/x_thumb.jpg``."""
+    base, _ = os.path.splitext(s3_key)
+    return f"{base}_{name}.jpg"
+
+@lru_cache(maxsize=None)
 def get_s3_client():
+    """Process-wide S3 client (boto3 clients are thread-safe and costly to build)."""
+    # boto3 takes ~0.1 s to import; only pay for it once S3 is actually used
+    import boto3
+    from botocore.client import Config
+
     s3 = boto3.client(
         's3',
         endpoint_url=(f"http://{settings.MINIO_ENDPOINT}" if not settings.MINIO_SECURE else f"https://{settings.MINIO_ENDPOINT}"),
@@ -19,4 +33,62 @@ def generate_presigned_put(key, expires_in=3600):
         'put_object',
         Params={'Bucket': settings.MINIO_BUCKET, 'Key': key},
         ExpiresIn=expires_in
-    )
\ No newline at end of file
+    )
+
+def generate_presigned_puts(keys, expires_in=3600):
+    """Presign many PUTs with one client; signing is local, no HTTP round trip."""
+    s3 = get_s3_client()
+    return [
+        s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': settings.MINIO_BUCKET, 'Key': key},
+            ExpiresIn=expires_in
+        )
+        for key in keys
+    ]
+
+def download_to_file(key, fileobj, chunk_size=1024 * 1024):
+    """Stream an object into ``fileobj`` chunk by chunk (never fully in memory)."""
+    s3 = get_s3_client()
+    body = s3.get_object(Bucket=settings.MINIO_BUCKET, Key=key)['Body']
+    try:
+        for chunk in body.iter_chunks(chunk_size=chunk_size):
+            fileobj.write(chunk)
+    finally:
+        body.close()
+    fileobj.flush()
+
+def upload_bytes(key, data, content_type='image/jpeg'):
+    s3 = get_s3_client()
+    s3.put_object(Bucket=settings.MINIO_BUCKET, Key=key, Body=data, ContentType=content_type)
+
+
+# key -> (url, monotonic expiry); LRU-bounded
+_get_url_cache: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+_get_url_lock = threading.Lock()
+
+def presigned_get_cached(key, expires_in=None, reuse_margin=None):
+    """Presigned GET URL for ``key``, reused until ``reuse_margin`` seconds before it expires.
+
+    Gallery pages re-sign the same thumbnails over and over; reusing the URL
+    saves the signing work and keeps URLs stable so browsers can cache images.
+    """
+    expires_in = expires_in or settings.DOWNLOAD_URL_EXPIRE_S
+    reuse_margin = settings.DOWNLOAD_URL_REUSE_MARGIN_S if reuse_margin is None else reuse_margin
+    now = time.monotonic()
+    with _get_url_lock:
+        hit = _get_url_cache.get(key)
+        if hit and hit[1] - reuse_margin > now:
+            _get_url_cache.move_to_end(key)
+            return hit[0]
+    url = get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={'Bucket': settings.MINIO_BUCKET, 'Key': key},
+        ExpiresIn=expires_in
+    )
+    with _get_url_lock:
+        _get_url_cache[key] = (url, now + expires_in)
+        _get_url_cache.move_to_end(key)
+        while len(_get_url_cache) > settings.DOWNLOAD_URL_CACHE_SIZE:
+            _get_url_cache.popitem(last=False)
+    return url
@@ -0,0 +1,409 @@
+# app/workers/alerts.py
+"""
+Streaming alert rules, checked by the worker as measurements are written.
+
+Rules (``models.AlertRule``) are compiled once into a :class:`RuleIndex`
+keyed by ``(device_id, field)``, with fleet-wide rules under
+``(None, field)``.  Checking a reading therefore touches only the rules that
+can match it, however many rules exist for other devices.  The index is
+reloaded when ``alerts:rules:version`` changes in Redis (bumped by the rules
+API), checked at most every ``ALERT_RULES_REFRESH_S``.
+
+Rule kinds:
+
+* ``threshold``  value ``op`` threshold
+* ``rate``       change per minute since the previous reading ``op`` threshold
+                 (only if that reading is at most ``window_s`` old)
+* ``sustained``  value ``op`` threshold continuously for ``window_s`` seconds
+
+The little state rate/sustained rules need (last value per device+field,
+breach start per rule+device) lives in Redis so any worker can take the next
+reading.  A fired rule is deduplicated per device for ``cooldown_s`` with a
+``SET NX`` claim; surviving alerts are inserted in one statement and
+published on the device's ``telemetry:<id>`` channel as ``type: "alert"``,
+so they reach viewers through the existing pubsub hub.
+"""
+import json
+import logging
+import operator
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field as dc_field
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.db import models
+
+logger = logging.getLogger(__name__)
+
+MEASUREMENT_FIELDS = (
+    "temperature_c",
+    "relative_humidity_pct",
+    "solar_radiance_w_m2",
+    "wind_speed_m_s",
+    "wind_direction_deg",
+    "battery_v",
+)
+KINDS = ("threshold", "rate", "sustained")
+OPS: dict[str, Callable[[float, float], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+DEFAULT_RATE_WINDOW_S = 600
+STATE_TTL_S = 24 * 3600
+
+RULES_VERSION_KEY = "alerts:rules:version"
+
+
+def _last_key(device_id: str, field: str) -> str:
+    return f"alerts:last:{device_id}:{field}"
+
+
+def _since_key(rule_id: str, device_id: str) -> str:
+    return f"alerts:since:{rule_id}:{device_id}"
+
+
+def _dedupe_key(rule_id: str, device_id: str) -> str:
+    return f"alerts:dedupe:{rule_id}:{device_id}"
+
+
+# ---------- compiled rules ----------
+@dataclass(frozen=True)
+class CompiledRule:
+    id: str
+    name: str
+    device_id: Optional[str]
+    field: str
+    kind: str
+    op: str
+    value: float
+    window_s: Optional[int]
+    severity: str
+    cooldown_s: int
+    cmp: Callable[[float, float], bool]
+
+    @classmethod
+    def from_row(cls, row) -> "CompiledRule":
+        if row.kind not in KINDS:
+            raise ValueError(f"unknown rule kind {row.kind!r}")
+        return cls(
+            id=str(row.id),
+            name=row.name,
+            device_id=str(row.device_id) if row.device_id else None,
+            field=row.field,
+            kind=row.kind,
+            op=row.op,
+            value=float(row.value),
+            window_s=row.window_s,
+            severity=row.severity or "Media",
+            cooldown_s=row.cooldown_s if row.cooldown_s is not None else 900,
+            cmp=OPS[row.op],
+        )
+
+
+class RuleIndex:
+    """Rules grouped by ``(device_id | None, field)``."""
+
+    def __init__(self, rules: Iterable[CompiledRule] = ()):
+        grouped = defaultdict(list)
+        for rule in rules:
+            grouped[(rule.device_id, rule.field)].append(rule)
+        self._by_key: dict[tuple, tuple] = {k: tuple(v) for k, v in grouped.items()}
+        self.fields = frozenset(f for _, f in self._by_key)
+        self.size = sum(len(v) for v in self._by_key.values())
+
+    def __len__(self) -> int:
+        return self.size
+
+    def match(self, device_id: str, field: str) -> tuple:
+        if field not in self.fields:
+            return ()
+        return self._by_key.get((device_id, field), ()) + self._by_key.get((None, field), ())
+
+
+def compile_rules(rows) -> RuleIndex:
+    rules = []
+    for row in rows:
+        try:
+            rules.append(CompiledRule.from_row(row))
+        except (KeyError, ValueError):
+            logger.warning("Skipping invalid alert rule %s (%s %s)", row.id, row.kind, row.op)
+    return RuleIndex(rules)
+
+
+# ---------- evaluation (pure) ----------
+@dataclass
+class Reading:
+    device_id: str
+    t: float                     # epoch seconds of the measurement
+    values: dict
+    measurement_id: Optional[int] = None
+    message_id: Optional[str] = None
+
+
+@dataclass
+class Candidate:
+    rule: CompiledRule
+    reading: Reading
+    observed: float
+    since: Optional[float] = None
+
+
+@dataclass
+class Evaluation:
+    candidates: list = dc_field(default_factory=list)
+    writes: dict = dc_field(default_factory=dict)   # key -> value to store
+    deletes: set = dc_field(default_factory=set)
+
+
+def state_keys(index: RuleIndex, readings: Iterable[Reading]) -> set[str]:
+    """Redis keys :func:`evaluate` will read for these readings."""
+    keys = set()
+    for r in readings:
+        for f in r.values:
+            for rule in index.match(r.device_id, f):
+                if rule.kind == "rate":
+                    keys.add(_last_key(r.device_id, f))
+                elif rule.kind == "sustained":
+                    keys.add(_since_key(rule.id, r.device_id))
+    return keys
+
+
+def evaluate(index: RuleIndex, readings: Iterable[Reading], state: dict) -> Evaluation:
+    """Check readings (any order, any devices) against the index.
+
+    ``state`` holds the decoded values of :func:`state_keys` (missing = no
+    state) and is updated in place, so several readings of one device in a
+    batch see each other.
+    """
+    out = Evaluation()
+    for r in sorted(readings, key=lambda r: r.t):
+        for f, v in r.values.items():
+            if v is None:
+                continue
+            rules = index.match(r.device_id, f)
+            if not rules:
+                continue
+            track_last = False
+            for rule in rules:
+                if rule.kind == "threshold":
+                    if rule.cmp(v, rule.value):
+                        out.candidates.append(Candidate(rule, r, v))
+                elif rule.kind == "rate":
+                    track_last = True
+                    prev = state.get(_last_key(r.device_id, f))
+                    window = rule.window_s or DEFAULT_RATE_WINDOW_S
+                    if prev is not None and 0 < r.t - prev[0] <= window:
+                        rate = (v - prev[1]) / (r.t - prev[0]) * 60.0
+                        if rule.cmp(rate, rule.value):
+                            out.candidates.append(Candidate(rule, r, rate))
+                else:  # sustained
+                    key = _since_key(rule.id, r.device_id)
+                    since = state.get(key)
+                    if rule.cmp(v, rule.value):
+                        if since is None or r.t < since:
+                            state[key] = r.t
+                            out.writes[key] = r.t
+                            out.deletes.discard(key)
+                        elif r.t - since >= (rule.window_s or 0):
+                            out.candidates.append(Candidate(rule, r, v, since=since))
+                    elif since is not None and r.t >= since:
+                        state[key] = None
+                        out.writes.pop(key, None)
+                        out.deletes.add(key)
+            if track_last:
+                key = _last_key(r.device_id, f)
+                prev = state.get(key)
+                # late readings must not move "previous" backwards
+                if prev is None or r.t > prev[0]:
+                    state[key] = (r.t, v)
+                    out.writes[key] = (r.t, v)
+    return out
+
+
+def alert_message(c: Candidate) -> str:
+    rule = c.rule
+    if rule.kind == "rate":
+        return f"{rule.name}: {rule.field} {c.observed:+.2f}/min ({rule.op} {rule.value:g})"
+    text = f"{rule.name}: {rule.field}={c.observed:.2f} ({rule.op} {rule.value:g})"
+    if rule.kind == "sustained" and c.since is not None:
+        text += f" for {(c.reading.t - c.since) / 60:.0f} min"
+    return text
+
+
+def alert_row(c: Candidate, now: datetime) -> dict:
+    rule, r = c.rule, c.reading
+    return {
+        "id": uuid.uuid4(),
+        "created_at": now,
+        "device_id": uuid.UUID(r.device_id),
+        "alert_type": f"{rule.kind}:{rule.field}",
+        "severity": rule.severity,
+        "message": alert_message(c),
+        "payload": {
+            "rule_id": rule.id,
+            "rule": rule.name,
+            "field": rule.field,
+            "op": rule.op,
+            "threshold": rule.value,
+            "observed": c.observed,
+            "since": c.since,
+            "reading_time": datetime.fromtimestamp(r.t, timezone.utc).isoformat(),
+            "measurement_id": r.measurement_id,
+            "message_id": r.message_id,
+        },
+        "acknowledged": False,
+    }
+
+
+def alert_message_payload(row: dict) -> dict:
+    """Pubsub/WebSocket shape of an alert row."""
+    return {
+        "type": "alert",
+        "device_id": str(row["device_id"]),
+        "time": row["payload"].get("reading_time"),
+        "alert": {
+            "id": str(row["id"]),
+            "created_at": row["created_at"].isoformat(),
+            "alert_type": row["alert_type"],
+            "severity": row["severity"],
+            "message": row["message"],
+            "payload": row["payload"],
+        },
+    }
+
+
+# ---------- engine (Redis state + DB writes) ----------
+def _encode(value) -> str:
+    return json.dumps(value)
+
+
+def _decode(raw):
+    if raw is None:
+        return None
+    value = json.loads(raw)
+    return tuple(value) if isinstance(value, list) else value
+
+
+def rules_changed(client=None, rule_id=None) -> None:
+    """Tell every worker to reload its rule index; with ``rule_id`` also drop
+    that rule's sustained-condition state, so an edited rule starts over.
+
+    Called after the rule change is committed, so Redis trouble is logged,
+    not raised.
+    """
+    client = client or get_sync_redis()
+    try:
+        client.incr(RULES_VERSION_KEY)
+        if rule_id is not None:
+            keys = list(client.scan_iter(match=_since_key(str(rule_id), "*"), count=1000))
+            if keys:
+                client.delete(*keys)
+    except Exception:
+        logger.exception("Could not announce alert rule change (rule %s)", rule_id)
+
+
+class AlertEngine:
+    def __init__(self, redis_client=None, refresh_s: Optional[float] = None):
+        self._redis_client = redis_client
+        self.refresh_s = settings.ALERT_RULES_REFRESH_S if refresh_s is None else refresh_s
+        self._index: Optional[RuleIndex] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return self._redis_client or get_sync_redis()
+
+    def index(self, db) -> RuleIndex:
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.refresh_s:
+            return self._index
+        with self._lock:
+            if self._index is None or now - self._checked_at >= self.refresh_s:
+                version = self.redis.get(RULES_VERSION_KEY)
+                if self._index is None or version != self._version:
+                    rows = db.execute(select(models.AlertRule).where(models.AlertRule.enabled.is_(True))).scalars().all()
+                    self._index = compile_rules(rows)
+                    self._version = version
+                    logger.info("Alert rules loaded: %d rule(s), version %s", len(self._index), version)
+                self._checked_at = now
+        return self._index
+
+    def process(self, db, readings: list[Reading]) -> list[dict]:
+        """Evaluate, dedupe, insert and publish; returns the inserted alert rows."""
+        index = self.index(db)
+        if not index:
+            return []
+        keys = sorted(state_keys(index, readings))
+        state = {}
+        if keys:
+            state = {k: _decode(v) for k, v in zip(keys, self.redis.mget(keys))}
+        result = evaluate(index, readings, state)
+
+        # one claim per (rule, device) per batch
+        unique = {}
+        for c in result.candidates:
+            unique.setdefault((c.rule.id, c.reading.device_id), c)
+        now = datetime.now(timezone.utc)
+        claims = [
+            (_dedupe_key(c.rule.id, c.reading.device_id), c.rule.cooldown_s, alert_row(c, now))
+            for c in unique.values()
+        ]
+        return self.fire(db, claims, writes=result.writes, deletes=result.deletes)
+
+    def fire(self, db, claims: list, writes: Optional[dict] = None, deletes: Iterable[str] = ()) -> list[dict]:
+        """Claim, insert and publish alert rows.
+
+        ``claims`` is a list of ``(dedupe_key, cooldown_s, row)``; a row is
+        only inserted if its key was not claimed within ``cooldown_s``.  State
+        ``writes``/``deletes`` ride in the same round trip as the claims.
+        """
+        deletes = set(deletes)
+        with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in (writes or {}).items():
+                pipe.set(key, _encode(value), ex=STATE_TTL_S)
+            if deletes:
+                pipe.delete(*deletes)
+            for key, cooldown_s, _ in claims:
+                pipe.set(key, "1", nx=True, ex=max(cooldown_s, 1))
+            replies = pipe.execute()
+        claimed = replies[len(replies) - len(claims):] if claims else []
+        fired = [(key, row) for (key, _, row), ok in zip(claims, claimed) if ok]
+        if not fired:
+            return []
+
+        rows = [row for _, row in fired]
+        try:
+            db.execute(insert(models.Alert), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # give the claims back so the next reading can raise the alert again
+            self.redis.delete(*(key for key, _ in fired))
+            raise
+
+        with self.redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                pipe.publish(f"telemetry:{row['device_id']}", json.dumps(alert_message_payload(row)))
+            pipe.execute()
+        return rows
+
+
+_engine: Optional[AlertEngine] = None
+
+
+def get_alert_engine() -> AlertEngine:
+    global _engine
+    if _engine is None:
+        _engine = AlertEngine()
+    return _engine
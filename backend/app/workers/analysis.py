@@ -0,0 +1,141 @@
+# app/workers/analysis.py
+"""
+Crop-health statistics for camera frames (ExG / VARI greenness, canopy cover).
+
+Like ``app.workers.images`` this module has no app imports so it can run in
+the image process pool.  The frame is walked tile by tile: the float working
+set is one tile, and per-tile sums/histograms are folded into running totals.
+
+The 8-bit raster is decoded whole, so its size is what bounds memory.  With
+``max_edge`` (``IMAGE_ANALYSIS_MAX_EDGE`` in the worker) a JPEG is decoded
+directly at the smallest 1/2, 1/4 or 1/8 scale that still covers
+``max_edge`` (libjpeg draft mode), i.e. under ``2 * max_edge`` per side
+whatever the camera resolution.  Cover and index statistics are ratios, so
+they barely move with the scale.  Other formats are decoded at full size.
+"""
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+ANALYSIS_VERSION = 1
+HIST_BINS = 32
+# index ranges (ExG on chromatic coordinates is bounded to [-1, 2])
+EXG_RANGE = (-1.0, 2.0)
+VARI_RANGE = (-1.0, 1.0)
+# ExG above this counts as vegetation for canopy cover
+CANOPY_EXG_THRESHOLD = 0.1
+
+
+class _Acc:
+    """Running count / sum / sum of squares / histogram for one index."""
+
+    def __init__(self, value_range):
+        self.range = value_range
+        self.n = 0
+        self.s = 0.0
+        self.ss = 0.0
+        self.hist = np.zeros(HIST_BINS, dtype=np.int64)
+
+    def add(self, values: np.ndarray) -> None:
+        if values.size == 0:
+            return
+        self.n += values.size
+        self.s += float(values.sum(dtype=np.float64))
+        self.ss += float(np.square(values, dtype=np.float64).sum())
+        self.hist += np.histogram(values, bins=HIST_BINS, range=self.range)[0]
+
+    def result(self) -> dict:
+        mean = self.s / self.n if self.n else None
+        std = float(np.sqrt(max(self.ss / self.n - mean * mean, 0.0))) if self.n else None
+        return {"mean": mean, "std": std, "n": self.n, "range": list(self.range), "hist": self.hist.tolist()}
+
+
+def tile_indices(rgb: np.ndarray, threshold: float = CANOPY_EXG_THRESHOLD):
+    """ExG, VARI (valid pixels only) and vegetation mask for one float32 RGB tile."""
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    total = r + g + b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # chromatic coordinates; black pixels carry no colour information
+        exg = np.where(total > 0, (2 * g - r - b) / total, 0.0)
+        denom = g + r - b
+        vari = (g - r) / denom
+    vari = vari[np.isfinite(vari) & (np.abs(denom) > 1e-6)]
+    vari = np.clip(vari, *VARI_RANGE)
+    return exg, vari, exg > threshold
+
+
+def analyze_image(src_path: str, tile: int = 512, threshold: float = CANOPY_EXG_THRESHOLD, max_edge: Optional[int] = None) -> dict:
+    """Tile-wise vegetation statistics of the image at ``src_path`` (see the module docstring for ``max_edge``)."""
+    with Image.open(src_path) as im:
+        source_width, source_height = im.size
+        if max_edge:
+            im.draft("RGB", (max_edge, max_edge))
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        else:
+            # decode in place; convert() would keep a second full copy
+            im.load()
+        width, height = im.size
+        exg_acc, vari_acc = _Acc(EXG_RANGE), _Acc(VARI_RANGE)
+        canopy = 0
+        for top in range(0, height, tile):
+            for left in range(0, width, tile):
+                box = (left, top, min(left + tile, width), min(top + tile, height))
+                rgb = np.asarray(im.crop(box), dtype=np.float32)
+                exg, vari, mask = tile_indices(rgb, threshold)
+                exg_acc.add(exg.ravel())
+                vari_acc.add(vari)
+                canopy += int(mask.sum())
+
+    pixels = width * height
+    return {
+        "version": ANALYSIS_VERSION,
+        "width": width,
+        "height": height,
+        "source_width": source_width,
+        "source_height": source_height,
+        "tile": tile,
+        "pixels": pixels,
+        "canopy_cover": canopy / pixels if pixels else None,
+        "canopy_threshold": threshold,
+        "exg": exg_acc.result(),
+        "vari": vari_acc.result(),
+    }
+
+
+def merge_session_aggregate(agg: Optional[dict], result: dict) -> dict:
+    """Fold one image's :func:`analyze_image` result into a session aggregate.
+
+    Means are pixel-weighted and histograms summed, so the aggregate does not
+    depend on the order in which frames are processed.
+    """
+    agg = dict(agg or {})
+    images = agg.get("images", 0)
+    pixels = agg.get("pixels", 0)
+    new_pixels = pixels + result["pixels"]
+
+    def wmean(old, new, w_old, w_new):
+        if old is None:
+            return new
+        if new is None:
+            return old
+        return (old * w_old + new * w_new) / (w_old + w_new) if (w_old + w_new) else None
+
+    out = {
+        "version": ANALYSIS_VERSION,
+        "images": images + 1,
+        "pixels": new_pixels,
+        "canopy_cover": wmean(agg.get("canopy_cover"), result["canopy_cover"], pixels, result["pixels"]),
+    }
+    for key in ("exg", "vari"):
+        prev = agg.get(key) or {}
+        cur = result[key]
+        hist = prev.get("hist")
+        out[key] = {
+            "mean": wmean(prev.get("mean"), cur["mean"], prev.get("n", 0), cur["n"]),
+            "n": prev.get("n", 0) + cur["n"],
+            "range": cur["range"],
+            "hist": [a + b for a, b in zip(hist, cur["hist"])] if hist else list(cur["hist"]),
+        }
+    return out
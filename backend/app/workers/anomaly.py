@@ -0,0 +1,268 @@
+# app/workers/anomaly.py
+"""
+Online anomaly detectors for incoming measurements.
+
+Two checks per ``(device, field)``, each with a fixed-size state so the cost
+per reading does not depend on how much history the device has:
+
+* ``zscore``  exponentially weighted mean/variance (EWMA); a reading more than
+              ``ANOMALY_Z_THRESHOLD`` standard deviations away from the mean is
+              flagged once ``ANOMALY_WARMUP`` readings have been seen.  Values
+              fed back into the average are clipped to that band, so one spike
+              does not inflate the variance and hide the next one.
+* ``stuck``   the value has not moved by more than the field's resolution for
+              at least ``ANOMALY_STUCK_S`` seconds and ``ANOMALY_STUCK_MIN_COUNT``
+              readings (a frozen humidity or temperature sensor).
+
+The state of a device is one Redis hash, ``anomaly:<device_id>``, with one
+small JSON entry per field, so any worker can take the next reading.
+:func:`detect` is pure and runs on NumPy arrays: a batch of readings is laid
+out as one row per ``(device, field)`` series and stepped through in time
+order, every series at once.  With the single-row writer a batch is one
+reading; a batching writer gets the same code path for free.
+
+Readings older than the stored state (late or replayed) are neither checked
+nor folded in.  Two workers handling the same device at the same instant
+can lose one update of the average, which only shifts it by one step.
+"""
+import json
+import uuid
+from dataclasses import dataclass, field as dc_field
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.workers.alerts import _dedupe_key
+
+STATE_TTL_S = 7 * 24 * 3600
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    min_std: float                   # floor for the EWMA standard deviation
+    stuck_eps: Optional[float]       # None: a constant value is normal
+
+
+# solar radiance sits at 0 all night and wind at 0 on calm days, so neither
+# gets a stuck check; wind direction is circular and has no z-score either
+FIELDS = {
+    "temperature_c": FieldSpec(min_std=0.3, stuck_eps=0.01),
+    "relative_humidity_pct": FieldSpec(min_std=1.0, stuck_eps=0.01),
+    "solar_radiance_w_m2": FieldSpec(min_std=20.0, stuck_eps=None),
+    "wind_speed_m_s": FieldSpec(min_std=0.3, stuck_eps=None),
+    "battery_v": FieldSpec(min_std=0.02, stuck_eps=None),
+}
+
+# state entry: [t, n, mean, var, stuck_value, stuck_since, stuck_n]
+_EMPTY = (np.nan, 0.0, 0.0, 0.0, np.nan, np.nan, 0.0)
+
+
+def _unpack(entry) -> tuple:
+    if not entry:
+        return _EMPTY
+    return tuple(np.nan if v is None else v for v in entry)
+
+
+def _state_key(device_id: str) -> str:
+    return f"anomaly:{device_id}"
+
+
+@dataclass
+class Params:
+    alpha: float
+    z_threshold: float
+    warmup: int
+    stuck_s: float
+    stuck_min_count: int
+    reset_gap_s: float
+
+    @classmethod
+    def from_settings(cls) -> "Params":
+        return cls(
+            alpha=settings.ANOMALY_EWMA_ALPHA,
+            z_threshold=settings.ANOMALY_Z_THRESHOLD,
+            warmup=settings.ANOMALY_WARMUP,
+            stuck_s=settings.ANOMALY_STUCK_S,
+            stuck_min_count=settings.ANOMALY_STUCK_MIN_COUNT,
+            reset_gap_s=settings.ANOMALY_RESET_GAP_S,
+        )
+
+
+@dataclass
+class Detection:
+    flags: list = dc_field(default_factory=list)     # per reading: list of flag dicts
+    state: dict = dc_field(default_factory=dict)     # (device_id, field) -> new entry
+
+
+def detect(readings: list, state: dict, params: Params) -> Detection:
+    """Check ``readings`` (``alerts.Reading``) against ``state``.
+
+    ``state`` maps ``(device_id, field)`` to a stored entry (missing = new
+    series).  Returns the flags in the order of ``readings`` and the entries
+    to store back; nothing is written here.
+    """
+    out = Detection(flags=[[] for _ in readings])
+    series: dict[tuple, list] = {}
+    for i in sorted(range(len(readings)), key=lambda i: readings[i].t):
+        r = readings[i]
+        for f, v in r.values.items():
+            if v is None or f not in FIELDS:
+                continue
+            series.setdefault((r.device_id, f), []).append((i, r.t, float(v)))
+    if not series:
+        return out
+
+    keys = list(series)
+    n_series, length = len(keys), max(len(s) for s in series.values())
+    T = np.full((n_series, length), np.nan)
+    X = np.full((n_series, length), np.nan)
+    idx = np.full((n_series, length), -1, dtype=np.int64)
+    for s, key in enumerate(keys):
+        for k, (i, t, v) in enumerate(series[key]):
+            idx[s, k], T[s, k], X[s, k] = i, t, v
+
+    cur = np.array([_unpack(state.get(k)) for k in keys], dtype=np.float64)
+    last_t, n, mean, var, stuck_v, stuck_since, stuck_n = (cur[:, j].copy() for j in range(7))
+    min_var = np.array([FIELDS[f].min_std ** 2 for _, f in keys])
+    eps = np.array([np.nan if FIELDS[f].stuck_eps is None else FIELDS[f].stuck_eps for _, f in keys])
+    a, thr = params.alpha, params.z_threshold
+
+    for k in range(length):
+        t, x = T[:, k], X[:, k]
+        with np.errstate(invalid="ignore"):
+            # padding and readings not newer than the state are skipped
+            valid = ~np.isnan(x) & ~(t <= last_t)
+            n = np.where(valid & (t - last_t > params.reset_gap_s), 0.0, n)
+
+            before = mean
+            std = np.sqrt(np.maximum(var, min_var))
+            z = (x - mean) / std
+            warm = valid & (n >= params.warmup)
+            z_flag = warm & (np.abs(z) > thr)
+
+            fed = np.where(warm, np.clip(x, mean - thr * std, mean + thr * std), x)
+            diff = fed - mean
+            incr = a * diff
+            first = valid & (n == 0)
+            mean = np.where(first, x, np.where(valid, mean + incr, mean))
+            var = np.where(first, 0.0, np.where(valid, (1 - a) * (var + diff * incr), var))
+            n = np.where(valid, n + 1, n)
+            last_t = np.where(valid, t, last_t)
+
+            same = valid & (np.abs(x - stuck_v) <= eps)
+            moved = valid & ~same
+            stuck_v = np.where(moved, x, stuck_v)
+            stuck_since = np.where(moved, t, stuck_since)
+            stuck_n = np.where(same, stuck_n + 1, np.where(moved, 1.0, stuck_n))
+            stuck_flag = same & (stuck_n >= params.stuck_min_count) & (t - stuck_since >= params.stuck_s)
+
+        for s in np.flatnonzero(z_flag | stuck_flag):
+            field_name = keys[s][1]
+            flags = out.flags[idx[s, k]]
+            if z_flag[s]:
+                flags.append({
+                    "field": field_name, "detector": "zscore", "value": float(x[s]),
+                    "z": round(float(z[s]), 2), "mean": round(float(before[s]), 4),
+                })
+            if stuck_flag[s]:
+                flags.append({
+                    "field": field_name, "detector": "stuck", "value": float(x[s]),
+                    "for_s": round(float(t[s] - stuck_since[s]), 1), "count": int(stuck_n[s]),
+                })
+
+    for s, key in enumerate(keys):
+        if n[s] != cur[s, 1] or last_t[s] != cur[s, 0]:
+            out.state[key] = [float(v) if np.isfinite(v) else None
+                              for v in (last_t[s], n[s], mean[s], var[s], stuck_v[s], stuck_since[s], stuck_n[s])]
+    return out
+
+
+# ---------- alerts ----------
+def alert_message(flag: dict) -> str:
+    if flag["detector"] == "stuck":
+        return f"Stuck sensor: {flag['field']}={flag['value']:.2f} unchanged for {flag['for_s'] / 60:.0f} min"
+    return f"Anomaly: {flag['field']}={flag['value']:.2f} (z={flag['z']:+.1f}, EWMA {flag['mean']:.2f})"
+
+
+def alert_claims(readings: list, flags: list, now: datetime) -> list:
+    """``AlertEngine.fire`` claims for flagged readings, one per detector/field/device."""
+    claims, seen = [], set()
+    for r, reading_flags in zip(readings, flags):
+        for flag in reading_flags:
+            name = f"anomaly:{flag['detector']}:{flag['field']}"
+            if (name, r.device_id) in seen:
+                continue
+            seen.add((name, r.device_id))
+            row = {
+                "id": uuid.uuid4(),
+                "created_at": now,
+                "device_id": uuid.UUID(r.device_id),
+                "alert_type": f"{flag['detector']}:{flag['field']}",
+                "severity": settings.ANOMALY_SEVERITY,
+                "message": alert_message(flag),
+                "payload": {
+                    **flag,
+                    "reading_time": datetime.fromtimestamp(r.t, timezone.utc).isoformat(),
+                    "measurement_id": r.measurement_id,
+                    "message_id": r.message_id,
+                },
+                "acknowledged": False,
+            }
+            claims.append((_dedupe_key(name, r.device_id), settings.ANOMALY_COOLDOWN_S, row))
+    return claims
+
+
+# ---------- Redis state ----------
+class AnomalyDetector:
+    def __init__(self, redis_client=None, params: Optional[Params] = None):
+        self._redis_client = redis_client
+        self.params = params or Params.from_settings()
+
+    @property
+    def redis(self):
+        return self._redis_client or get_sync_redis()
+
+    def check(self, readings: list) -> Detection:
+        """Load the state of the readings' devices (one round trip) and detect."""
+        wanted: dict[str, list] = {}
+        for r in readings:
+            fields = wanted.setdefault(r.device_id, [])
+            fields.extend(f for f in r.values if f in FIELDS and f not in fields)
+        state = {}
+        devices = [d for d, fields in wanted.items() if fields]
+        if devices:
+            with self.redis.pipeline(transaction=False) as pipe:
+                for d in devices:
+                    pipe.hmget(_state_key(d), wanted[d])
+                replies = pipe.execute()
+            for d, values in zip(devices, replies):
+                for f, raw in zip(wanted[d], values):
+                    if raw is not None:
+                        state[(d, f)] = json.loads(raw)
+        return detect(readings, state, self.params)
+
+    def save(self, detection: Detection) -> None:
+        """Store the updated state; call once the readings are committed."""
+        if not detection.state:
+            return
+        by_device: dict[str, dict] = {}
+        for (d, f), entry in detection.state.items():
+            by_device.setdefault(d, {})[f] = json.dumps(entry)
+        with self.redis.pipeline(transaction=False) as pipe:
+            for d, mapping in by_device.items():
+                pipe.hset(_state_key(d), mapping=mapping)
+                pipe.expire(_state_key(d), STATE_TTL_S)
+            pipe.execute()
+
+
+_detector: Optional[AnomalyDetector] = None
+
+
+def get_detector() -> AnomalyDetector:
+    global _detector
+    if _detector is None:
+        _detector = AnomalyDetector()
+    return _detector
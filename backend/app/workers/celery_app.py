@@ -2,7 +2,10 @@
 # app/workers/celery_app.py
 import os
 from celery import Celery
+from celery.signals import worker_process_shutdown
 from app.core.config import settings
+from app.core.metrics import mark_process_dead
+from app.core.redis import close_sync_redis
 
 celery = Celery(
     "worker",
@@ -17,4 +20,21 @@ celery.conf.update(
     result_serializer='json',
     accept_content=['json'],
     enable_utc=True,
+    # image decoding is CPU heavy: keep it off the telemetry queue so a burst
+    # of uploads never delays measurements
+    task_routes={"app.workers.tasks.process_image": {"queue": "images"}},
+    # run with `celery ... beat` (compose service "beat"), exactly one instance
+    beat_schedule={
+        "sweep-offline-devices": {
+            "task": "app.workers.tasks.sweep_offline_devices",
+            "schedule": settings.HEALTH_SWEEP_S,
+            "options": {"expires": settings.HEALTH_SWEEP_S},
+        },
+    },
 )
+
+
+@worker_process_shutdown.connect
+def _close_pools(pid=None, **kwargs):
+    close_sync_redis()
+    mark_process_dead(pid or os.getpid())
@@ -0,0 +1,289 @@
+# app/workers/fleet.py
+"""
+Fleet health: per-device liveness and link-quality state kept in Redis.
+
+Every message a worker handles (stored or duplicate) runs one Lua script
+against ``health:<device_id>``, a small hash with fixed fields, so the cost
+per message and per read is O(1) however much history the device has:
+
+* ``last_seen``     server receipt time of the newest message
+* ``rate``          message rate, exponentially decayed with ``HEALTH_RATE_TAU_S``
+                    (per second; also decayed to "now" when read)
+* ``msgs`` / ``dups`` and ``dup_rate`` (EWMA of the duplicate fraction)
+* ``gaps``          silences longer than ``HEALTH_GAP_S``, plus ``last_gap_s``
+* ``skew``          EWMA of device timestamp minus receipt time (a backlog
+                    upload shows up as a large negative skew while it lasts)
+* ``latest``        JSON of the newest reading's values, for map popups
+* ``batt``          smoothed ``battery_v`` and ``batt_trend`` in V/s, measured
+                    over spans of at least ``HEALTH_BATTERY_TREND_S``
+
+The script also keeps ``health:last_seen`` (a sorted set scored by last
+receipt time) so the offline sweep is a range query, and clears the device
+from ``health:offline`` when it talks again.  Nothing here reads
+``measurements``.
+"""
+import json
+import math
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.workers.alerts import _dedupe_key
+
+LAST_SEEN_KEY = "health:last_seen"
+OFFLINE_KEY = "health:offline"
+SWEEP_CUTOFF_KEY = "health:sweep:cutoff"
+STATE_TTL_S = 30 * 24 * 3600
+
+FIELDS = (
+    "last_seen", "last_ts", "rate", "msgs", "dups", "dup_rate", "gaps", "last_gap_s",
+    "skew", "last_skew", "batt", "batt_trend", "batt_ref", "batt_ref_t",
+)
+
+
+def _state_key(device_id: str) -> str:
+    return f"health:{device_id}"
+
+
+# KEYS: hash, last-seen zset, offline set
+# ARGV: device_id, received_at, device_ts, dup (0/1), battery ("" = none),
+#       rate tau, ewma alpha, gap_s, ttl, battery trend span, trend alpha,
+#       latest values JSON ("" = don't store)
+UPDATE_LUA = """
+local h = KEYS[1]
+local now = tonumber(ARGV[2])
+local ts = tonumber(ARGV[3])
+local dup = tonumber(ARGV[4])
+local batt = tonumber(ARGV[5])
+local tau = tonumber(ARGV[6])
+local a = tonumber(ARGV[7])
+local gap_s = tonumber(ARGV[8])
+local span = tonumber(ARGV[10])
+local ta = tonumber(ARGV[11])
+
+local s = redis.call('HMGET', h, 'last_seen', 'last_ts', 'rate', 'dup_rate', 'skew',
+                     'batt', 'batt_trend', 'batt_ref', 'batt_ref_t')
+local last_seen = tonumber(s[1])
+local rate = tonumber(s[3]) or 0
+local dup_rate = tonumber(s[4]) or 0
+local out = {}
+
+if last_seen then
+  local dt = now - last_seen
+  if dt > 0 then
+    rate = rate * math.exp(-dt / tau)
+    if dt > gap_s then
+      redis.call('HINCRBY', h, 'gaps', 1)
+      out[#out + 1] = 'last_gap_s'; out[#out + 1] = dt
+    end
+  end
+  if now > last_seen then
+    out[#out + 1] = 'last_seen'; out[#out + 1] = now
+  else
+    now = last_seen
+  end
+else
+  out[#out + 1] = 'last_seen'; out[#out + 1] = now
+end
+rate = rate + 1 / tau
+dup_rate = dup_rate * (1 - a) + a * dup
+out[#out + 1] = 'rate'; out[#out + 1] = rate
+out[#out + 1] = 'dup_rate'; out[#out + 1] = dup_rate
+redis.call('HINCRBY', h, 'msgs', 1)
+if dup == 1 then
+  redis.call('HINCRBY', h, 'dups', 1)
+else
+  local last_ts = tonumber(s[2])
+  if not last_ts or ts > last_ts then
+    out[#out + 1] = 'last_ts'; out[#out + 1] = ts
+    if ARGV[12] ~= '' then
+      out[#out + 1] = 'latest'; out[#out + 1] = ARGV[12]
+    end
+  end
+  local skew = ts - tonumber(ARGV[2])
+  local avg = tonumber(s[5])
+  if avg then skew = avg * (1 - a) + a * skew end
+  out[#out + 1] = 'skew'; out[#out + 1] = skew
+  out[#out + 1] = 'last_skew'; out[#out + 1] = ts - tonumber(ARGV[2])
+
+  if batt then
+    local level = tonumber(s[6])
+    local ref, ref_t = tonumber(s[8]), tonumber(s[9])
+    if level then level = level * (1 - a) + a * batt else level = batt end
+    out[#out + 1] = 'batt'; out[#out + 1] = level
+    if not ref_t then
+      out[#out + 1] = 'batt_ref'; out[#out + 1] = level
+      out[#out + 1] = 'batt_ref_t'; out[#out + 1] = ts
+    elseif ts - ref_t >= span then
+      local slope = (level - ref) / (ts - ref_t)
+      local trend = tonumber(s[7])
+      if trend then slope = trend * (1 - ta) + ta * slope end
+      out[#out + 1] = 'batt_trend'; out[#out + 1] = slope
+      out[#out + 1] = 'batt_ref'; out[#out + 1] = level
+      out[#out + 1] = 'batt_ref_t'; out[#out + 1] = ts
+    end
+  end
+end
+
+redis.call('HSET', h, unpack(out))
+redis.call('EXPIRE', h, tonumber(ARGV[9]))
+redis.call('ZADD', KEYS[2], now, ARGV[1])
+return redis.call('SREM', KEYS[3], ARGV[1])
+"""
+
+
+class FleetHealth:
+    def __init__(self, redis_client=None):
+        self._redis_client = redis_client
+        self._script = None
+
+    @property
+    def redis(self):
+        return self._redis_client or get_sync_redis()
+
+    def record(self, device_id: str, received_at: float, device_ts: float,
+               duplicate: bool = False, battery_v: Optional[float] = None,
+               values: Optional[dict] = None) -> bool:
+        """Fold one message into the device's state; True if it was offline.
+
+        ``values`` (the reading) is kept as ``latest`` when the message is
+        the newest one seen for the device.
+        """
+        if self._script is None:
+            self._script = self.redis.register_script(UPDATE_LUA)
+        back = self._script(
+            keys=[_state_key(device_id), LAST_SEEN_KEY, OFFLINE_KEY],
+            args=[
+                device_id, received_at, device_ts, int(duplicate), "" if battery_v is None else battery_v,
+                settings.HEALTH_RATE_TAU_S, settings.HEALTH_EWMA_ALPHA, settings.HEALTH_GAP_S,
+                STATE_TTL_S, settings.HEALTH_BATTERY_TREND_S, settings.HEALTH_TREND_ALPHA,
+                "" if values is None else json.dumps(values),
+            ],
+            client=self.redis,
+        )
+        return bool(back)
+
+    def fleet(self, device_ids: Iterable[str], latest: bool = False) -> dict[str, dict]:
+        """Raw state of many devices in one round trip (missing = never seen).
+
+        With ``latest=True`` each state also carries the newest reading's
+        values under ``"latest"``.
+        """
+        ids = list(device_ids)
+        if not ids:
+            return {}
+        fields = FIELDS + ("latest",) if latest else FIELDS
+        with self.redis.pipeline(transaction=False) as pipe:
+            for d in ids:
+                pipe.hmget(_state_key(d), fields)
+            replies = pipe.execute()
+        out = {}
+        for d, values in zip(ids, replies):
+            if not any(v is not None for v in values):
+                continue
+            state = {f: float(v) for f, v in zip(FIELDS, values) if v is not None}
+            if latest and values[-1] is not None:
+                state["latest"] = json.loads(values[-1])
+            out[d] = state
+        return out
+
+    def sweep(self, now: float) -> list[tuple[str, float]]:
+        """Devices that went silent since the previous sweep, with their last-seen time.
+
+        Only the slice of ``health:last_seen`` that crossed the offline
+        threshold since the last sweep is read, so devices that have been
+        offline for weeks cost nothing per run.
+        """
+        cutoff = now - settings.HEALTH_OFFLINE_S
+        previous = self.redis.get(SWEEP_CUTOFF_KEY)
+        low = "-inf" if previous is None else previous
+        silent = self.redis.zrangebyscore(LAST_SEEN_KEY, low, f"({cutoff}", withscores=True)
+        new = set(self.mark_offline([d for d, _ in silent]))
+        self.redis.set(SWEEP_CUTOFF_KEY, cutoff)
+        return [(d, s) for d, s in silent if d in new]
+
+    def mark_offline(self, device_ids: list[str]) -> list[str]:
+        """Add to the offline set; returns the ones that were not there yet."""
+        if not device_ids:
+            return []
+        with self.redis.pipeline(transaction=False) as pipe:
+            for d in device_ids:
+                pipe.sadd(OFFLINE_KEY, d)
+            added = pipe.execute()
+        return [d for d, n in zip(device_ids, added) if n]
+
+
+def status_of(age_s: Optional[float]) -> str:
+    if age_s is None:
+        return "never"
+    if age_s <= settings.HEALTH_STALE_S:
+        return "online"
+    if age_s <= settings.HEALTH_OFFLINE_S:
+        return "stale"
+    return "offline"
+
+
+def describe(state: Optional[dict], now: float) -> dict:
+    """API shape of one device's state (``None`` = never seen)."""
+    if not state:
+        return {"status": "never"}
+    last_seen = state.get("last_seen")
+    age = max(0.0, now - last_seen) if last_seen else None
+    rate = state.get("rate", 0.0) * math.exp(-age / settings.HEALTH_RATE_TAU_S) if age is not None else 0.0
+    trend = state.get("batt_trend")
+    return {
+        "status": status_of(age),
+        "last_seen": datetime.fromtimestamp(last_seen, timezone.utc) if last_seen else None,
+        "age_s": round(age, 1) if age is not None else None,
+        "last_measurement": datetime.fromtimestamp(state["last_ts"], timezone.utc) if "last_ts" in state else None,
+        "rate_per_min": round(rate * 60, 3),
+        "messages": int(state.get("msgs", 0)),
+        "duplicates": int(state.get("dups", 0)),
+        "dup_rate": round(state.get("dup_rate", 0.0), 4),
+        "gaps": int(state.get("gaps", 0)),
+        "last_gap_s": state.get("last_gap_s"),
+        "clock_skew_s": round(state["skew"], 2) if "skew" in state else None,
+        "last_clock_skew_s": round(state["last_skew"], 2) if "last_skew" in state else None,
+        "battery_v": round(state["batt"], 3) if "batt" in state else None,
+        "battery_trend_v_per_day": round(trend * 86400, 4) if trend is not None else None,
+    }
+
+
+def offline_alert_claims(silent: list[tuple[str, float]], now: datetime) -> list:
+    """``AlertEngine.fire`` claims for devices that just went offline."""
+    claims = []
+    for device_id, last_seen in silent:
+        silent_min = (now.timestamp() - last_seen) / 60
+        row = {
+            "id": uuid.uuid4(),
+            "created_at": now,
+            "device_id": uuid.UUID(device_id),
+            "alert_type": "offline",
+            "severity": settings.HEALTH_OFFLINE_SEVERITY,
+            "message": f"Device silent for {silent_min:.0f} min",
+            "payload": {
+                "last_seen": datetime.fromtimestamp(last_seen, timezone.utc).isoformat(),
+                "silent_s": round(now.timestamp() - last_seen, 1),
+            },
+            "acknowledged": False,
+        }
+        claims.append((_dedupe_key("offline", device_id), settings.HEALTH_OFFLINE_COOLDOWN_S, row))
+    return claims
+
+
+_fleet: Optional[FleetHealth] = None
+
+
+def get_fleet() -> FleetHealth:
+    global _fleet
+    if _fleet is None:
+        _fleet = FleetHealth()
+    return _fleet
+
+
+def received_at(payload: dict) -> float:
+    """Receipt time stamped by ingest_telemetry (older jobs: now)."""
+    return payload.get("received_at") or time.time()
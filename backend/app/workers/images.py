@@ -0,0 +1,76 @@
+# app/workers/images.py
+"""
+CPU-bound half of the image pipeline.
+
+Kept free of app settings / DB / S3 imports so it can run inside a process
+pool (and in benchmarks) without dragging the whole app into every child.
+"""
+import io
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+from PIL import ExifTags, Image, ImageOps
+
+# name -> longest edge in px; rendered largest first
+DEFAULT_SIZES: Dict[str, int] = {"preview": 1280, "thumb": 256}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def render_derivatives(src_path: str, sizes: Dict[str, int] = DEFAULT_SIZES, quality: int = 85, draft: bool = True) -> dict:
+    """
+    Decode ``src_path`` once and return its original size (as displayed, i.e.
+    after EXIF orientation) plus JPEG renditions.
+
+    For JPEG sources ``Image.draft`` asks libjpeg to decode directly at the
+    smallest 1/2, 1/4 or 1/8 scale that still covers the largest requested
+    rendition, so a 20 MP frame is never fully decoded just to make a preview.
+    """
+    with Image.open(src_path) as im:
+        width, height = im.size
+        if im.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8):
+            # rotated by 90 degrees: exif_transpose swaps the axes
+            width, height = height, width
+        biggest = max(sizes.values())
+        if draft:
+            im.draft("RGB", (biggest, biggest))
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+
+        out = {}
+        current = im
+        for name, edge in sorted(sizes.items(), key=lambda kv: kv[1], reverse=True):
+            # each rendition is made from the previous (larger) one
+            current = current.copy()
+            current.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            current.save(buf, format="JPEG", quality=quality, optimize=True)
+            out[name] = buf.getvalue()
+
+    return {"width": width, "height": height, "derivatives": out}
+
+
+def get_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Lazily created process pool shared by every image task in this worker."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max_workers)
+    return _pool
+
+
+def submit(fn, *args, max_workers: Optional[int] = None) -> Future:
+    """Schedule a picklable CPU-bound ``fn(*args)`` on the shared process pool."""
+    return get_pool(max_workers).submit(fn, *args)
+
+
+def render_in_pool(src_path: str, sizes: Dict[str, int] = DEFAULT_SIZES, quality: int = 85, max_workers: Optional[int] = None, timeout: Optional[float] = None) -> dict:
+    """Run :func:`render_derivatives` in the shared process pool and wait for it."""
+    return submit(render_derivatives, src_path, sizes, quality, max_workers=max_workers).result(timeout=timeout)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,340 @@
+# app/workers/indicators.py
+"""
+Daily agronomic indicators, maintained incrementally per device.
+
+Every stored measurement folds into its ``(device, local day)`` row of
+``daily_indicators`` with one ``INSERT ... ON CONFLICT DO UPDATE`` executed in
+the measurement's own transaction, so a redelivered (duplicate) reading rolls
+back together with its contribution.  The row holds only accumulators
+(count, min/max/sum per variable, time-integrated radiation and frost time);
+the indicators themselves are derived when read:
+
+* growing degree days   ``(min(Tmax, cap) + max(Tmin, base)) / 2 - base``
+* vapour pressure deficit and dew point (Magnus / FAO-56 eq. 11), daily mean
+* frost hours           time with ``T < INDICATORS_FROST_C``
+* reference ET0         FAO-56 Penman-Monteith, daily step (eq. 6)
+
+Time integrals hold each reading's value back to the previous reading of the
+same day, at most ``INDICATORS_MAX_GAP_S``, so gaps in the data count as
+missing rather than as more of the same.  A reading older than the newest
+one already folded in cannot be integrated in place: the upsert leaves the
+accumulators alone, flags the day ``needs_recompute`` and the worker
+schedules ``recompute_daily_indicators``, which rebuilds just that day from
+``measurements``.
+"""
+import math
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from functools import lru_cache
+from typing import Iterable, Optional
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Boolean, bindparam, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+
+_D = models.DailyIndicators
+_M = models.Measurement
+
+_SUMS = ("t_sum", "t_n", "rh_sum", "rh_n", "vpd_sum", "dew_sum", "hum_n", "wind_sum", "wind_n")
+_MINS = ("t_min", "rh_min")
+_MAXS = ("t_max", "rh_max", "vpd_max")
+
+
+# ---------- formulas (FAO-56) ----------
+def saturation_vp(t_c: float) -> float:
+    """Saturation vapour pressure in kPa (FAO-56 eq. 11)."""
+    return 0.6108 * math.exp(17.27 * t_c / (t_c + 237.3))
+
+
+def vapour_pressure_deficit(t_c: float, rh_pct: float) -> float:
+    return saturation_vp(t_c) * (1.0 - rh_pct / 100.0)
+
+
+def dew_point(t_c: float, rh_pct: float) -> float:
+    """Magnus dew point in degC (same coefficients as :func:`saturation_vp`)."""
+    g = math.log(max(rh_pct, 1e-3) / 100.0) + 17.27 * t_c / (t_c + 237.3)
+    return 237.3 * g / (17.27 - g)
+
+
+def growing_degree_days(t_min: float, t_max: float, base_c: float, cap_c: float) -> float:
+    hi = min(t_max, cap_c)
+    lo = min(max(t_min, base_c), hi)
+    return max(0.0, (hi + lo) / 2.0 - base_c)
+
+
+def extraterrestrial_radiation(lat_deg: float, day_of_year: int) -> float:
+    """Ra in MJ m-2 day-1 (FAO-56 eq. 21)."""
+    phi = math.radians(lat_deg)
+    dr = 1 + 0.033 * math.cos(2 * math.pi * day_of_year / 365)
+    decl = 0.409 * math.sin(2 * math.pi * day_of_year / 365 - 1.39)
+    ws = math.acos(max(-1.0, min(1.0, -math.tan(phi) * math.tan(decl))))
+    return (24 * 60 / math.pi) * 0.0820 * dr * (
+        ws * math.sin(phi) * math.sin(decl) + math.cos(phi) * math.cos(decl) * math.sin(ws)
+    )
+
+
+def wind_at_2m(u_z: float, height_m: float) -> float:
+    """FAO-56 eq. 47: log profile from the sensor height down to 2 m."""
+    if abs(height_m - 2.0) < 1e-6:
+        return u_z
+    return u_z * 4.87 / math.log(67.8 * height_m - 5.42)
+
+
+def et0_penman_monteith(
+    t_min: float, t_max: float, rh_min: float, rh_max: float, rs_mj: float, u2: float,
+    lat_deg: float, elevation_m: float, day_of_year: int,
+) -> float:
+    """Daily reference evapotranspiration in mm (FAO-56 eq. 6, G = 0)."""
+    t_mean = (t_max + t_min) / 2
+    es_tmax, es_tmin = saturation_vp(t_max), saturation_vp(t_min)
+    es = (es_tmax + es_tmin) / 2
+    ea = (es_tmin * rh_max / 100 + es_tmax * rh_min / 100) / 2
+    delta = 4098 * saturation_vp(t_mean) / (t_mean + 237.3) ** 2
+    pressure = 101.3 * ((293 - 0.0065 * elevation_m) / 293) ** 5.26
+    gamma = 0.000665 * pressure
+
+    rso = (0.75 + 2e-5 * elevation_m) * extraterrestrial_radiation(lat_deg, day_of_year)
+    rns = (1 - 0.23) * rs_mj
+    rnl = (
+        4.903e-9 * ((t_max + 273.16) ** 4 + (t_min + 273.16) ** 4) / 2
+        * (0.34 - 0.14 * math.sqrt(max(ea, 0.0)))
+        * (1.35 * min(rs_mj / rso, 1.0) - 0.35 if rso > 0 else 0.0)
+    )
+    rn = rns - rnl
+    et0 = (0.408 * delta * rn + gamma * 900 / (t_mean + 273) * u2 * (es - ea)) / (
+        delta + gamma * (1 + 0.34 * u2)
+    )
+    return max(0.0, et0)
+
+
+# ---------- days ----------
+@lru_cache(maxsize=1)
+def _tz(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def local_today() -> date:
+    return datetime.now(_tz(settings.INDICATORS_TZ)).date()
+
+
+def local_day(ts: float) -> tuple[date, float]:
+    """Local calendar day of an epoch timestamp and the epoch of its midnight."""
+    tz = _tz(settings.INDICATORS_TZ)
+    day = datetime.fromtimestamp(ts, tz).date()
+    return day, day_bounds(day)[0].timestamp()
+
+
+def day_bounds(day: date) -> tuple[datetime, datetime]:
+    tz = _tz(settings.INDICATORS_TZ)
+    start = datetime.combine(day, dt_time(0), tz)
+    end = datetime.combine(day + timedelta(days=1), dt_time(0), tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+# ---------- accumulation ----------
+def contribution(ts: float, values: dict, dt: float) -> dict:
+    """Accumulator values of a single reading held for ``dt`` seconds."""
+    t = values.get("temperature_c")
+    rh = values.get("relative_humidity_pct")
+    solar = values.get("solar_radiance_w_m2")
+    wind = values.get("wind_speed_m_s")
+    hum = t is not None and rh is not None
+    vpd = vapour_pressure_deficit(t, rh) if hum else None
+    return {
+        "samples": 1,
+        "covered_s": dt,
+        "first_ts": ts,
+        "last_ts": ts,
+        "t_min": t, "t_max": t, "t_sum": t or 0.0, "t_n": int(t is not None),
+        "rh_min": rh, "rh_max": rh, "rh_sum": rh or 0.0, "rh_n": int(rh is not None),
+        "vpd_sum": vpd or 0.0, "vpd_max": vpd,
+        "dew_sum": dew_point(t, rh) if hum else 0.0, "hum_n": int(hum),
+        "wind_sum": wind or 0.0, "wind_n": int(wind is not None),
+        "solar_j_m2": (solar or 0.0) * dt,
+        "frost_s": dt if t is not None and t < settings.INDICATORS_FROST_C else 0.0,
+        "last_temp": t,
+        "last_solar": solar,
+    }
+
+
+def _hold(ts: float, previous_ts: float) -> float:
+    return max(0.0, min(ts - previous_ts, settings.INDICATORS_MAX_GAP_S))
+
+
+def _merge(acc: dict, c: dict) -> dict:
+    # mirrors the ON CONFLICT clause of _upsert_sql
+    out = dict(c)
+    out["first_ts"] = acc["first_ts"]
+    for col in ("samples", "covered_s", "solar_j_m2", "frost_s") + _SUMS:
+        out[col] = acc[col] + c[col]
+    for col in _MINS:
+        out[col] = c[col] if acc[col] is None or (c[col] is not None and c[col] < acc[col]) else acc[col]
+    for col in _MAXS:
+        out[col] = c[col] if acc[col] is None or (c[col] is not None and c[col] > acc[col]) else acc[col]
+    return out
+
+
+def accumulate(readings: Iterable[tuple], day_start: float) -> Optional[dict]:
+    """Fold ``(ts, values)`` readings of one day, in any order, into a row."""
+    acc = None
+    for ts, values in sorted(readings, key=lambda r: r[0]):
+        c = contribution(ts, values, _hold(ts, acc["last_ts"] if acc else day_start))
+        acc = c if acc is None else _merge(acc, c)
+    return acc
+
+
+# ---------- writes ----------
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(_D.__table__)
+
+
+def _upsert_sql() -> str:
+    # Plain SQL (same text on PostgreSQL and SQLite): SQLAlchemy cannot cache
+    # a compiled ON CONFLICT construct, and rebuilding it per reading cost more
+    # than the insert itself.  Mirrors _merge().
+    t = _D.__tablename__
+    fresh = f"excluded.last_ts > {t}.last_ts"
+    gap = f"(excluded.last_ts - {t}.last_ts)"
+    dt = f"(CASE WHEN {gap} > :max_gap THEN :max_gap ELSE {gap} END)"
+
+    def keep(col: str, value: str) -> str:
+        return f"{col} = CASE WHEN {fresh} THEN {value} ELSE {t}.{col} END"
+
+    sets = [
+        keep("samples", f"{t}.samples + 1"),
+        keep("covered_s", f"{t}.covered_s + {dt}"),
+        keep("solar_j_m2", f"{t}.solar_j_m2 + COALESCE(excluded.last_solar, 0) * {dt}"),
+        keep("frost_s", f"{t}.frost_s + CASE WHEN excluded.last_temp < :frost_c THEN {dt} ELSE 0 END"),
+        keep("last_ts", "excluded.last_ts"),
+        keep("last_temp", "excluded.last_temp"),
+        keep("last_solar", "excluded.last_solar"),
+    ]
+    sets += [keep(c, f"{t}.{c} + excluded.{c}") for c in _SUMS]
+    sets += [
+        keep(c, f"CASE WHEN {t}.{c} IS NULL OR excluded.{c} < {t}.{c} THEN excluded.{c} ELSE {t}.{c} END")
+        for c in _MINS
+    ]
+    sets += [
+        keep(c, f"CASE WHEN {t}.{c} IS NULL OR excluded.{c} > {t}.{c} THEN excluded.{c} ELSE {t}.{c} END")
+        for c in _MAXS
+    ]
+    sets += [
+        f"needs_recompute = CASE WHEN {fresh} THEN {t}.needs_recompute ELSE true END",
+        "updated_at = excluded.updated_at",
+    ]
+    cols = [c.name for c in _D.__table__.columns]
+    return (
+        f"INSERT INTO {t} ({', '.join(cols)}) VALUES ({', '.join(':' + c for c in cols)}) "
+        f"ON CONFLICT (device_id, day) DO UPDATE SET {', '.join(sets)} "
+        f"RETURNING {t}.needs_recompute"
+    )
+
+
+_UPSERT = text(_upsert_sql()).bindparams(
+    *(bindparam(c.name, type_=c.type) for c in _D.__table__.columns)
+).columns(needs_recompute=Boolean)
+
+
+def record(db: Session, device_id: str, ts: float, values: dict) -> Optional[date]:
+    """Fold one reading into its day (no commit).
+
+    Returns the day when it arrived late and the day needs a recompute.
+    """
+    day, day_start = local_day(ts)
+    row = contribution(ts, values, _hold(ts, day_start))
+    row.update(device_id=UUID(device_id), day=day, needs_recompute=False, updated_at=datetime.now(timezone.utc))
+    needs_recompute = db.execute(_UPSERT, {
+        **row, "max_gap": settings.INDICATORS_MAX_GAP_S, "frost_c": settings.INDICATORS_FROST_C,
+    }).scalar()
+    return day if needs_recompute else None
+
+
+def recompute_day(db: Session, device_id: UUID, day: date) -> Optional[dict]:
+    """Rebuild one day from ``measurements`` and overwrite its row (commits)."""
+    # row lock first: concurrent upserts wait, and whatever they add after we
+    # commit belongs to measurements our scan could not see yet
+    db.execute(select(_D.day).where(_D.device_id == device_id, _D.day == day).with_for_update())
+    start, end = day_bounds(day)
+    fields = ("temperature_c", "relative_humidity_pct", "solar_radiance_w_m2", "wind_speed_m_s")
+    rows = db.execute(
+        select(_M.time, *(getattr(_M, f) for f in fields))
+        .where(_M.device_id == device_id, _M.time >= start, _M.time < end)
+    ).all()
+    acc = accumulate(
+        ((_epoch(r[0]), dict(zip(fields, r[1:]))) for r in rows), start.timestamp(),
+    )
+    if acc is None:
+        db.query(_D).filter(_D.device_id == device_id, _D.day == day).delete()
+        db.commit()
+        return None
+    acc.update(device_id=device_id, day=day, needs_recompute=False, updated_at=datetime.now(timezone.utc))
+    stmt = _insert(db).values(**acc)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["device_id", "day"],
+        set_={k: stmt.excluded[k] for k in acc if k not in ("device_id", "day")},
+    ))
+    db.commit()
+    return acc
+
+
+def _epoch(t: datetime) -> float:
+    # SQLite hands back naive datetimes; they are stored as UTC
+    return (t if t.tzinfo else t.replace(tzinfo=timezone.utc)).timestamp()
+
+
+# ---------- reads ----------
+def derive(row: dict, base_c: float, cap_c: float) -> dict:
+    """Indicators of one ``daily_indicators`` row."""
+    day = row["day"]
+    coverage = min(1.0, row["covered_s"] / 86400.0)
+    t_min, t_max, rh_min, rh_max = row["t_min"], row["t_max"], row["rh_min"], row["rh_max"]
+    wind = row["wind_sum"] / row["wind_n"] if row["wind_n"] else None
+
+    et0 = None
+    if (coverage >= settings.INDICATORS_MIN_COVERAGE and wind is not None
+            and None not in (t_min, t_max, rh_min, rh_max)):
+        # radiation over the uncovered part of the day assumed like the rest
+        rs_mj = row["solar_j_m2"] / 1e6 / coverage
+        et0 = et0_penman_monteith(
+            t_min, t_max, rh_min, rh_max, rs_mj, wind_at_2m(wind, settings.WIND_SENSOR_HEIGHT_M),
+            settings.SITE_LATITUDE_DEG, settings.SITE_ELEVATION_M, day.timetuple().tm_yday,
+        )
+
+    return {
+        "day": day,
+        "samples": row["samples"],
+        "coverage": round(coverage, 4),
+        "t_min": t_min,
+        "t_max": t_max,
+        "t_mean": row["t_sum"] / row["t_n"] if row["t_n"] else None,
+        "rh_min": rh_min,
+        "rh_max": rh_max,
+        "rh_mean": row["rh_sum"] / row["rh_n"] if row["rh_n"] else None,
+        "vpd_mean_kpa": row["vpd_sum"] / row["hum_n"] if row["hum_n"] else None,
+        "vpd_max_kpa": row["vpd_max"],
+        "dew_point_c": row["dew_sum"] / row["hum_n"] if row["hum_n"] else None,
+        "frost_hours": row["frost_s"] / 3600.0,
+        "solar_mj_m2": row["solar_j_m2"] / 1e6,
+        "wind_mean_m_s": wind,
+        "gdd": growing_degree_days(t_min, t_max, base_c, cap_c) if t_min is not None else None,
+        "et0_mm": et0,
+        "pending_recompute": row["needs_recompute"],
+    }
+
+
+def daily_series(rows: Iterable[dict], base_c: float, cap_c: float) -> list[dict]:
+    """Derived rows in day order, with the running GDD sum (``gdd_cum``)."""
+    out, total = [], 0.0
+    for row in rows:
+        item = derive(row, base_c, cap_c)
+        total += item["gdd"] or 0.0
+        item["gdd_cum"] = total
+        out.append(item)
+    return out
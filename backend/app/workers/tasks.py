@@ -1,17 +1,23 @@
 # app/workers/tasks.py
 import json
+import logging
+import os
+import tempfile
+import time
 from uuid import UUID
-from datetime import datetime
-import redis
+from datetime import date, datetime, timezone
 from sqlalchemy.exc import IntegrityError
 
 from app.workers.celery_app import celery
 from app.db.session import SessionLocal
 from app.db import models
+from app.core import metrics, tracing
 from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.utils.s3 import derived_key, download_to_file, upload_bytes
+from app.workers import alerts, analysis, anomaly, fleet, images, indicators
 
-# blocking redis client for celery worker
-redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+logger = logging.getLogger(__name__)
 
 @celery.task(bind=True, max_retries=3, acks_late=True)
 def process_measurement(self, payload: dict):
@@ -21,6 +27,10 @@ def process_measurement(self, payload: dict):
       - insert into DB
       - publish to Redis pubsub for realtime WS consumers
     """
+    trace_ctx = payload.get("trace")
+    if trace_ctx is not None:
+        tracing.record_span(trace_ctx, "queue.wait", trace_ctx.get("enqueued_at") or time.time(),
+                            retries=self.request.retries)
     db = SessionLocal()
     try:
         device_id = payload.get("device_id")
@@ -45,14 +55,44 @@ def process_measurement(self, payload: dict):
             battery_v=payload["measurements"].get("battery_v"),
             meta=payload.get("meta"),
         )
+        reading = alerts.Reading(str(device_uuid), m.time.timestamp(), {
+            f: getattr(m, f) for f in alerts.MEASUREMENT_FIELDS
+        }, message_id=message_id)
 
+        # flags go into the same INSERT; the detector state is only stored
+        # once the row is, so a duplicate delivery does not count twice
+        detection = None
+        if settings.ANOMALY_ENABLED:
+            try:
+                detection = anomaly.get_detector().check([reading])
+            except Exception:
+                logger.exception("Anomaly check failed for %s", message_id)
+        if detection is not None and detection.flags[0]:
+            m.meta = {**(m.meta or {}), "anomalies": detection.flags[0]}
+
+        db_start = time.time()
         db.add(m)
+        late_day = None
         try:
-            db.commit()
+            with metrics.timed(metrics.WORKER_INSERT_SECONDS):
+                if settings.INDICATORS_ENABLED:
+                    # same transaction: a duplicate rolls its contribution back too
+                    late_day = indicators.record(db, reading.device_id, reading.t, reading.values)
+                db.commit()
         except IntegrityError:
             db.rollback()
+            metrics.WORKER_RESULTS.labels(result="duplicate").inc()
+            tracing.record_span(trace_ctx, "worker.db", db_start, result="duplicate")
+            _record_health(payload, reading, duplicate=True)
             # likely duplicate message_id
             return {"status": "duplicate", "message_id": message_id}
+        metrics.WORKER_RESULTS.labels(result="inserted").inc()
+        metrics.observe_lag("db_commit", m.time)
+        tracing.record_span(trace_ctx, "worker.db", db_start, result="inserted")
+
+        _record_health(payload, reading)
+        if late_day is not None:
+            _schedule_indicator_recompute(reading.device_id, late_day)
 
         # Prepare stable pubsub JSON
         pub = {
@@ -70,10 +110,27 @@ def process_measurement(self, payload: dict):
             "meta": m.meta,
             "message_id": message_id,
         }
+        if trace_ctx is not None:
+            pub["trace"] = tracing.carry(trace_ctx, published_at=time.time())
 
         # publish per-device channel and global channel
-        redis_client.publish(f"telemetry:{device_uuid}", json.dumps(pub))
-        #redis_client.publish("telemetry:all", json.dumps(pub))
+        get_sync_redis().publish(f"telemetry:{device_uuid}", json.dumps(pub))
+
+        # the reading is stored: an alerting problem must not retry (and
+        # duplicate) it
+        reading.measurement_id = m.id
+        if detection is not None:
+            try:
+                anomaly.get_detector().save(detection)
+                if detection.flags[0]:
+                    claims = anomaly.alert_claims([reading], detection.flags, datetime.now(timezone.utc))
+                    alerts.get_alert_engine().fire(db, claims)
+            except Exception:
+                logger.exception("Anomaly update failed for %s", message_id)
+        try:
+            alerts.get_alert_engine().process(db, [reading])
+        except Exception:
+            logger.exception("Alert evaluation failed for %s", message_id)
 
         return {"status": "ok", "id": m.id}
 
@@ -82,3 +139,140 @@ def process_measurement(self, payload: dict):
         raise self.retry(exc=exc, countdown=5)
     finally:
         db.close()
+
+
+def _record_health(payload: dict, reading: alerts.Reading, duplicate: bool = False) -> None:
+    if not settings.HEALTH_ENABLED:
+        return
+    try:
+        back = fleet.get_fleet().record(
+            reading.device_id, fleet.received_at(payload), reading.t,
+            duplicate=duplicate, battery_v=reading.values.get("battery_v"),
+            values=None if duplicate else reading.values,
+        )
+        if back:
+            logger.info("Device %s is back online", reading.device_id)
+    except Exception:
+        logger.exception("Fleet health update failed for %s", reading.device_id)
+
+
+@celery.task
+def sweep_offline_devices():
+    """Beat task: raise one alert per device that went silent since the last sweep."""
+    now = datetime.now(timezone.utc)
+    silent = fleet.get_fleet().sweep(now.timestamp())
+    if not silent:
+        return {"offline": 0}
+    db = SessionLocal()
+    try:
+        rows = alerts.get_alert_engine().fire(db, fleet.offline_alert_claims(silent, now))
+    finally:
+        db.close()
+    return {"offline": len(silent), "alerts": len(rows)}
+
+
+def _schedule_indicator_recompute(device_id: str, day: date) -> None:
+    # one pending rebuild per device-day, however many late readings it gets
+    key = f"indicators:recompute:{device_id}:{day.isoformat()}"
+    try:
+        if get_sync_redis().set(key, "1", nx=True, ex=settings.INDICATORS_RECOMPUTE_DELAY_S):
+            recompute_daily_indicators.apply_async(
+                (device_id, day.isoformat()), countdown=settings.INDICATORS_RECOMPUTE_DELAY_S,
+            )
+    except Exception:
+        logger.exception("Could not schedule indicator recompute for %s %s", device_id, day)
+
+
+@celery.task(bind=True, max_retries=3, acks_late=True)
+def recompute_daily_indicators(self, device_id: str, day: str):
+    """Rebuild one device-day of daily_indicators from raw measurements."""
+    db = SessionLocal()
+    try:
+        row = indicators.recompute_day(db, UUID(device_id), date.fromisoformat(day))
+        return {"status": "ok", "device_id": device_id, "day": day, "samples": row["samples"] if row else 0}
+    except Exception as exc:
+        db.rollback()
+        raise self.retry(exc=exc, countdown=10)
+    finally:
+        db.close()
+
+
+@celery.task(bind=True, max_retries=3, acks_late=True)
+def process_image(self, image_id: str, s3_key: str):
+    """
+    Process an uploaded camera frame:
+      - stream the original from MinIO to a temp file
+      - decode (JPEG draft mode) and render thumbnail/preview in the process pool
+      - upload derived renditions next to the original
+      - compute ExG/VARI/canopy statistics tile by tile into Image.analysis
+        and fold them into the session aggregate on CameraSession.meta
+      - fill width/height/thumbnail_key and mark the row processed
+    """
+    db = SessionLocal()
+    try:
+        row = db.get(models.Image, UUID(image_id))
+        if row is None:
+            return {"error": "image not found", "image_id": image_id}
+        if row.status == "processed":
+            # redelivery after the commit (acks_late)
+            return {"status": "duplicate", "image_id": image_id}
+
+        suffix = os.path.splitext(s3_key)[1] or ".jpg"
+        with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+            download_to_file(s3_key, tmp)
+            # renditions and vegetation statistics run side by side in the pool
+            render_f = images.submit(
+                images.render_derivatives, tmp.name,
+                settings.IMAGE_DERIVED_SIZES, settings.IMAGE_JPEG_QUALITY,
+                max_workers=settings.IMAGE_PROCESS_WORKERS,
+            )
+            analysis_f = images.submit(
+                analysis.analyze_image, tmp.name,
+                settings.IMAGE_ANALYSIS_TILE, settings.IMAGE_CANOPY_EXG_THRESHOLD, settings.IMAGE_ANALYSIS_MAX_EDGE,
+                max_workers=settings.IMAGE_PROCESS_WORKERS,
+            )
+            result = render_f.result(timeout=settings.IMAGE_PROCESS_TIMEOUT_S)
+            stats = analysis_f.result(timeout=settings.IMAGE_PROCESS_TIMEOUT_S)
+
+        for name, data in result["derivatives"].items():
+            upload_bytes(derived_key(s3_key, name), data)
+
+        # re-check under the row lock: another delivery may have finished meanwhile
+        row = (
+            db.query(models.Image).filter(models.Image.id == row.id)
+            .with_for_update().populate_existing().one()
+        )
+        if row.status == "processed":
+            db.rollback()
+            return {"status": "duplicate", "image_id": image_id}
+        row.width = result["width"]
+        row.height = result["height"]
+        if "thumb" in result["derivatives"]:
+            row.thumbnail_key = derived_key(s3_key, "thumb")
+        row.analysis = stats
+        row.status = "processed"
+
+        if row.session_id is not None:
+            # row lock so concurrent frames of one session don't lose updates
+            session = (
+                db.query(models.CameraSession)
+                .filter(models.CameraSession.id == row.session_id)
+                .with_for_update()
+                .one_or_none()
+            )
+            if session is not None:
+                meta = dict(session.meta or {})
+                meta["analysis"] = analysis.merge_session_aggregate(meta.get("analysis"), stats)
+                session.meta = meta
+        db.commit()
+        return {"status": "ok", "image_id": image_id, "width": row.width, "height": row.height}
+
+    except Exception as exc:
+        db.rollback()
+        if self.request.retries >= self.max_retries:
+            db.query(models.Image).filter(models.Image.id == UUID(image_id)).update({"status": "failed"})
+            db.commit()
+            raise
+        raise self.retry(exc=exc, countdown=5)
+    finally:
+        db.close()
@@ -0,0 +1,62 @@
+"""device location and fields
+
+Revision ID: 2c9f6e0d4b73
+Revises: 7e4b1f9a2c58
+Create Date: 2026-10-19 18:40:27.901736
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '2c9f6e0d4b73'
+down_revision = '7e4b1f9a2c58'
+branch_labels = None
+depends_on = None
+
+_NUMBER = "'^-?[0-9]+(\\.[0-9]+)?$'"
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fields',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('crop', sa.String(), nullable=True),
+        sa.Column('boundary', sa.JSON(), nullable=False),
+        sa.Column('min_lon', sa.Float(), nullable=False),
+        sa.Column('min_lat', sa.Float(), nullable=False),
+        sa.Column('max_lon', sa.Float(), nullable=False),
+        sa.Column('max_lat', sa.Float(), nullable=False),
+        sa.Column('area_ha', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_fields_bbox', 'fields', ['min_lon', 'max_lon', 'min_lat', 'max_lat'], unique=False)
+
+    op.add_column('devices', sa.Column('lat', sa.Float(), nullable=True))
+    op.add_column('devices', sa.Column('lon', sa.Float(), nullable=True))
+    op.add_column('devices', sa.Column('field_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_foreign_key('devices_field_id_fkey', 'devices', 'fields', ['field_id'], ['id'])
+    op.create_index(op.f('ix_devices_field_id'), 'devices', ['field_id'], unique=False)
+    op.create_index('ix_devices_lon_lat', 'devices', ['lon', 'lat'], unique=False)
+
+    # carry over coordinates some devices kept in meta
+    for lat_key, lon_key in (("lat", "lon"), ("latitude", "longitude")):
+        op.execute(
+            f"UPDATE devices SET lat = (meta->>'{lat_key}')::float, lon = (meta->>'{lon_key}')::float "
+            f"WHERE lat IS NULL AND meta->>'{lat_key}' ~ {_NUMBER} AND meta->>'{lon_key}' ~ {_NUMBER}"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_devices_lon_lat', table_name='devices')
+    op.drop_index(op.f('ix_devices_field_id'), table_name='devices')
+    op.drop_constraint('devices_field_id_fkey', 'devices', type_='foreignkey')
+    op.drop_column('devices', 'field_id')
+    op.drop_column('devices', 'lon')
+    op.drop_column('devices', 'lat')
+    op.drop_index('ix_fields_bbox', table_name='fields')
+    op.drop_table('fields')
@@ -0,0 +1,28 @@
+"""images gallery indexes
+
+Revision ID: 4f1c2a9b7e10
+Revises: 038de4f9cd04
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9b7e10'
+down_revision = '038de4f9cd04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keyset pagination of the gallery: (filter col, capture_time, id) so page N
+    # is an index range scan no matter how deep it is
+    op.create_index('ix_images_session_capture', 'images', ['session_id', 'capture_time', 'id'], unique=False)
+    op.create_index('ix_images_device_capture', 'images', ['device_id', 'capture_time', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_images_device_capture', table_name='images')
+    op.drop_index('ix_images_session_capture', table_name='images')
@@ -0,0 +1,46 @@
+"""alert rules
+
+Revision ID: 5d2a8c1e6f37
+Revises: 9b3e5d7c1a42
+Create Date: 2026-10-19 15:21:48.203391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a8c1e6f37'
+down_revision = '9b3e5d7c1a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'alert_rules',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('device_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('field', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('op', sa.String(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('window_s', sa.Integer(), nullable=True),
+        sa.Column('severity', sa.String(), nullable=True),
+        sa.Column('cooldown_s', sa.Integer(), nullable=True),
+        sa.Column('enabled', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_alert_rules_device_id'), 'alert_rules', ['device_id'], unique=False)
+    # recent alerts per device (GET /api/v1/alerts)
+    op.create_index('ix_alerts_device_created', 'alerts', ['device_id', sa.text('created_at DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_alerts_device_created', table_name='alerts')
+    op.drop_index(op.f('ix_alert_rules_device_id'), table_name='alert_rules')
+    op.drop_table('alert_rules')
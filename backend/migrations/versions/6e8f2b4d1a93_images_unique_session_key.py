@@ -0,0 +1,44 @@
+"""images unique (session_id, s3_key)
+
+Revision ID: 6e8f2b4d1a93
+Revises: 9a1d3e5b7c20
+Create Date: 2026-10-19 22:41:09.553817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e8f2b4d1a93'
+down_revision = '9a1d3e5b7c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # repeated complete calls left duplicate rows: keep one per frame (a
+    # processed one if any) and take the extras back out of frames_count
+    op.execute("""
+        WITH dup AS (
+            DELETE FROM images WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (
+                        PARTITION BY session_id, s3_key
+                        ORDER BY (status = 'processed') DESC, created_at, id
+                    ) AS n
+                    FROM images WHERE session_id IS NOT NULL
+                ) ranked WHERE n > 1
+            )
+            RETURNING session_id
+        )
+        UPDATE camera_sessions s
+        SET frames_count = greatest(coalesce(s.frames_count, 0) - c.n, 0)
+        FROM (SELECT session_id, count(*) AS n FROM dup GROUP BY session_id) c
+        WHERE s.id = c.session_id
+    """)
+    op.create_index('uq_images_session_s3_key', 'images', ['session_id', 's3_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_images_session_s3_key', table_name='images')
@@ -0,0 +1,55 @@
+"""daily indicators
+
+Revision ID: 7e4b1f9a2c58
+Revises: 5d2a8c1e6f37
+Create Date: 2026-10-19 17:02:11.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '7e4b1f9a2c58'
+down_revision = '5d2a8c1e6f37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_indicators',
+        sa.Column('device_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('covered_s', sa.Float(), nullable=False),
+        sa.Column('first_ts', sa.Float(), nullable=True),
+        sa.Column('last_ts', sa.Float(), nullable=True),
+        sa.Column('t_min', sa.Float(), nullable=True),
+        sa.Column('t_max', sa.Float(), nullable=True),
+        sa.Column('t_sum', sa.Float(), nullable=False),
+        sa.Column('t_n', sa.Integer(), nullable=False),
+        sa.Column('rh_min', sa.Float(), nullable=True),
+        sa.Column('rh_max', sa.Float(), nullable=True),
+        sa.Column('rh_sum', sa.Float(), nullable=False),
+        sa.Column('rh_n', sa.Integer(), nullable=False),
+        sa.Column('vpd_sum', sa.Float(), nullable=False),
+        sa.Column('vpd_max', sa.Float(), nullable=True),
+        sa.Column('dew_sum', sa.Float(), nullable=False),
+        sa.Column('hum_n', sa.Integer(), nullable=False),
+        sa.Column('wind_sum', sa.Float(), nullable=False),
+        sa.Column('wind_n', sa.Integer(), nullable=False),
+        sa.Column('solar_j_m2', sa.Float(), nullable=False),
+        sa.Column('frost_s', sa.Float(), nullable=False),
+        sa.Column('last_temp', sa.Float(), nullable=True),
+        sa.Column('last_solar', sa.Float(), nullable=True),
+        sa.Column('needs_recompute', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.id']),
+        sa.PrimaryKeyConstraint('device_id', 'day'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_indicators')
@@ -0,0 +1,30 @@
+"""images.device_id from their camera session
+
+Revision ID: 8c3a5f7e2d14
+Revises: 6e8f2b4d1a93
+Create Date: 2026-10-19 23:08:27.604115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3a5f7e2d14'
+down_revision = '6e8f2b4d1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # frames registered through /api/v1/images/complete had no device, so the
+    # gallery's per-device access filter hid them from everyone but admins
+    op.execute("""
+        UPDATE images SET device_id = s.device_id
+        FROM camera_sessions s
+        WHERE images.session_id = s.id AND images.device_id IS NULL
+    """)
+
+
+def downgrade() -> None:
+    pass
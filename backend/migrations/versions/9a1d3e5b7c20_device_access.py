@@ -0,0 +1,45 @@
+"""device ownership and grants
+
+Revision ID: 9a1d3e5b7c20
+Revises: 2c9f6e0d4b73
+Create Date: 2026-10-19 20:05:43.117520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9a1d3e5b7c20'
+down_revision = '2c9f6e0d4b73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('owner_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_foreign_key('devices_owner_id_fkey', 'devices', 'users', ['owner_id'], ['id'])
+    op.create_index(op.f('ix_devices_owner_id'), 'devices', ['owner_id'], unique=False)
+
+    op.create_table(
+        'device_grants',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('subject_type', sa.String(), nullable=False),
+        sa.Column('subject', sa.String(), nullable=False),
+        sa.Column('scope_type', sa.String(), nullable=False),
+        sa.Column('scope_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_by', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('subject_type', 'subject', 'scope_type', 'scope_id', name='uq_device_grants'),
+    )
+    op.create_index('ix_device_grants_scope', 'device_grants', ['scope_type', 'scope_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_device_grants_scope', table_name='device_grants')
+    op.drop_table('device_grants')
+    op.drop_index(op.f('ix_devices_owner_id'), table_name='devices')
+    op.drop_constraint('devices_owner_id_fkey', 'devices', type_='foreignkey')
+    op.drop_column('devices', 'owner_id')
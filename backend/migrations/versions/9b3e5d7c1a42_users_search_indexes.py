@@ -0,0 +1,33 @@
+"""users search indexes
+
+Revision ID: 9b3e5d7c1a42
+Revises: 4f1c2a9b7e10
+Create Date: 2026-10-19 11:02:17.540113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5d7c1a42'
+down_revision = '4f1c2a9b7e10'
+branch_labels = None
+depends_on = None
+
+_TRGM_COLUMNS = ('name', 'email', 'department')
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for col in _TRGM_COLUMNS:
+        op.create_index(f'ix_users_{col}_trgm', 'users', [col], unique=False,
+                        postgresql_using='gin', postgresql_ops={col: 'gin_trgm_ops'})
+    # keyset pagination order of /api/v1/users
+    op.create_index('ix_users_created_id', 'users', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_created_id', table_name='users')
+    for col in _TRGM_COLUMNS:
+        op.drop_index(f'ix_users_{col}_trgm', table_name='users')
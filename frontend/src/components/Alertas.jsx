@@ -1,6 +1,7 @@
 // frontend/src/components/Alertas.jsx
 import React from "react";
-import { fetchLatest, openLive } from "../lib/api";
+import { acknowledgeAlert, fetchLatest, openLive } from "../lib/api";
+import { authFetch } from "../lib/auth";
 import { computeStatus } from "./SensorCard";
 
 export default function Alertas() {
@@ -12,7 +13,7 @@ export default function Alertas() {
   React.useEffect(() => {
     async function loadDevices() {
       try {
-        const res = await fetch("/api/v1/devices");
+        const res = await authFetch("/api/v1/devices");
         const data = await res.json();
         setDevices(data);
         if (data.length > 0) setDeviceId(data[0].id);
@@ -47,6 +48,21 @@ export default function Alertas() {
         const msg = JSON.parse(evt.data);
         if (msg.type === "measurement" && msg.device_id === deviceId) {
           processMetrics(msg.data, msg.device_id);
+        } else if (msg.type === "alert" && msg.device_id === deviceId) {
+          // raised by the worker's alert rules; kept until acknowledged
+          const a = msg.alert;
+          setAlerts((prev) => [
+            ...prev,
+            {
+              id: a.id,
+              type: a.alert_type,
+              severity: a.severity,
+              message: a.message,
+              time: formatReadable(a.created_at),
+              ack: false,
+              server: true,
+            },
+          ]);
         }
       } catch (e) {
         console.warn("WS parse error", e);
@@ -105,13 +121,17 @@ export default function Alertas() {
 
     if (newAlerts.length > 0) {
       setAlerts((prev) => {
-        const acked = prev.filter((a) => a.ack);
+        const acked = prev.filter((a) => a.ack || a.server);
         return [...acked, ...newAlerts];
       });
     }
   };
 
   const acknowledge = (id) => {
+    const alert = alerts.find((a) => a.id === id);
+    if (alert && alert.server) {
+      acknowledgeAlert(id).catch((e) => console.error("Error acknowledging alert", e));
+    }
     setAlerts((s) => s.map((a) => (a.id === id ? { ...a, ack: true } : a)));
   };
 
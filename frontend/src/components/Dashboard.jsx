@@ -2,6 +2,7 @@
 import React from "react";
 import SensorCard from "./SensorCard";
 import { fetchLatest, fetchSummary, openLive } from "../lib/api";
+import { authFetch } from "../lib/auth";
 
 export default function Dashboard() {
   // Pon aquí un UUID real o deja vacío para "All devices".
@@ -24,7 +25,7 @@ export default function Dashboard() {
   React.useEffect(() => {
     async function fetchDevices() {
       try {
-        const response = await fetch("/api/v1/devices");
+        const response = await authFetch("/api/v1/devices");
         const data = await response.json();
         setDevices(data); // Set devices from the backend
         if (data.length > 0) {
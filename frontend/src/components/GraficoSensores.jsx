@@ -9,6 +9,7 @@ import {
   CartesianGrid,
 } from "recharts";
 import * as api from "../lib/api";
+import { authFetch } from "../lib/auth";
 
 const DEFAULT_METRICS = [
   { key: "temperature_c", title: "Temperatura", unit: "°C", color: "text-red-600" },
@@ -77,7 +78,7 @@ export default function GraficoSensores({ initialHours = 24 }) {
     let mounted = true;
     (async () => {
       try {
-        const res = await fetch("/api/v1/devices");
+        const res = await authFetch("/api/v1/devices");
         if (!res.ok) throw new Error("failed to fetch devices");
         const data = await res.json();
         if (!mounted) return;
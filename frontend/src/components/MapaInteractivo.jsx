@@ -2,15 +2,35 @@
 import React, { useEffect, useRef, useState } from "react";
 import L from "leaflet";
 import "leaflet/dist/leaflet.css";
+import { fetchFieldHeatmap, fetchMapFeatures } from "../lib/api";
 
 /*
-  Sample stations array. Replace this with your API data.
+  Fallback stations, shown until (or if) /api/v1/map/features answers.
   Each station: { id, name, coords: [lat, lon], status: "online" | "alert" | "offline", lastSeen }
 */
 const SAMPLE_STATIONS = [
   { id: "ES-001", name: "Estación Norte", coords: [-7.490105, -79.526833], status: "online", lastSeen: "2025-09-01 10:24" },
 ];
 
+// wait for the map to settle before asking for the new viewport
+const MOVE_DEBOUNCE_MS = 250;
+
+const fmt = (v, digits = 1) => (typeof v === "number" ? v.toFixed(digits) : "—");
+
+// GeoJSON device feature -> station shape used by createMarker
+function featureToStation(f) {
+  const p = f.properties;
+  const [lon, lat] = f.geometry.coordinates;
+  return {
+    id: f.id,
+    name: p.name,
+    coords: [lat, lon],
+    status: p.map_status,
+    lastSeen: p.last_seen ? new Date(p.last_seen).toLocaleString() : null,
+    latest: p.latest,
+  };
+}
+
 const STATUS_COLORS = {
   online: "#10b981",   // green
   alert:  "#f59e0b",   // yellow/amber
@@ -26,6 +46,7 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
 
   // groupsRef holds LayerGroup instances so we can toggle them later
   const groupsRef = useRef({ online: null, alert: null, offline: null });
+  const [counts, setCounts] = useState({ stations: stations.length, fields: 0 });
 
   useEffect(() => {
     if (!containerRef.current) return;
@@ -63,6 +84,11 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
     const alertGroup = L.layerGroup();
     const offlineGroup = L.layerGroup();
 
+    const fieldsGroup = L.layerGroup().addTo(map);
+    // off by default: one interpolated PNG per visible field
+    const heatGroup = L.layerGroup();
+    let heatUrls = [];
+
     groupsRef.current = { online: onlineGroup, alert: alertGroup, offline: offlineGroup };
 
     // convenience to create a circle marker for a station
@@ -76,10 +102,13 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
         fillOpacity: 0.95,
       });
 
+      const latest = st.latest
+        ? `<div style="font-size:13px; margin-top:6px;">${fmt(st.latest.temperature_c)} °C · ${fmt(st.latest.relative_humidity_pct, 0)} % HR</div>`
+        : "";
       const popupHtml = `
         <div style="font-weight:700; margin-bottom:6px;">${st.name}</div>
         <div style="font-size:13px;">ID: ${st.id}</div>
-        <div style="font-size:13px;">Estado: ${st.status}</div>
+        <div style="font-size:13px;">Estado: ${st.status}</div>${latest}
         <div style="font-size:12px; color:#6b7280; margin-top:6px;">Última conexión: ${st.lastSeen ?? "—"}</div>
       `;
       marker.bindPopup(popupHtml, { minWidth: 180 });
@@ -88,13 +117,84 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
     };
 
     // add markers into groups
-    const markerList = [];
-    stations.forEach((st) => {
-      const m = createMarker(st);
-      markerList.push(m);
-      if (st.status === "online") onlineGroup.addLayer(m);
-      else if (st.status === "alert") alertGroup.addLayer(m);
-      else offlineGroup.addLayer(m);
+    const addStations = (list) => {
+      const markers = [];
+      list.forEach((st) => {
+        const m = createMarker(st);
+        markers.push(m);
+        if (st.status === "online") onlineGroup.addLayer(m);
+        else if (st.status === "alert") alertGroup.addLayer(m);
+        else offlineGroup.addLayer(m);
+      });
+      return markers;
+    };
+    const markerList = addStations(stations);
+
+    // replace markers and field polygons with the server's view of the viewport
+    const clearHeat = () => {
+      heatGroup.clearLayers();
+      heatUrls.forEach((u) => URL.revokeObjectURL(u));
+      heatUrls = [];
+    };
+
+    const loadHeatmaps = (fieldLayers, mine) => {
+      clearHeat();
+      if (!map.hasLayer(heatGroup)) return;
+      fieldLayers.forEach(async ({ id, bounds }) => {
+        try {
+          const blob = await fetchFieldHeatmap(id, "temperature_c", Math.round(map.getZoom()));
+          if (!blob || mine !== seq) return;
+          const url = URL.createObjectURL(blob);
+          heatUrls.push(url);
+          heatGroup.addLayer(L.imageOverlay(url, bounds, { opacity: 0.75 }));
+        } catch (e) {
+          console.warn("heatmap:", e);
+        }
+      });
+    };
+
+    const renderFeatures = (fc, mine) => {
+      [onlineGroup, alertGroup, offlineGroup, fieldsGroup].forEach((g) => g.clearLayers());
+      const fields = fc.features.filter((f) => f.properties.kind === "field");
+      const fieldLayers = [];
+      fields.forEach((f) => {
+        const layer = L.geoJSON(f, {
+          style: { color: "#fbbf24", weight: 2, fillOpacity: 0.08 },
+        });
+        const crop = f.properties.crop ? ` — ${f.properties.crop}` : "";
+        layer.bindTooltip(`${f.properties.name}${crop} (${fmt(f.properties.area_ha, 2)} ha)`);
+        fieldsGroup.addLayer(layer);
+        fieldLayers.push({ id: f.id, bounds: layer.getBounds() });
+      });
+      loadHeatmaps(fieldLayers, mine);
+      const devices = fc.features.filter((f) => f.properties.kind === "device").map(featureToStation);
+      addStations(devices);
+      setCounts({ stations: devices.length, fields: fields.length });
+    };
+
+    // one request per settled viewport; responses for older viewports are dropped
+    let seq = 0;
+    let timer = null;
+    const loadViewport = () => {
+      clearTimeout(timer);
+      timer = setTimeout(async () => {
+        const mine = ++seq;
+        const b = map.getBounds();
+        const bbox = [
+          Math.max(b.getWest(), -180), Math.max(b.getSouth(), -90),
+          Math.min(b.getEast(), 180), Math.min(b.getNorth(), 90),
+        ].map((v) => v.toFixed(6));
+        try {
+          const fc = await fetchMapFeatures(bbox);
+          if (mine === seq) renderFeatures(fc, mine);
+        } catch (e) {
+          console.warn("map features:", e);
+        }
+      }, MOVE_DEBOUNCE_MS);
+    };
+    map.on("moveend", loadViewport);
+    map.on("overlayadd", (e) => {
+      if (e.layer === heatGroup) loadViewport();
     });
 
     // add groups to the map according to initial visibility
@@ -104,7 +204,7 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
 
     // layer control (baseMaps, overlays)
     const baseMaps = { "Satélite": satellite, "Calles": street };
-    const overlays = { "Online": onlineGroup, "Alerta": alertGroup, "Desconectado": offlineGroup };
+    const overlays = { "Parcelas": fieldsGroup, "Temperatura (interpolada)": heatGroup, "Online": onlineGroup, "Alerta": alertGroup, "Desconectado": offlineGroup };
     L.control.layers(baseMaps, overlays, { collapsed: false }).addTo(map);
 
     // fit bounds if we have markers
@@ -118,6 +218,7 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
     // ensure map measures correctly after layout (card) finishes rendering
     map.whenReady(() => {
       requestAnimationFrame(() => map.invalidateSize(true));
+      loadViewport();
     });
 
     // keep reference and cleanup
@@ -127,6 +228,9 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
     window.addEventListener("resize", onResize);
 
     return () => {
+      clearTimeout(timer);
+      seq += 1;
+      clearHeat();
       window.removeEventListener("resize", onResize);
       map.remove();
       mapRef.current = null;
@@ -157,7 +261,7 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
           <div className="kv">Agricultura de Precisión — Monitoreo IoT</div>
         </div>
         <div style={{ textAlign: "right" }}>
-          <div style={{ fontSize: 18, fontWeight: 700, color: "#065f46" }}>1</div>
+          <div style={{ fontSize: 18, fontWeight: 700, color: "#065f46" }}>{counts.fields || 1}</div>
           <div className="kv">Parcela</div>
         </div>
       </div>
@@ -168,7 +272,7 @@ export default function MapaInteractivo({ stations = SAMPLE_STATIONS /* or pass
         <div className="card map-card">
           <div className="card-header" style={{ display: "flex", justifyContent: "space-between", alignItems: "center", padding: "12px 16px", borderBottom: "1px solid var(--card-border)" }}>
             <div style={{ fontWeight: 700 }}>Mapa - Estaciones</div>
-            <div style={{ fontSize: 13, color: "var(--muted)" }}>{stations.length} estaciones</div>
+            <div style={{ fontSize: 13, color: "var(--muted)" }}>{counts.stations} estaciones</div>
           </div>
           <div className="map-box" ref={containerRef} />
         </div>
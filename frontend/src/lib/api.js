@@ -23,6 +23,36 @@ export async function fetchSummary(deviceId, hours = 24) {
   return r.json();
 }
 
+// Acknowledge a server-side alert (protected)
+export async function acknowledgeAlert(alertId) {
+  const r = await authFetch(`${BASE}/api/v1/alerts/${alertId}/ack`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+  });
+  if (!r.ok) throw new Error(`ack failed: ${r.status}`);
+  return r.json();
+}
+
+// Fields and devices inside [minLon, minLat, maxLon, maxLat] as GeoJSON (protected)
+export async function fetchMapFeatures(bbox) {
+  const r = await authFetch(`${BASE}/api/v1/map/features?bbox=${bbox.join(",")}`, {
+    method: "GET",
+    headers: { "Content-Type": "application/json" },
+  });
+  if (!r.ok) throw new Error(`map features failed: ${r.status}`);
+  return r.json();
+}
+
+// Interpolated field heatmap as a PNG blob covering the field's bbox (protected)
+export async function fetchFieldHeatmap(fieldId, metric = "temperature_c", zoom = 17) {
+  const r = await authFetch(`${BASE}/api/v1/fields/${fieldId}/heatmap?metric=${metric}&zoom=${zoom}`, {
+    method: "GET",
+  });
+  if (r.status === 404) return null; // no recent readings in this field
+  if (!r.ok) throw new Error(`heatmap failed: ${r.status}`);
+  return r.blob();
+}
+
 /**
  * openLive(deviceId)
  * - uses access_token stored in localStorage and sends it as ?access_token=...
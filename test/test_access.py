@@ -0,0 +1,282 @@
+# tests/test_access.py
+"""
+Device access index (core/access.py).  Grant resolution runs on SQLite; the
+Redis side (lazy build, incremental add, revoke) needs a Redis on
+TEST_REDIS_URL (default redis://localhost:6379/15) and is skipped without one.
+"""
+import json
+import os
+import uuid
+
+import pytest
+import redis
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.core import access
+from app.core.config import settings
+from app.core.principals import Principal
+from app.db import models
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(UUID, "sqlite")
+def _sqlite_uuid(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+def _redis_available() -> bool:
+    try:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+    except Exception:
+        return False
+
+
+needs_redis = pytest.mark.skipif(not _redis_available(), reason="local Redis not reachable")
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'acl.db'}")
+    tables = [models.User.__table__, models.Field.__table__, models.Device.__table__, models.DeviceGrant.__table__,
+              models.AlertRule.__table__]
+    models.Base.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def farm(db):
+    """Two users, a field with two devices, one loose device owned by ana."""
+    ana = models.User(name="Ana", email="ana@x", role="Agronomo", password_hash="-")
+    ben = models.User(name="Ben", email="ben@x", role="Tecnico", password_hash="-")
+    field = models.Field(name="P1", boundary={}, min_lon=0, min_lat=0, max_lon=1, max_lat=1)
+    db.add_all([ana, ben, field])
+    db.flush()
+    in_field = [models.Device(name=f"f{i}", token="t", field_id=field.id) for i in range(2)]
+    loose = models.Device(name="loose", token="t", owner_id=ana.id)
+    db.add_all(in_field + [loose])
+    db.commit()
+    return ana, ben, field, in_field, loose
+
+
+def principal(user) -> Principal:
+    return Principal(id=user.id, role=user.role, status="activo")
+
+
+def test_resolution_covers_owner_user_role_and_field_grants(db, farm):
+    ana, ben, field, in_field, loose = farm
+    assert access.accessible_device_ids(db, ana.id, ana.role) == {str(loose.id)}
+    assert access.accessible_device_ids(db, ben.id, ben.role) == set()
+
+    db.add_all([
+        models.DeviceGrant(subject_type="user", subject=str(ben.id), scope_type="device", scope_id=loose.id),
+        models.DeviceGrant(subject_type="role", subject="Agronomo", scope_type="field", scope_id=field.id),
+    ])
+    db.commit()
+    assert access.accessible_device_ids(db, ben.id, ben.role) == {str(loose.id)}
+    assert access.accessible_device_ids(db, ana.id, ana.role) == {str(d.id) for d in in_field + [loose]}
+    assert access.field_grant_users(db, [field.id, None]) == [str(ana.id)]
+
+
+@needs_redis
+def test_index_builds_lazily_then_updates_incrementally(db, farm, monkeypatch):
+    monkeypatch.setattr(settings, "ACL_LOCAL_TTL_S", 0.0)
+    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    index = access.AccessIndex(client)
+    ana, ben, field, in_field, loose = farm
+    try:
+        assert index.allowed(principal(ben), db) == frozenset()          # built, empty
+        assert client.sismember(f"acl:user:{ben.id}", "*")
+
+        grant = models.DeviceGrant(subject_type="user", subject=str(ben.id), scope_type="field", scope_id=field.id)
+        db.add(grant)
+        db.commit()
+        index.added([str(ben.id)], access.scope_devices(db, "field", field.id))
+        assert index.allowed(principal(ben), db) == {str(d.id) for d in in_field}
+        assert not client.exists(f"acl:user:{ana.id}")                   # untouched until needed
+
+        db.delete(grant)
+        db.commit()
+        index.revoked([str(ben.id)])
+        assert not index.can_read(principal(ben), in_field[0].id, db)
+        assert index.can_read(principal(ana), loose.id, db)
+        admin = Principal(id=uuid.uuid4(), role=access.ADMIN_ROLE, status="activo")
+        assert index.allowed(admin) is None and index.can_read(admin, uuid.uuid4())
+    finally:
+        for key in client.scan_iter("acl:*"):
+            client.delete(key)
+
+
+class _NoRedis:
+    def __getattr__(self, name):
+        def down(*args, **kwargs):
+            raise redis.ConnectionError("down")
+        return down
+
+
+def test_listings_are_scoped_to_readable_devices(db, farm, monkeypatch):
+    from app.api import access as access_api, alerts as alerts_api, geo
+
+    ana, ben, field, in_field, loose = farm
+    # without Redis the index reads grants from the database
+    monkeypatch.setattr(access, "_index", access.AccessIndex(_NoRedis()))
+    monkeypatch.setattr(settings, "ACL_LOCAL_TTL_S", 0.0)
+    db.add_all([
+        models.AlertRule(name="all", field="temperature_c", op=">", value=40),
+        models.AlertRule(name="loose", field="temperature_c", op=">", value=40, device_id=loose.id),
+        models.AlertRule(name="field", field="temperature_c", op=">", value=40, device_id=in_field[0].id),
+    ])
+    db.commit()
+
+    rules = alerts_api.list_rules(db=db, current=principal(ana))
+    assert sorted(r["name"] for r in rules) == ["all", "loose"]
+    with pytest.raises(HTTPException) as exc:
+        alerts_api.list_rules(device_id=in_field[0].id, db=db, current=principal(ana))
+    assert exc.value.status_code == 403
+
+    assert json.loads(geo.list_fields(db=db, current=principal(ana)).body) == []
+    assert [d["name"] for d in json.loads(access_api.my_devices(db=db, current=principal(ana)).body)] == ["loose"]
+    assert json.loads(access_api.my_devices(db=db, current=principal(ben)).body) == []
+    db.add(models.DeviceGrant(subject_type="user", subject=str(ben.id), scope_type="device", scope_id=in_field[1].id))
+    db.commit()
+    assert [f["name"] for f in json.loads(geo.list_fields(db=db, current=principal(ben)).body)] == ["P1"]
+    admin = Principal(id=uuid.uuid4(), role=access.ADMIN_ROLE, status="activo")
+    assert len(alerts_api.list_rules(db=db, current=admin)) == 3
+
+
+def test_grant_changes_without_redis_fail_closed(db, farm, monkeypatch):
+    monkeypatch.setattr(settings, "ACL_LOCAL_TTL_S", 60.0)
+    ana, ben, field, in_field, loose = farm
+    index = access.AccessIndex(_NoRedis())
+    grant = models.DeviceGrant(subject_type="user", subject=str(ben.id), scope_type="device", scope_id=loose.id)
+    db.add(grant)
+    db.commit()
+    assert index.can_read(principal(ben), loose.id, db)
+    db.delete(grant)
+    db.commit()
+    index.revoked([str(ben.id)])              # logged, not raised
+    index.added([str(ana.id)], [str(in_field[0].id)])
+    assert index._pending == {str(ana.id), str(ben.id)}
+    assert not index.can_read(principal(ben), loose.id, db)
+
+
+@needs_redis
+def test_revoke_during_build_is_not_overwritten(db, farm, monkeypatch):
+    monkeypatch.setattr(settings, "ACL_LOCAL_TTL_S", 0.0)
+    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    index = access.AccessIndex(client)
+    ana, ben, field, in_field, loose = farm
+    grant = models.DeviceGrant(subject_type="user", subject=str(ben.id), scope_type="device", scope_id=loose.id)
+    db.add(grant)
+    db.commit()
+    compute = access.AccessIndex._compute
+
+    def slow_compute(uid, role, session):
+        ids = compute(uid, role, session)
+        # the grant goes away after the query but before the set is stored
+        db.delete(grant)
+        db.commit()
+        index.revoked([str(ben.id)])
+        return ids
+
+    try:
+        monkeypatch.setattr(access.AccessIndex, "_compute", staticmethod(slow_compute))
+        assert index.allowed(principal(ben), db) == {str(loose.id)}
+        assert not client.exists(f"acl:user:{ben.id}")
+        monkeypatch.setattr(access.AccessIndex, "_compute", staticmethod(compute))
+        assert not index.can_read(principal(ben), loose.id, db)
+    finally:
+        for key in client.scan_iter("acl:*"):
+            client.delete(key)
+
+
+@needs_redis
+def test_grant_during_build_is_not_lost(db, farm, monkeypatch):
+    monkeypatch.setattr(settings, "ACL_LOCAL_TTL_S", 0.0)
+    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    index = access.AccessIndex(client)
+    ana, ben, field, in_field, loose = farm
+    compute = access.AccessIndex._compute
+
+    def slow_compute(uid, role, session):
+        ids = compute(uid, role, session)
+        # the grant commits after the query; ben has no set yet to add it to
+        db.add(models.DeviceGrant(subject_type="user", subject=str(ben.id), scope_type="device",
+                                  scope_id=loose.id))
+        db.commit()
+        index.added([str(ben.id)], [str(loose.id)])
+        return ids
+
+    try:
+        monkeypatch.setattr(access.AccessIndex, "_compute", staticmethod(slow_compute))
+        assert str(loose.id) not in index.allowed(principal(ben), db)
+        assert not client.exists(f"acl:user:{ben.id}")
+        monkeypatch.setattr(access.AccessIndex, "_compute", staticmethod(compute))
+        assert index.can_read(principal(ben), loose.id, db)
+    finally:
+        for key in client.scan_iter("acl:*"):
+            client.delete(key)
+
+
+class _Socket:
+    def __init__(self):
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+def test_open_sockets_follow_grant_changes(monkeypatch):
+    import asyncio
+
+    from app.api import telemetry
+
+    monkeypatch.setattr(settings, "ACL_WS_RECHECK_S", 0.01)
+    readable = {"d1", "d2"}
+
+    class Index:
+        def allowed(self, principal, db=None):
+            return frozenset(readable)
+
+        def can_read(self, principal, device_id, db=None):
+            return device_id in readable
+
+    monkeypatch.setattr(access, "get_access_index", Index)
+    manager = telemetry.ConnectionManager()
+    monkeypatch.setattr(telemetry, "manager", manager)
+    user = Principal(id=uuid.uuid4(), role="Tecnico", status="activo")
+
+    async def run():
+        one, every = _Socket(), _Socket()
+        await manager.connect(one, "d1")
+        await manager.connect(every, None, device_ids=frozenset(readable))
+        tasks = [asyncio.create_task(telemetry._follow_access(one, user, "d1", None)),
+                 asyncio.create_task(telemetry._follow_access(every, user, None, frozenset(readable)))]
+        readable.discard("d1")
+        readable.add("d3")
+        await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return one, every
+
+    one, every = asyncio.run(run())
+    assert one.closed == 1008
+    assert manager.interest() == (False, {"d2", "d3"})
+    assert manager.ref_count("d1") == 0 and manager.ref_count("d3") == 1
+
@@ -0,0 +1,111 @@
+# tests/test_alerts.py
+import os
+from types import SimpleNamespace
+
+import pytest
+import redis
+
+from app.workers.alerts import RULES_VERSION_KEY, Reading, compile_rules, evaluate, rules_changed, state_keys
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+def _redis_available() -> bool:
+    try:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+    except Exception:
+        return False
+
+
+needs_redis = pytest.mark.skipif(not _redis_available(), reason="local Redis not reachable")
+
+DEV_A = "00000000-0000-0000-0000-00000000000a"
+DEV_B = "00000000-0000-0000-0000-00000000000b"
+
+
+def rule(id, field, kind="threshold", op=">", value=0.0, device_id=None, window_s=None):
+    return SimpleNamespace(
+        id=id, name=id, device_id=device_id, field=field, kind=kind, op=op,
+        value=value, window_s=window_s, severity="Alta", cooldown_s=900,
+    )
+
+
+def test_index_matches_device_and_fleet_rules_only():
+    index = compile_rules([
+        rule("fleet-hot", "temperature_c", value=35),
+        rule("a-hot", "temperature_c", value=30, device_id=DEV_A),
+        rule("b-dry", "relative_humidity_pct", op="<", value=20, device_id=DEV_B),
+        rule("bad", "temperature_c", op="!=", value=1),
+    ])
+    assert len(index) == 3
+    assert {r.id for r in index.match(DEV_A, "temperature_c")} == {"a-hot", "fleet-hot"}
+    assert {r.id for r in index.match(DEV_B, "temperature_c")} == {"fleet-hot"}
+    assert index.match(DEV_A, "relative_humidity_pct") == ()
+    assert index.match(DEV_A, "battery_v") == ()
+
+
+def test_threshold_and_rate():
+    index = compile_rules([
+        rule("hot", "temperature_c", value=35),
+        rule("jump", "temperature_c", kind="rate", value=1.0, window_s=600),
+    ])
+    readings = [
+        Reading(DEV_A, 1000.0, {"temperature_c": 36.0}),   # out of order on purpose
+        Reading(DEV_A, 700.0, {"temperature_c": 30.0}),
+    ]
+    state = {}
+    assert state_keys(index, readings) == {f"alerts:last:{DEV_A}:temperature_c"}
+    out = evaluate(index, readings, state)
+
+    fired = sorted((c.rule.id, c.reading.t) for c in out.candidates)
+    assert fired == [("hot", 1000.0), ("jump", 1000.0)]
+    (rate,) = [c.observed for c in out.candidates if c.rule.id == "jump"]
+    assert rate == 1.2
+    assert out.writes == {f"alerts:last:{DEV_A}:temperature_c": (1000.0, 36.0)}
+
+
+def test_rate_ignores_stale_previous_reading():
+    index = compile_rules([rule("jump", "temperature_c", kind="rate", value=1.0, window_s=60)])
+    state = {f"alerts:last:{DEV_A}:temperature_c": (0.0, 0.0)}
+    out = evaluate(index, [Reading(DEV_A, 3600.0, {"temperature_c": 40.0})], state)
+    assert out.candidates == []
+
+
+def test_sustained_fires_after_window_and_resets():
+    index = compile_rules([rule("frost", "temperature_c", kind="sustained", op="<", value=0, window_s=600)])
+    key = f"alerts:since:frost:{DEV_A}"
+    state = {}
+
+    out = evaluate(index, [Reading(DEV_A, 0.0, {"temperature_c": -1.0})], state)
+    assert out.candidates == [] and out.writes == {key: 0.0}
+
+    out = evaluate(index, [Reading(DEV_A, 300.0, {"temperature_c": -2.0})], state)
+    assert out.candidates == []
+
+    out = evaluate(index, [Reading(DEV_A, 600.0, {"temperature_c": -2.5})], state)
+    (c,) = out.candidates
+    assert c.since == 0.0 and c.observed == -2.5
+
+    out = evaluate(index, [Reading(DEV_A, 900.0, {"temperature_c": 1.0})], state)
+    assert out.candidates == [] and out.deletes == {key} and state[key] is None
+
+
+def test_rules_changed_logs_redis_errors():
+    class Down:
+        def incr(self, key):
+            raise redis.ConnectionError("down")
+
+    rules_changed(Down(), rule_id="r1")      # the rule change is committed already
+
+
+@needs_redis
+def test_rules_changed_drops_sustained_state_of_the_rule():
+    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    client.set(RULES_VERSION_KEY, 3)
+    client.mset({"alerts:since:r1:a": 1, "alerts:since:r1:b": 1, "alerts:since:r2:a": 1})
+    try:
+        rules_changed(client, rule_id="r1")
+        assert client.get(RULES_VERSION_KEY) == "4"
+        assert sorted(client.scan_iter("alerts:since:*")) == ["alerts:since:r2:a"]
+    finally:
+        client.delete(RULES_VERSION_KEY, "alerts:since:r2:a")
@@ -0,0 +1,56 @@
+# tests/test_analysis.py
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.workers import analysis
+
+
+@pytest.fixture
+def half_green(tmp_path):
+    # left half vegetation green, right half bare soil brown
+    arr = np.zeros((300, 400, 3), dtype=np.uint8)
+    arr[:, :200] = (40, 160, 40)
+    arr[:, 200:] = (140, 100, 60)
+    path = tmp_path / "frame.png"
+    Image.fromarray(arr).save(path)
+    return str(path), arr
+
+
+def test_canopy_cover_and_tiling_match_whole_frame(half_green):
+    path, arr = half_green
+    res = analysis.analyze_image(path, tile=64)
+    assert res["pixels"] == 400 * 300
+    assert res["canopy_cover"] == pytest.approx(0.5)
+
+    exg, vari, _ = analysis.tile_indices(arr.astype(np.float32))
+    assert res["exg"]["mean"] == pytest.approx(float(exg.mean()), rel=1e-6)
+    assert res["vari"]["mean"] == pytest.approx(float(vari.mean()), rel=1e-6)
+    assert sum(res["exg"]["hist"]) == res["pixels"]
+
+
+def test_session_aggregate_is_pixel_weighted(half_green):
+    path, _ = half_green
+    res = analysis.analyze_image(path, tile=128)
+    agg = analysis.merge_session_aggregate(None, res)
+    agg = analysis.merge_session_aggregate(agg, res)
+    assert agg["images"] == 2
+    assert agg["pixels"] == 2 * res["pixels"]
+    assert agg["canopy_cover"] == pytest.approx(res["canopy_cover"])
+    assert agg["exg"]["hist"] == [2 * h for h in res["exg"]["hist"]]
+
+
+def test_max_edge_decodes_jpeg_at_draft_scale(tmp_path):
+    arr = np.zeros((1200, 1600, 3), dtype=np.uint8)
+    arr[:, :800] = (40, 160, 40)
+    arr[:, 800:] = (140, 100, 60)
+    path = tmp_path / "frame.jpg"
+    Image.fromarray(arr).save(path, quality=95)
+
+    full = analysis.analyze_image(str(path), tile=256)
+    small = analysis.analyze_image(str(path), tile=256, max_edge=300)
+    assert (small["source_width"], small["source_height"]) == (1600, 1200)
+    # 1/4 scale is the smallest that still covers 300 px
+    assert (small["width"], small["height"]) == (400, 300)
+    assert small["canopy_cover"] == pytest.approx(full["canopy_cover"], abs=0.01)
+    assert small["exg"]["mean"] == pytest.approx(full["exg"]["mean"], abs=0.01)
@@ -0,0 +1,87 @@
+# tests/test_anomaly.py
+import math
+import random
+from datetime import datetime, timezone
+
+from app.workers.alerts import Reading
+from app.workers.anomaly import Params, alert_claims, detect
+
+DEV_A = "00000000-0000-0000-0000-00000000000a"
+DEV_B = "00000000-0000-0000-0000-00000000000b"
+
+PARAMS = Params(alpha=0.1, z_threshold=4.0, warmup=10, stuck_s=600, stuck_min_count=5, reset_gap_s=3600)
+
+
+def run(readings, state=None, params=PARAMS):
+    """Feed readings one at a time, like the single-row writer."""
+    state = {} if state is None else state
+    flags = []
+    for r in readings:
+        out = detect([r], state, params)
+        state.update(out.state)
+        flags.append(out.flags[0])
+    return flags, state
+
+
+def noisy(device, n, start=0.0, step=60.0, base=20.0, seed=1):
+    rng = random.Random(seed)
+    return [
+        Reading(device, start + i * step, {"temperature_c": base + rng.gauss(0, 0.5), "relative_humidity_pct": 50 + rng.gauss(0, 2)})
+        for i in range(n)
+    ]
+
+
+def test_zscore_flags_a_sudden_drop_after_warmup():
+    flags, state = run(noisy(DEV_A, 50))
+    assert not any(flags)
+    (flag,) = run([Reading(DEV_A, 50 * 60.0, {"temperature_c": 5.0})], state)[0][0]
+    assert flag["detector"] == "zscore" and flag["field"] == "temperature_c"
+    assert flag["z"] < -4 and abs(flag["mean"] - 20) < 1
+
+
+def test_spike_does_not_hide_the_next_one():
+    flags, state = run(noisy(DEV_A, 50))
+    spikes = [Reading(DEV_A, (50 + i) * 60.0, {"temperature_c": 45.0}) for i in range(2)]
+    flags, _ = run(spikes, state)
+    assert all(f and f[0]["detector"] == "zscore" for f in flags)
+
+
+def test_no_flags_during_warmup():
+    flags, _ = run([Reading(DEV_A, i * 60.0, {"temperature_c": 20.0 if i % 2 else -20.0}) for i in range(PARAMS.warmup)])
+    assert not any(f["detector"] == "zscore" for fs in flags for f in fs)
+
+
+def test_stuck_sensor_needs_time_and_count():
+    readings = [Reading(DEV_A, i * 60.0, {"relative_humidity_pct": 55.0, "solar_radiance_w_m2": 0.0}) for i in range(12)]
+    flags, _ = run(readings)
+    stuck = [i for i, fs in enumerate(flags) if any(f["detector"] == "stuck" for f in fs)]
+    # 10 min unchanged and at least 5 readings: from the 11th reading on
+    assert stuck == [10, 11]
+    assert all(f["field"] == "relative_humidity_pct" for i in stuck for f in flags[i])
+    assert flags[10][0]["for_s"] == 600.0
+
+
+def test_batch_matches_one_by_one_and_skips_late_readings():
+    readings = noisy(DEV_A, 40) + noisy(DEV_B, 40, seed=2)
+    readings.append(Reading(DEV_A, 40 * 60.0, {"temperature_c": -10.0}))
+    readings.append(Reading(DEV_B, 40 * 60.0, {"temperature_c": 20.1}))
+    random.Random(3).shuffle(readings)
+
+    one_by_one, state = run(sorted(readings, key=lambda r: r.t))
+    batch = detect(readings, {}, PARAMS)
+    by_reading = {(r.device_id, r.t): f for r, f in zip(sorted(readings, key=lambda r: r.t), one_by_one)}
+    assert [by_reading[(r.device_id, r.t)] for r in readings] == batch.flags
+    for key, entry in batch.state.items():
+        assert all(a == b or (a is not None and math.isclose(a, b)) for a, b in zip(entry, state[key]))
+
+    late = detect([Reading(DEV_A, 10 * 60.0, {"temperature_c": 99.0})], state, PARAMS)
+    assert late.flags == [[]] and late.state == {}
+
+
+def test_alert_claims_one_per_detector_and_device():
+    readings = [Reading(DEV_A, 0.0, {}, measurement_id=1), Reading(DEV_A, 60.0, {}, measurement_id=2)]
+    flag = {"field": "temperature_c", "detector": "zscore", "value": 5.0, "z": -6.0, "mean": 20.0}
+    claims = alert_claims(readings, [[flag], [flag]], datetime.now(timezone.utc))
+    (key, cooldown, row), = claims
+    assert key == f"alerts:dedupe:anomaly:zscore:temperature_c:{DEV_A}"
+    assert row["alert_type"] == "zscore:temperature_c" and row["payload"]["measurement_id"] == 1
@@ -0,0 +1,175 @@
+# tests/test_camera_sessions.py
+"""
+Batched camera uploads (api/images.py): presigned PUTs for a whole session
+and the single-INSERT complete call, on SQLite with Celery stubbed out.
+"""
+import contextlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.api import images as images_api
+from app.core.config import settings
+from app.db import models
+from app.utils import s3
+from app.workers import tasks
+
+T0 = datetime(2024, 5, 1, 8, tzinfo=timezone.utc)
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(UUID, "sqlite")
+def _sqlite_uuid(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'camera.db'}")
+    tables = [models.User.__table__, models.Field.__table__, models.Device.__table__,
+              models.CameraSession.__table__, models.Image.__table__]
+    models.Base.metadata.create_all(engine, tables=tables)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cur, sql, *a: statements.append(sql))
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.statements = statements
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    sent = []
+
+    class Celery:
+        @contextlib.contextmanager
+        def producer_or_acquire(self):
+            yield "producer"
+
+    class ProcessImage:
+        def apply_async(self, args, producer=None):
+            assert producer == "producer"
+            sent.append(args)
+
+    monkeypatch.setattr(tasks, "celery", Celery())
+    monkeypatch.setattr(tasks, "process_image", ProcessImage())
+    return sent
+
+
+@pytest.fixture
+def camera(db):
+    device = models.Device(name="cam", token="t")
+    db.add(device)
+    db.flush()
+    session = models.CameraSession(device_id=device.id, started_at=T0, frames_count=0, meta={})
+    db.add(session)
+    db.commit()
+    return session
+
+
+def _frames(session, indexes):
+    prefix = f"camera/{session.device_id}/{session.id}/"
+    return images_api.SessionCompleteIn(frames=[
+        images_api.FrameCompleteIn(frame_index=i, timestamp=T0 + timedelta(seconds=i), s3_key=f"{prefix}{i:06d}.jpg")
+        for i in indexes
+    ])
+
+
+def test_request_uploads_presigns_one_key_per_frame(db, camera, monkeypatch):
+    signed = []
+    monkeypatch.setattr(images_api, "generate_presigned_puts",
+                        lambda keys, expires_in: signed.append(expires_in) or [f"https://s3/{k}" for k in keys])
+    out = images_api.request_session_uploads(camera.id, images_api.SessionUploadsIn(count=3, start_index=7), db=db)
+    prefix = f"camera/{camera.device_id}/{camera.id}/"
+    assert [u["frame_index"] for u in out["uploads"]] == [7, 8, 9]
+    assert [u["s3_key"] for u in out["uploads"]] == [f"{prefix}{i:06d}.jpg" for i in (7, 8, 9)]
+    assert out["uploads"][0]["upload_url"] == f"https://s3/{prefix}000007.jpg"
+    assert signed == [settings.UPLOAD_URL_EXPIRE_S]
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BATCH", 2)
+    with pytest.raises(HTTPException) as exc:
+        images_api.request_session_uploads(camera.id, images_api.SessionUploadsIn(count=3), db=db)
+    assert exc.value.status_code == 400
+    with pytest.raises(HTTPException) as exc:
+        images_api.request_session_uploads(uuid.uuid4(), images_api.SessionUploadsIn(count=1), db=db)
+    assert exc.value.status_code == 404
+
+
+def test_presigned_puts_sign_locally(monkeypatch):
+    for name, value in (("MINIO_ENDPOINT", "minio:9000"), ("MINIO_ACCESS_KEY", "k"), ("MINIO_SECRET_KEY", "s")):
+        monkeypatch.setattr(settings, name, value)
+    s3.get_s3_client.cache_clear()
+    try:
+        urls = s3.generate_presigned_puts(["camera/d/s/000000.jpg", "camera/d/s/000001.jpg"], expires_in=120)
+    finally:
+        s3.get_s3_client.cache_clear()
+    parsed = [urlparse(u) for u in urls]
+    assert [p.path for p in parsed] == [f"/{settings.MINIO_BUCKET}/camera/d/s/00000{i}.jpg" for i in (0, 1)]
+    assert all(parse_qs(p.query)["X-Amz-Expires"] == ["120"] and "X-Amz-Signature" in parse_qs(p.query)
+               for p in parsed)
+
+
+def test_complete_validates_before_writing(db, camera, enqueued, monkeypatch):
+    foreign = _frames(camera, range(2))
+    foreign.frames[1].s3_key = f"camera/{camera.device_id}/{uuid.uuid4()}/000001.jpg"
+    with pytest.raises(HTTPException) as exc:
+        images_api.session_complete(camera.id, foreign, db=db)
+    assert exc.value.status_code == 400 and "Keys outside" in exc.value.detail
+
+    with pytest.raises(HTTPException) as exc:
+        images_api.session_complete(camera.id, images_api.SessionCompleteIn(frames=[]), db=db)
+    assert exc.value.status_code == 400
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BATCH", 2)
+    with pytest.raises(HTTPException) as exc:
+        images_api.session_complete(camera.id, _frames(camera, range(3)), db=db)
+    assert exc.value.status_code == 400
+    assert db.query(models.Image).count() == 0 and enqueued == []
+
+
+def test_complete_inserts_all_frames_at_once(db, camera, enqueued):
+    db.statements.clear()
+    out = images_api.session_complete(camera.id, _frames(camera, range(5)), db=db)
+    inserts = [sql for sql in db.statements if sql.lstrip().upper().startswith("INSERT INTO IMAGES")]
+    assert len(inserts) == 1 and out["registered"] == 5
+    assert sorted(str(image_id) for image_id, _ in enqueued) == sorted(out["image_ids"])
+    rows = db.query(models.Image).order_by(models.Image.capture_time).all()
+    assert [r.device_id for r in rows] == [camera.device_id] * 5 and {r.status for r in rows} == {"pending"}
+    db.refresh(camera)
+    assert camera.frames_count == 5
+
+
+def test_repeated_complete_registers_frames_once(db, camera, enqueued):
+    first = images_api.session_complete(camera.id, _frames(camera, range(3)), db=db)
+    assert first["registered"] == 3 and len(enqueued) == 3
+
+    # retried with one more frame: only the new one is inserted and processed
+    again = images_api.session_complete(camera.id, _frames(camera, range(4)), db=db)
+    assert again["registered"] == 1 and again["image_ids"][:3] == first["image_ids"]
+    assert [key for _, key in enqueued[3:]] == [f"camera/{camera.device_id}/{camera.id}/000003.jpg"]
+    assert db.query(models.Image).count() == 4
+    db.refresh(camera)
+    assert camera.frames_count == 4
+
+
+def test_repeated_legacy_complete_returns_the_same_image(db, camera, monkeypatch):
+    delayed = []
+    monkeypatch.setattr(tasks.process_image, "delay", lambda *args: delayed.append(args))
+    payload = images_api.ImageCompleteIn(session_id=str(camera.id), frame_index=0, timestamp=T0,
+                                         s3_key=f"camera/{camera.device_id}/legacy.jpg")
+    first = images_api.image_complete(payload, db=db)
+    assert images_api.image_complete(payload, db=db) == first
+    # filed under the session's device, so it shows in that device's gallery
+    assert db.get(models.Image, uuid.UUID(first["image_id"])).device_id == camera.device_id
+    assert len(delayed) == 1 and db.query(models.Image).count() == 1
@@ -0,0 +1,88 @@
+# tests/test_fleet.py
+"""
+Fleet health state (workers/fleet.py).  The Lua update and the sweep run
+against a Redis on TEST_REDIS_URL (default redis://localhost:6379/15) and are
+skipped without one; ``describe`` is checked on its own.
+"""
+import os
+import uuid
+
+import pytest
+import redis
+
+from app.core.config import settings
+from app.workers import fleet
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379/15")
+T0 = 1_700_000_000.0
+
+
+def _redis_available() -> bool:
+    try:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+    except Exception:
+        return False
+
+
+needs_redis = pytest.mark.skipif(not _redis_available(), reason="local Redis not reachable")
+
+
+@pytest.fixture
+def health():
+    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    client.delete(fleet.LAST_SEEN_KEY, fleet.OFFLINE_KEY, fleet.SWEEP_CUTOFF_KEY)
+    yield fleet.FleetHealth(client)
+    for key in client.scan_iter("health:*"):
+        client.delete(key)
+
+
+def test_describe_decays_rate_and_classifies():
+    state = {"last_seen": T0, "rate": 0.1, "msgs": 10.0, "batt": 3.91, "batt_trend": -1e-6}
+    fresh = fleet.describe(state, T0 + 10)
+    assert fresh["status"] == "online" and fresh["rate_per_min"] == pytest.approx(6 * 0.989, abs=0.01)
+    assert fresh["battery_trend_v_per_day"] == pytest.approx(-0.0864)
+    assert fleet.describe(state, T0 + settings.HEALTH_OFFLINE_S - 1)["status"] == "stale"
+    assert fleet.describe(state, T0 + settings.HEALTH_OFFLINE_S + 1)["status"] == "offline"
+    assert fleet.describe(None, T0) == {"status": "never"}
+
+
+@needs_redis
+def test_record_tracks_rate_gaps_duplicates_and_skew(health):
+    dev = str(uuid.uuid4())
+    for i in range(60):
+        health.record(dev, T0 + 10 * i, T0 + 10 * i - 3, duplicate=(i % 4 == 0), battery_v=3.9)
+    health.record(dev, T0 + 600 + settings.HEALTH_GAP_S + 1, T0 + 600 + settings.HEALTH_GAP_S + 1)
+    # a message handled late by another worker must not move last_seen back
+    health.record(dev, T0, T0)
+
+    state = health.fleet([dev, str(uuid.uuid4())])
+    assert list(state) == [dev]
+    s = state[dev]
+    assert s["msgs"] == 62 and s["dups"] == 15 and s["gaps"] == 1
+    assert s["last_seen"] == T0 + 600 + settings.HEALTH_GAP_S + 1
+    assert s["skew"] < 0 and s["batt"] == pytest.approx(3.9)
+
+
+@needs_redis
+def test_latest_reading_follows_newest_timestamp(health):
+    dev = str(uuid.uuid4())
+    health.record(dev, T0, T0, values={"temperature_c": 20.5})
+    health.record(dev, T0 + 1, T0 - 60, values={"temperature_c": 5.0})      # late reading
+    assert health.fleet([dev])[dev].get("latest") is None
+    assert health.fleet([dev], latest=True)[dev]["latest"] == {"temperature_c": 20.5}
+
+
+@needs_redis
+def test_sweep_alerts_once_and_clears_on_return(health):
+    quiet, chatty = str(uuid.uuid4()), str(uuid.uuid4())
+    health.record(quiet, T0, T0)
+    health.record(chatty, T0, T0)
+    health.record(chatty, T0 + 2000, T0 + 2000)
+
+    now = T0 + settings.HEALTH_OFFLINE_S + 100
+    assert [d for d, _ in health.sweep(now)] == [quiet]
+    assert health.sweep(now + 60) == []                  # already known offline
+
+    assert health.record(quiet, now + 120, now + 120) is True
+    late = T0 + 2000 + settings.HEALTH_OFFLINE_S + 100
+    assert sorted(d for d, _ in health.sweep(late)) == sorted([quiet, chatty])
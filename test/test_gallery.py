@@ -0,0 +1,135 @@
+# tests/test_gallery.py
+"""
+Gallery reads: keyset pages of GET /api/v1/images (api/images.py) on SQLite,
+and the presigned GET URL cache (utils/s3.py) on a fake clock.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.api import images as images_api
+from app.core import access
+from app.core.principals import Principal
+from app.db import models
+from app.utils import s3
+
+T0 = datetime(2024, 5, 1, 8, tzinfo=timezone.utc)
+ADMIN = Principal(id=uuid.uuid4(), role=access.ADMIN_ROLE, status="activo")
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(UUID, "sqlite")
+def _sqlite_uuid(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(images_api, "presigned_get_cached", lambda key: f"https://s3/{key}")
+    engine = create_engine(f"sqlite:///{tmp_path / 'gallery.db'}")
+    tables = [models.User.__table__, models.Field.__table__, models.Device.__table__,
+              models.CameraSession.__table__, models.Image.__table__]
+    models.Base.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def frames(db):
+    """Seven frames of one session; pairs share a capture time, so ids break ties."""
+    session = models.CameraSession(started_at=T0, frames_count=7, meta={})
+    db.add(session)
+    db.flush()
+    rows = [
+        models.Image(session_id=session.id, capture_time=T0 + timedelta(seconds=i // 2),
+                     s3_key=f"camera/x/{i}.jpg", status="pending")
+        for i in range(7)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return session, sorted(rows, key=lambda r: (r.capture_time, r.id))
+
+
+def _pages(db, session, order, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = images_api.list_images(session_id=session.id, order=order, limit=limit, cursor=cursor,
+                                      db=db, user=ADMIN)
+        ids += [item["id"] for item in page["items"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_keyset_pages_cover_every_frame_once(db, frames, order):
+    session, rows = frames
+    expected = [str(r.id) for r in rows]
+    ids, pages = _pages(db, session, order, limit=3)
+    assert ids == (expected if order == "asc" else expected[::-1]) and pages == 3
+    # a page that ends exactly on the last row has no next cursor
+    assert _pages(db, session, order, limit=7) == (ids, 1)
+
+
+def test_cursor_round_trip_and_bad_cursor():
+    image_id = uuid.uuid4()
+    cursor = images_api._encode_cursor(T0, image_id)
+    assert "=" not in cursor and images_api._decode_cursor(cursor) == (T0, image_id)
+    with pytest.raises(HTTPException) as exc:
+        images_api._decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+class Clock:
+    now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Signer:
+    def __init__(self):
+        self.signed = 0
+
+    def generate_presigned_url(self, op, Params, ExpiresIn):
+        self.signed += 1
+        return f"https://s3/{Params['Key']}?sig={self.signed}&exp={ExpiresIn}"
+
+
+def test_presigned_get_is_reused_until_near_expiry(monkeypatch):
+    clock, signer = Clock(), Signer()
+    monkeypatch.setattr(s3, "time", clock)
+    monkeypatch.setattr(s3, "get_s3_client", lambda: signer)
+    monkeypatch.setattr(s3, "_get_url_cache", type(s3._get_url_cache)())
+    first = s3.presigned_get_cached("a.jpg", expires_in=600, reuse_margin=100)
+    clock.now += 499
+    assert s3.presigned_get_cached("a.jpg", expires_in=600, reuse_margin=100) == first
+    # inside the margin: signed again, so nobody gets a URL about to expire
+    clock.now += 1
+    second = s3.presigned_get_cached("a.jpg", expires_in=600, reuse_margin=100)
+    assert second != first and signer.signed == 2
+
+
+def test_presigned_get_cache_is_bounded(monkeypatch):
+    signer = Signer()
+    monkeypatch.setattr(s3, "time", Clock())
+    monkeypatch.setattr(s3, "get_s3_client", lambda: signer)
+    monkeypatch.setattr(s3, "_get_url_cache", type(s3._get_url_cache)())
+    monkeypatch.setattr(s3.settings, "DOWNLOAD_URL_CACHE_SIZE", 2)
+    for key in ("a", "b", "a", "c"):
+        s3.presigned_get_cached(key, expires_in=600, reuse_margin=0)
+    # "a" was used last before "c", so "b" is the one evicted
+    assert list(s3._get_url_cache) == ["a", "c"] and signer.signed == 3
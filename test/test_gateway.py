@@ -0,0 +1,172 @@
+# tests/test_gateway.py
+"""
+Gateway client (tools/gateway) against an in-memory httpx transport, and the
+batch body decoding of POST /api/v1/telemetry/batch.
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from gateway import DiskQueue, GatewayClient, message_id_for  # noqa: E402
+
+from app.api import telemetry  # noqa: E402
+
+DEV = str(uuid.uuid4())
+T0 = datetime(2024, 5, 1, tzinfo=timezone.utc)
+VALUES = {"temperature_c": 20.0, "relative_humidity_pct": 50.0, "solar_radiance_w_m2": 300.0,
+          "wind_speed_m_s": 2.0, "wind_direction_deg": 90.0}
+
+
+class FakeServer:
+    """Accepts batches up to ``burst`` readings while it has tokens; no refill."""
+
+    def __init__(self, burst=10, tokens=25):
+        self.burst, self.tokens = burst, tokens
+        self.received, self.bodies, self.down = [], [], False
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.down:
+            raise httpx.ConnectError("unreachable", request=request)
+        assert request.headers["content-encoding"] == "gzip"
+        body = json.loads(gzip.decompress(request.content))
+        self.bodies.append(body)
+        n = len(body["readings"])
+        headers = {"X-RateLimit-Limit": str(self.burst)}
+        if n > self.burst:
+            return httpx.Response(413, headers=headers)
+        if n > self.tokens:
+            return httpx.Response(429, headers={**headers, "Retry-After": "7"})
+        self.tokens -= n
+        self.received.extend(r["message_id"] for r in body["readings"])
+        return httpx.Response(202, headers={**headers, "X-RateLimit-Remaining": str(self.tokens)},
+                              json={"status": "accepted", "count": n})
+
+
+@pytest.fixture
+def gateway(tmp_path):
+    server = FakeServer()
+    client = GatewayClient("http://api", DiskQueue(str(tmp_path / "outbox.db")), token="t", batch_size=50,
+                           http=httpx.Client(base_url="http://api", transport=httpx.MockTransport(server)))
+    yield client, server
+    client.close()
+
+
+def _submit(client, n, start=0):
+    return [client.submit(DEV, VALUES, T0 + timedelta(seconds=10 * i)) for i in range(start, start + n)]
+
+
+def test_queue_survives_reopen_and_dedupes(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    q = DiskQueue(path)
+    mid = message_id_for(DEV, T0.isoformat())
+    assert q.put(DEV, mid, {"message_id": mid}) and not q.put(DEV, mid, {"message_id": mid})
+    q.close()
+    q = DiskQueue(path, max_items=2)
+    for i in range(3):
+        q.put("other", f"m{i}", {"i": i})
+    # the oldest went to make room
+    assert len(q) == 2 and q.devices() == ["other"]
+    assert [r["i"] for _, r in q.peek("other", 10)] == [1, 2]
+    q.close()
+
+
+def test_catch_up_follows_server_limits(gateway):
+    client, server = gateway
+    ids = _submit(client, 30)
+    # same reading again (e.g. re-read after a restart): queued once
+    assert _submit(client, 1) == ids[:1] and len(client.queue) == 30
+
+    first = client.flush()
+    # 50 asked, 413 teaches the burst
+    assert first.statuses == {413: 1} and first.sent == 0
+    assert client.flush().sent == 10
+    assert client.flush().sent == 10
+    # 5 tokens left: the next batch is sized to fit
+    assert client.flush().sent == 5
+    limited = client.flush()
+    assert limited.limited == 1 and client.next_attempt(DEV) > 0
+    assert client.flush().requests == 0          # parked until Retry-After
+    assert server.received == ids[:25] and len(client.queue) == 5
+
+
+def test_network_errors_back_off_and_keep_readings(gateway):
+    client, server = gateway
+    _submit(client, 3)
+    server.down = True
+    assert client.flush().errors == 1
+    assert client.flush().requests == 0          # paused for everyone
+    client._paused_until = 0.0
+    server.down = False
+    assert client.flush().sent == 3 and len(client.queue) == 0
+
+
+def test_invalid_reading_is_bisected_out(gateway):
+    client, server = gateway
+    server.burst = server.tokens = 1000
+    ids = _submit(client, 10)
+    bad = client.submit(DEV, {"temperature_c": "hot"}, T0 + timedelta(seconds=55))
+    ids += _submit(client, 10, start=10)
+
+    def validating(request):
+        body = json.loads(gzip.decompress(request.content))
+        if any(r["measurements"]["temperature_c"] == "hot" for r in body["readings"]):
+            return httpx.Response(422, json={"detail": "bad"})
+        return server(request)
+
+    client.http = httpx.Client(base_url="http://api", transport=httpx.MockTransport(validating))
+    total = sum(client.flush().rejected for _ in range(12))
+    assert total == 1 and len(client.queue) == 0
+    assert sorted(server.received) == sorted(ids)
+    assert [r["message_id"] for r in client.queue.rejected()] == [bad]
+    assert [json.loads(r["reason"]) for r in client.queue.rejected()] == [{"detail": "bad"}]
+
+
+def test_batch_size_is_clamped_to_server_max(tmp_path):
+    client = GatewayClient("http://api", DiskQueue(str(tmp_path / "q.db")), batch_size=10_000)
+    assert client.batch_size == telemetry.settings.TELEMETRY_BATCH_MAX
+    client.close()
+
+
+def _request(body: bytes, encoding: str | None = None) -> Request:
+    headers = [(b"content-type", b"application/json")]
+    if encoding:
+        headers.append((b"content-encoding", encoding.encode()))
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+def test_read_batch_accepts_gzip_and_caps_size(monkeypatch):
+    payload = {"device_id": DEV, "readings": [
+        {"message_id": "m1", "timestamp": T0.isoformat(), "measurements": VALUES},
+    ]}
+    raw = json.dumps(payload).encode()
+    batch = asyncio.run(telemetry._read_batch(_request(gzip.compress(raw), "gzip")))
+    assert str(batch.device_id) == DEV and batch.readings[0].message_id == "m1"
+    assert asyncio.run(telemetry._read_batch(_request(raw))).readings[0].measurements.battery_v is None
+
+    monkeypatch.setattr(telemetry.settings, "TELEMETRY_BATCH_MAX_BYTES", len(raw) - 1)
+    for req in (_request(raw), _request(gzip.compress(raw), "gzip")):
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(telemetry._read_batch(req))
+        assert exc.value.status_code == 413
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(telemetry._read_batch(_request(b"not gzip", "gzip")))
+    assert exc.value.status_code == 400
+    monkeypatch.setattr(telemetry.settings, "TELEMETRY_BATCH_MAX_BYTES", 10_000)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(telemetry._read_batch(_request(b'{"device_id": "x", "readings": []}')))
+    assert exc.value.status_code == 422
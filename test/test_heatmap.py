@@ -0,0 +1,65 @@
+# tests/test_heatmap.py
+"""
+Field heatmaps: IDW interpolation and encoding (core/heatmap.py) and the
+stamped LRU/TTL tile cache in front of them (api/heatmap.py).
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.api.heatmap import TileCache
+from app.core import heatmap
+
+BBOX = (-79.53, -7.50, -79.52, -7.49)
+FIELD = {"type": "Polygon", "coordinates": [
+    [[-79.53, -7.50], [-79.52, -7.50], [-79.52, -7.49], [-79.53, -7.49], [-79.53, -7.50]],
+    [[-79.527, -7.497], [-79.523, -7.497], [-79.523, -7.493], [-79.527, -7.493], [-79.527, -7.497]],
+]}
+
+
+def test_idw_is_exact_at_samples_and_bounded():
+    rng = np.random.default_rng(3)
+    sx, sy, sv = rng.uniform(0, 100, 6), rng.uniform(0, 100, 6), rng.uniform(10, 30, 6)
+    gx, gy = rng.uniform(0, 100, 5000), rng.uniform(0, 100, 5000)
+    out = heatmap.idw(np.r_[sx], np.r_[sy], sv, np.r_[gx, sx], np.r_[gy, sy])
+    assert np.allclose(out[-6:], sv)
+    assert out.min() >= sv.min() - 1e-9 and out.max() <= sv.max() + 1e-9
+
+    # brute force on a few points
+    for i in range(5):
+        w = 1 / ((gx[i] - sx) ** 2 + (gy[i] - sy) ** 2)
+        assert out[i] == pytest.approx((w * sv).sum() / w.sum())
+
+
+def test_interpolate_masks_outside_and_holes():
+    samples = [(-79.529, -7.499, 10.0), (-79.521, -7.491, 20.0)]
+    r = heatmap.interpolate(FIELD, BBOX, samples, zoom=17, max_px=64)
+    h, w = r.values.shape
+    assert max(h, w) == 64 and r.samples == 2 and (r.vmin, r.vmax) == (10.0, 20.0)
+    assert np.isnan(r.values[h // 2, w // 2])            # the hole
+    inside = r.values[~np.isnan(r.values)]
+    assert inside.size > 0.6 * h * w
+    assert 10.0 <= inside.min() and inside.max() <= 20.0
+
+    png = Image.open(io.BytesIO(heatmap.to_png(r, r.vmin, r.vmax)))
+    assert png.size == (w, h) and png.mode == "RGBA"
+    alpha = np.asarray(png)[..., 3]
+    assert alpha[h // 2, w // 2] == 0 and alpha[1, 1] > 0
+    assert len(heatmap.to_f32(r)) == 4 * h * w
+
+
+def test_tile_cache_lru_ttl_and_stamp(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("app.api.heatmap.time.monotonic", lambda: clock[0])
+    cache = TileCache(maxsize=2, ttl_s=60)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"
+    cache.put("c", 1, "C")                                # evicts b, the least recently used
+    assert cache.get("b", 1) is None and cache.get("c", 1) == "C"
+    assert cache.get("a", 2) is None                       # new reading -> new stamp
+    assert len(cache) == 1
+    clock[0] += 61
+    assert cache.get("c", 1) is None
@@ -0,0 +1,54 @@
+# tests/test_images.py
+"""Renditions of camera frames (workers/images.py) and their S3 keys."""
+import io
+
+import pytest
+from PIL import ExifTags, Image
+
+from app.utils.s3 import derived_key
+from app.workers import images
+
+
+def _jpeg(path, size, orientation=None):
+    exif = Image.Exif()
+    if orientation:
+        exif[ExifTags.Base.Orientation] = orientation
+    Image.new("RGB", size, (40, 160, 40)).save(path, format="JPEG", quality=90, exif=exif)
+    return str(path)
+
+
+def _size(data: bytes) -> tuple[int, int]:
+    with Image.open(io.BytesIO(data)) as im:
+        assert im.format == "JPEG"
+        return im.size
+
+
+@pytest.mark.parametrize("draft", [True, False])
+def test_render_derivatives_sizes(tmp_path, draft):
+    src = _jpeg(tmp_path / "frame.jpg", (2000, 1500))
+    out = images.render_derivatives(src, {"preview": 640, "thumb": 128}, quality=80, draft=draft)
+    assert (out["width"], out["height"]) == (2000, 1500)
+    assert _size(out["derivatives"]["preview"]) == (640, 480)
+    assert _size(out["derivatives"]["thumb"]) == (128, 96)
+
+
+def test_rotated_frame_reports_displayed_dimensions(tmp_path):
+    # stored landscape, EXIF says rotate 90 degrees: displayed portrait
+    src = _jpeg(tmp_path / "rotated.jpg", (800, 600), orientation=6)
+    out = images.render_derivatives(src, {"thumb": 200})
+    assert (out["width"], out["height"]) == (600, 800)
+    assert _size(out["derivatives"]["thumb"]) == (150, 200)
+
+
+def test_render_in_pool(tmp_path):
+    src = _jpeg(tmp_path / "frame.jpg", (400, 300))
+    try:
+        out = images.render_in_pool(src, {"thumb": 100}, max_workers=1, timeout=60)
+    finally:
+        images.shutdown_pool()
+    assert _size(out["derivatives"]["thumb"]) == (100, 75)
+
+
+def test_derived_key():
+    assert derived_key("camera/d/x.jpg", "thumb") == "camera/d/x_thumb.jpg"
+    assert derived_key("camera/d/x.jpeg", "preview") == "camera/d/x_preview.jpg"
@@ -0,0 +1,137 @@
+# tests/test_indicators.py
+import random
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import BigInteger, create_engine, select
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db import models
+from app.workers import indicators
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(UUID, "sqlite")
+def _sqlite_uuid(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INDICATORS_TZ", "America/Lima")
+    monkeypatch.setattr(settings, "INDICATORS_MAX_GAP_S", 900)
+    engine = create_engine(f"sqlite:///{tmp_path / 'ind.db'}")
+    tables = [models.Device.__table__, models.Measurement.__table__, models.DailyIndicators.__table__]
+    models.Base.metadata.create_all(engine, tables=tables)
+    yield sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    engine.dispose()
+
+
+def add(db, device_id, ts, values):
+    db.add(models.Measurement(time=datetime.fromtimestamp(ts, timezone.utc), device_id=device_id, **values))
+    late = indicators.record(db, str(device_id), ts, values)
+    db.commit()
+    return late
+
+
+def row(db, device_id, day):
+    d = models.DailyIndicators
+    r = db.execute(select(d.__table__).where(d.device_id == device_id, d.day == day)).mappings().one()
+    return dict(r)
+
+
+def readings(day_start, n=200, seed=0):
+    rng = random.Random(seed)
+    ts = day_start + 30
+    out = []
+    for _ in range(n):
+        out.append((ts, {
+            "temperature_c": rng.uniform(-3, 30), "relative_humidity_pct": rng.uniform(20, 100),
+            "solar_radiance_w_m2": rng.uniform(0, 1000), "wind_speed_m_s": rng.uniform(0, 6),
+        }))
+        # mostly regular, sometimes a gap longer than INDICATORS_MAX_GAP_S
+        ts += rng.choice([300, 300, 300, 600, 2400])
+    return [r for r in out if r[0] < day_start + 86400]
+
+
+def test_incremental_upserts_match_recompute(Session):
+    device_id = uuid.uuid4()
+    day = date(2025, 3, 10)
+    day_start = indicators.day_bounds(day)[0].timestamp()
+    data = readings(day_start)
+    with Session() as db:
+        db.add(models.Device(id=device_id, name="d", token="t"))
+        db.commit()
+        assert all(add(db, device_id, ts, v) is None for ts, v in data)
+        incremental = row(db, device_id, day)
+        rebuilt = indicators.recompute_day(db, device_id, day)
+
+    assert incremental["samples"] == len(data) and not incremental["needs_recompute"]
+    for key, value in rebuilt.items():
+        if key in ("updated_at", "device_id"):
+            continue
+        assert incremental[key] == pytest.approx(value), key
+
+
+def test_late_reading_flags_only_its_day(Session):
+    device_id = uuid.uuid4()
+    d1, d2 = date(2025, 3, 10), date(2025, 3, 11)
+    s1, s2 = (indicators.day_bounds(d)[0].timestamp() for d in (d1, d2))
+    with Session() as db:
+        db.add(models.Device(id=device_id, name="d", token="t"))
+        db.commit()
+        for ts, v in readings(s1, 50) + readings(s2, 50, seed=1):
+            add(db, device_id, ts, v)
+        before = row(db, device_id, d1)
+
+        # late for day 1: accumulators untouched until the rebuild
+        assert add(db, device_id, s1 + 45, {"temperature_c": -9.0}) == d1
+        flagged = row(db, device_id, d1)
+        assert flagged["needs_recompute"] and flagged["samples"] == before["samples"]
+        assert not row(db, device_id, d2)["needs_recompute"]
+
+        rebuilt = indicators.recompute_day(db, device_id, d1)
+        assert rebuilt["samples"] == before["samples"] + 1 and rebuilt["t_min"] == -9.0
+        assert not row(db, device_id, d1)["needs_recompute"]
+
+
+def test_local_day_boundaries(monkeypatch):
+    monkeypatch.setattr(settings, "INDICATORS_TZ", "America/Lima")   # UTC-5
+    ts = datetime(2025, 3, 11, 3, 0, tzinfo=timezone.utc).timestamp()
+    day, start = indicators.local_day(ts)
+    assert day == date(2025, 3, 10)
+    assert start == datetime(2025, 3, 10, 5, 0, tzinfo=timezone.utc).timestamp()
+
+
+def test_fao56_example_18():
+    # Brussels, 6 July: FAO-56 gives ET0 = 3.9 mm/day
+    et0 = indicators.et0_penman_monteith(
+        t_min=12.3, t_max=21.5, rh_min=63, rh_max=84, rs_mj=22.07, u2=2.078,
+        lat_deg=50.8, elevation_m=100, day_of_year=187,
+    )
+    assert et0 == pytest.approx(3.9, abs=0.05)
+    assert indicators.wind_at_2m(3.2, 10) == pytest.approx(2.4, abs=0.01)   # example 14
+
+
+def test_derived_series():
+    base = {
+        "samples": 96, "covered_s": 86400.0, "t_min": 8.0, "t_max": 24.0, "t_sum": 96 * 16.0, "t_n": 96,
+        "rh_min": 40.0, "rh_max": 90.0, "rh_sum": 96 * 65.0, "rh_n": 96, "vpd_sum": 96 * 0.6, "vpd_max": 1.8,
+        "dew_sum": 96 * 9.0, "hum_n": 96, "wind_sum": 96 * 2.0, "wind_n": 96, "solar_j_m2": 18e6,
+        "frost_s": 0.0, "needs_recompute": False,
+    }
+    rows = [dict(base, day=date(2025, 1, 1)), dict(base, day=date(2025, 1, 2), t_max=40.0, covered_s=3600.0)]
+    first, second = indicators.daily_series(rows, base_c=10.0, cap_c=30.0)
+    assert first["gdd"] == pytest.approx(7.0)            # (24 + 10) / 2 - 10
+    assert second["gdd"] == pytest.approx(10.0)          # Tmax capped at 30
+    assert second["gdd_cum"] == pytest.approx(17.0)
+    assert first["et0_mm"] > 0 and second["et0_mm"] is None   # 1 h of data is not a day
+    assert first["solar_mj_m2"] == 18.0 and first["vpd_mean_kpa"] == pytest.approx(0.6)
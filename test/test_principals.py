@@ -0,0 +1,136 @@
+# tests/test_principals.py
+"""
+Principal resolution from token claims (core/principals.py) and the
+write-through of role/status changes in crud.users.update_user, on SQLite
+with an in-memory stand-in for Redis.
+"""
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.api import users as users_api
+from app.core import principals
+from app.crud import users as crud_users
+from app.db import models
+from app.schemas.user import UserUpdate
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(UUID, "sqlite")
+def _sqlite_uuid(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data, self.down = {}, False
+
+    def get(self, key):
+        if self.down:
+            raise ConnectionError("down")
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if self.down:
+            raise ConnectionError("down")
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+
+class AsyncView:
+    def __init__(self, sync):
+        self.sync = sync
+
+    async def get(self, key):
+        return self.sync.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        return self.sync.set(key, value, ex=ex, nx=nx)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(principals, "get_sync_redis", lambda: client)
+    monkeypatch.setattr(crud_users, "revoke_user_access", lambda user_id: None)
+    principals._local.clear()
+    yield client
+    principals._local.clear()
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    models.Base.metadata.create_all(engine, tables=[models.User.__table__])
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def ana(db):
+    user = models.User(name="Ana", email="ana@x", role="Operador", status="activo", password_hash="-")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _resolve(claims, client):
+    loads = []
+
+    async def load_from_db():
+        loads.append(claims["sub"])
+        return None
+
+    principal = asyncio.run(principals.resolve_principal(claims, AsyncView(client), load_from_db))
+    return principal, loads
+
+
+def _claims(user):
+    return {"sub": str(user.id), "role": user.role, "st": user.status}
+
+
+def test_claims_alone_resolve_without_db(fake_redis):
+    sub = uuid.uuid4()
+    principal, loads = _resolve({"sub": str(sub), "role": "Operador", "st": "activo"}, fake_redis)
+    assert principal == principals.Principal(id=sub, role="Operador", status="activo") and loads == []
+    # tokens without the claims (issued before them) go to the DB
+    _, loads = _resolve({"sub": str(uuid.uuid4())}, fake_redis)
+    assert len(loads) == 1
+
+
+def test_update_user_overrides_stale_claims(db, ana, fake_redis):
+    stale = _claims(ana)
+    assert _resolve(stale, fake_redis)[0].role == "Operador"      # now in the local cache
+    crud_users.update_user(db, ana, role="Visualizador", status="inactivo")
+    # this process dropped its cached copy; every process sees the Redis record
+    principal, loads = _resolve(stale, fake_redis)
+    assert (principal.role, principal.status) == ("Visualizador", "inactivo") and loads == []
+    principals._local.clear()
+    assert _resolve(stale, fake_redis)[0].status == "inactivo"
+
+
+def test_unpublished_change_is_not_committed(db, ana, fake_redis, monkeypatch):
+    monkeypatch.setattr(crud_users, "get_user", lambda session, user_id: session.get(models.User, ana.id))
+    fake_redis.down = True
+    with pytest.raises(HTTPException) as exc:
+        users_api.patch_user(str(ana.id), UserUpdate(status="inactivo"), db=db,
+                             current=principals.Principal(id=uuid.uuid4(), role="Administrador", status="activo"))
+    assert exc.value.status_code == 503
+    db.expire_all()
+    assert db.get(models.User, ana.id).status == "activo"
+    # changes that leave role and status alone do not need Redis
+    assert crud_users.update_user(db, ana, department="Riego").department == "Riego"
@@ -0,0 +1,74 @@
+# tests/test_profiling.py
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core import profiling
+from app.core.config import settings
+from app.db.session import _install_profiling_hooks
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "let-me-see")
+    monkeypatch.setattr(settings, "PROFILING_N_PLUS_ONE", 5)
+    monkeypatch.setattr(settings, "PROFILING_SLOW_SQL_MS", 10_000.0)
+    profiling.reset_stats()
+
+    engine = create_engine("sqlite://")
+    _install_profiling_hooks(engine)
+
+    app = FastAPI()
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        # one query per "row": the pattern the N+1 check is for
+        with engine.connect() as conn:
+            for i in range(8):
+                conn.execute(text("SELECT :i"), {"i": i}).scalar()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {"id": item_id}
+
+    yield app
+    profiling.reset_stats()
+
+
+def test_sql_aggregates_per_route(app):
+    with TestClient(app) as client:
+        assert client.get("/items/1").status_code == 200
+        assert client.get("/items/2").status_code == 200
+
+    stats = profiling.endpoint_stats()
+    assert list(stats) == ["GET /items/{item_id}"]
+    s = stats["GET /items/{item_id}"]
+    assert s["requests"] == 2
+    assert s["max_queries"] == 8 and s["avg_queries"] == 8
+    assert s["n_plus_one"][0] == {"statement": "SELECT ?", "count": 8}
+    assert s["profiles"] == []
+
+
+def test_header_triggers_folded_profile(app, tmp_path):
+    with TestClient(app) as client:
+        client.get("/items/1", headers={"X-Profile": "wrong"})
+        client.get("/items/1", headers={"X-Profile": "let-me-see"})
+
+    (path,) = profiling.endpoint_stats()["GET /items/{item_id}"]["profiles"]
+    lines = open(path).read().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("item (test_profiling.py" in line for line in lines)
+    assert list(tmp_path.glob("*.folded")) == [tmp_path / path.split("/")[-1]]
+
+
+def test_hooks_ignore_queries_outside_requests():
+    engine = create_engine("sqlite://")
+    _install_profiling_hooks(engine)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert profiling.current_profile() is None
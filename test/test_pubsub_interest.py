@@ -0,0 +1,117 @@
+# tests/test_pubsub_interest.py
+"""
+Multi-process check of the interest-based pubsub hub against a local Redis.
+
+Each child process plays one uvicorn worker: it runs a TelemetryPubSubHub with
+a single fake viewer and reports how many Redis messages reached it.  Run with
+a Redis on TEST_REDIS_URL (default redis://localhost:6379/15); skipped otherwise.
+"""
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import time
+import uuid
+
+import pytest
+import redis
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379/15")
+N_DEVICES = 8
+N_MESSAGES = 25
+
+
+def _redis_available() -> bool:
+    try:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _redis_available(), reason="local Redis not reachable")
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, msg):
+        self.sent += 1
+
+    async def close(self):
+        pass
+
+
+def _viewer_process(device_id, ready, results, run_for):
+    import redis.asyncio as aioredis
+    from app.api.telemetry import ConnectionManager, TelemetryPubSubHub
+
+    async def main():
+        manager = ConnectionManager()
+        hub = TelemetryPubSubHub(manager, aioredis.from_url(REDIS_URL, decode_responses=True))
+        ws = FakeWebSocket()
+        await manager.connect(ws, device_id)
+        task = asyncio.create_task(hub.run())
+        # wait until the hub has applied the subscription before signalling
+        while not (hub._channels or hub._patterns):
+            await asyncio.sleep(0.01)
+        ready.release()
+        await asyncio.sleep(run_for)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        results.put((device_id, hub.messages_received, ws.sent))
+
+    asyncio.run(main())
+
+
+def _run_viewers(viewer_device_ids):
+    ctx = mp.get_context("spawn")
+    ready = ctx.Semaphore(0)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_viewer_process, args=(did, ready, results, 3.0))
+        for did in viewer_device_ids
+    ]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        assert ready.acquire(timeout=20)
+
+    devices = [str(uuid.uuid4()) for _ in range(N_DEVICES)]
+    watched = [d for d in viewer_device_ids if d]
+    devices[: len(watched)] = watched
+    r = redis.Redis.from_url(REDIS_URL)
+    for i in range(N_MESSAGES):
+        for did in devices:
+            r.publish(f"telemetry:{did}", json.dumps({"type": "measurement", "device_id": did, "i": i}))
+
+    out = [results.get(timeout=20) for _ in procs]
+    for p in procs:
+        p.join(timeout=10)
+    return out
+
+
+def test_each_process_only_receives_its_devices():
+    viewer_devices = [str(uuid.uuid4()) for _ in range(3)]
+    out = _run_viewers(viewer_devices)
+    total_published = N_DEVICES * N_MESSAGES
+    received = sum(n for _, n, _ in out)
+    for _, n, sent in out:
+        assert n == N_MESSAGES
+        assert sent == N_MESSAGES
+    # psubscribe telemetry:* in every process would have cost 3 * total_published
+    assert received == len(viewer_devices) * N_MESSAGES
+    assert received < len(viewer_devices) * total_published
+
+
+def test_all_viewer_falls_back_to_wildcard():
+    out = _run_viewers([None])
+    (_, n, sent), = out
+    assert n == N_DEVICES * N_MESSAGES
+    assert sent == n
@@ -0,0 +1,114 @@
+# tests/test_ratelimit.py
+"""
+Ingest token buckets (core/ratelimit.py).  The Lua script runs against a
+Redis on TEST_REDIS_URL (default redis://localhost:6379/15) and is skipped
+without one; per-type limits and the fail-open path are checked on their own.
+"""
+import os
+import uuid
+
+import pytest
+import redis
+
+from app.core import ratelimit
+from app.core.config import settings
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+def _redis_available() -> bool:
+    try:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+    except Exception:
+        return False
+
+
+needs_redis = pytest.mark.skipif(not _redis_available(), reason="local Redis not reachable")
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_DEVICE_RATE", 0.5)
+    monkeypatch.setattr(settings, "RATE_LIMIT_DEVICE_BURST", 5)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BY_TYPE", {"weather": (2.0, 20)})
+    monkeypatch.setattr(settings, "RATE_LIMIT_GLOBAL_RATE", 1000)
+    monkeypatch.setattr(settings, "RATE_LIMIT_GLOBAL_BURST", 5000)
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_MAX", 0)
+    return settings
+
+
+@pytest.fixture
+def limiter(limits):
+    client = redis.Redis.from_url(REDIS_URL)
+    client.delete(ratelimit.GLOBAL_KEY)
+    yield ratelimit.RateLimiter(client)
+    client.delete(ratelimit.GLOBAL_KEY)
+    for key in client.scan_iter("rl:dev:*"):
+        client.delete(key)
+
+
+def test_limits_for_uses_type_override(limits):
+    assert ratelimit.limits_for("weather") == (2.0, 20.0)
+    assert ratelimit.limits_for("soil") == (0.5, 5.0)
+    assert ratelimit.limits_for(None) == (0.5, 5.0)
+    assert ratelimit.Decision(admitted=False, retry_after_s=0.2).retry_after_header == "1"
+    assert ratelimit.Decision(admitted=False, retry_after_s=2.1).retry_after_header == "3"
+
+
+def test_redis_error_admits(limits):
+    class Down:
+        def register_script(self, _):
+            raise redis.ConnectionError("down")
+
+    assert ratelimit.RateLimiter(Down()).check("d1", None).admitted
+
+
+@needs_redis
+def test_burst_then_limited_with_retry_after(limiter):
+    dev = str(uuid.uuid4())
+    decisions = [limiter.check(dev, "soil") for _ in range(6)]
+    assert all(d.admitted for d in decisions[:5])
+    assert decisions[4].remaining == pytest.approx(0, abs=0.01)
+    refused = decisions[5]
+    assert not refused.admitted and refused.scope == "device"
+    # one token at 0.5/s
+    assert 1.9 < refused.retry_after_s <= 2.0
+    # refusals do not charge, and other devices are unaffected
+    assert not limiter.check(dev, "soil").admitted
+    assert limiter.check(str(uuid.uuid4()), "soil").admitted
+
+
+@needs_redis
+def test_cost_larger_than_tokens_is_refused_whole(limiter):
+    dev = str(uuid.uuid4())
+    assert limiter.check(dev, "weather", cost=15).admitted
+    refused = limiter.check(dev, "weather", cost=10)
+    assert not refused.admitted and refused.retry_after_s == pytest.approx(2.5, abs=0.05)
+    assert limiter.check(dev, "weather", cost=5).admitted
+
+
+@needs_redis
+def test_global_bucket_limits_the_fleet(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_GLOBAL_RATE", 1)
+    monkeypatch.setattr(settings, "RATE_LIMIT_GLOBAL_BURST", 3)
+    results = [limiter.check(str(uuid.uuid4()), "soil") for _ in range(4)]
+    assert [d.admitted for d in results] == [True, True, True, False]
+    assert results[-1].scope == "global"
+
+
+@needs_redis
+def test_lease_is_spent_locally(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_MAX", 4)
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_HEADROOM", 0.25)
+    dev = str(uuid.uuid4())
+    first = limiter.check(dev, "weather")
+    # 20 - 1 charged, then 4 leased (well above 25% of the burst)
+    assert first.admitted and first.remaining == pytest.approx(19, abs=0.1)
+    tokens = float(limiter.redis.hget(f"rl:dev:{dev}", "tokens"))
+    assert tokens == pytest.approx(15, abs=0.1)
+    for _ in range(4):
+        assert limiter.check(dev, "weather").admitted
+    # the lease is used up without touching Redis
+    assert float(limiter.redis.hget(f"rl:dev:{dev}", "tokens")) == pytest.approx(tokens, abs=0.1)
+    limiter.check(dev, "weather")
+    assert float(limiter.redis.hget(f"rl:dev:{dev}", "tokens")) < tokens - 1
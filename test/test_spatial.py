@@ -0,0 +1,81 @@
+# tests/test_spatial.py
+"""
+Grid index and geometry helpers behind the map endpoints (core/spatial.py),
+plus the GeoJSON built from an index snapshot.
+"""
+import random
+
+import pytest
+
+from app.api.geo import build_snapshot, feature_collection, geo_changed
+from app.core import spatial
+
+SQUARE = {"type": "Polygon", "coordinates": [
+    [[-79.53, -7.50], [-79.52, -7.50], [-79.52, -7.49], [-79.53, -7.49], [-79.53, -7.50]],
+    [[-79.527, -7.497], [-79.523, -7.497], [-79.523, -7.493], [-79.527, -7.493], [-79.527, -7.497]],
+]}
+
+
+def test_grid_query_matches_brute_force():
+    rng = random.Random(7)
+    index = spatial.GridIndex(0.01)
+    boxes = {}
+    for i in range(500):
+        lon, lat = rng.uniform(-79.6, -79.4), rng.uniform(-7.6, -7.4)
+        if i % 5:
+            boxes[i] = (lon, lat, lon, lat)
+            index.insert_point(i, lon, lat)
+        else:
+            boxes[i] = (lon, lat, lon + rng.uniform(0, 0.05), lat + rng.uniform(0, 0.05))
+            index.insert(i, boxes[i])
+    views = [(-79.55, -7.55, -79.50, -7.50), (-79.45, -7.45, -79.44, -7.44), (-180, -90, 180, 90)]
+    for view in views:
+        expected = {k for k, b in boxes.items() if spatial.intersects(b, view)}
+        assert index.query(view) == expected
+
+
+def test_tile_bbox_and_point_in_polygon():
+    assert spatial.tile_bbox(0, 0, 0) == pytest.approx((-180, -85.0511, 180, 85.0511), abs=1e-4)
+    west, south, east, north = spatial.tile_bbox(1, 0, 1)
+    assert (west, east, north) == (-180, 0, 0) and south < -85
+
+    assert spatial.point_in_geometry(-79.529, -7.499, SQUARE)
+    assert not spatial.point_in_geometry(-79.525, -7.495, SQUARE)        # in the hole
+    assert not spatial.point_in_geometry(-79.51, -7.495, SQUARE)
+    area = spatial.ring_area_m2(SQUARE["coordinates"][0])
+    assert area == pytest.approx(1113 * 1105, rel=0.01)
+
+
+def test_parse_bbox_rejects_bad_input():
+    assert spatial.parse_bbox("-79.6,-7.6,-79.4,-7.4") == (-79.6, -7.6, -79.4, -7.4)
+    for bad in ("1,2,3", "a,b,c,d", "10,0,0,10", "0,-95,1,1"):
+        with pytest.raises(ValueError):
+            spatial.parse_bbox(bad)
+
+
+def test_feature_collection_joins_fleet_state():
+    field = {"id": "f1", "name": "Parcela 1", "crop": "quinua", "boundary": SQUARE, "area_ha": 12.3,
+             "min_lon": -79.53, "min_lat": -7.50, "max_lon": -79.52, "max_lat": -7.49}
+    devices = [
+        {"id": "d1", "name": "Norte", "device_type": "station", "lat": -7.499, "lon": -79.529, "field_id": "f1"},
+        {"id": "d2", "name": "Lejos", "device_type": "station", "lat": -7.0, "lon": -79.0, "field_id": None},
+    ]
+    snap = build_snapshot(devices, [field], 0.01)
+    view = (-79.54, -7.51, -79.51, -7.48)
+    ids = sorted(snap.points.query(view))
+    assert ids == ["d1"]
+
+    states = {"d1": {"last_seen": 1000.0, "last_ts": 990.0, "latest": {"temperature_c": 18.2}}}
+    fc = feature_collection(snap, view, states, ids, now=1010.0)
+    kinds = [f["properties"]["kind"] for f in fc["features"]]
+    assert kinds == ["field", "device"]
+    device = fc["features"][1]["properties"]
+    assert device["map_status"] == "online" and device["latest"] == {"temperature_c": 18.2}
+
+
+def test_geo_changed_logs_redis_errors():
+    class Down:
+        def incr(self, key):
+            raise ConnectionError("down")
+
+    geo_changed(Down())      # the field / location write is committed already
@@ -0,0 +1,80 @@
+# tests/test_tracing.py
+import asyncio
+import json
+import time
+
+from app.core import tracing
+from app.api.telemetry import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, msg):
+        self.messages.append(json.loads(msg))
+
+    async def close(self):
+        pass
+
+
+def test_sampling_bounds():
+    assert tracing.start_trace(sample_rate=0.0) is None
+    ctx = tracing.start_trace(sample_rate=1.0)
+    assert len(ctx["trace_id"]) == 32 and ctx["span_id"] is None
+    hits = sum(tracing.start_trace(sample_rate=0.1) is not None for _ in range(5000))
+    assert 300 < hits < 700
+
+
+def test_spans_chain_through_broadcast(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracing.set_exporter(tracing.FileExporter(str(path)))
+    try:
+        ctx = tracing.start_trace(sample_rate=1.0)
+        t0 = time.time()
+        tracing.record_span(ctx, "ingest.http", t0)
+        job = tracing.carry(ctx, enqueued_at=time.time())
+        tracing.record_span(job, "queue.wait", job["enqueued_at"])
+
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        payload = {"type": "measurement", "device_id": "d1", "message_id": "m1",
+                   "trace": tracing.carry(job, published_at=time.time())}
+
+        async def run():
+            await manager.connect(ws, "d1")
+            await manager.broadcast("d1", payload)
+
+        asyncio.run(run())
+    finally:
+        tracing.set_exporter(None)
+
+    # viewers never see the trace context
+    assert ws.messages == [{"type": "measurement", "device_id": "d1", "message_id": "m1"}]
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [s["name"] for s in spans] == ["ingest.http", "queue.wait", "pubsub.deliver", "ws.fanout"]
+    assert len({s["trace_id"] for s in spans}) == 1
+    assert spans[0]["parent_id"] is None
+    for parent, child in zip(spans, spans[1:]):
+        assert child["parent_id"] == parent["span_id"]
+    assert spans[-1]["attrs"] == {"recipients": 1}
+
+
+def test_unsampled_reading_is_untouched():
+    calls = []
+
+    class Recorder(tracing.SpanExporter):
+        def export(self, span):
+            calls.append(span)
+
+    tracing.set_exporter(Recorder())
+    try:
+        tracing.record_span(None, "ingest.http", time.time())
+        assert tracing.carry(None, enqueued_at=1.0) is None
+    finally:
+        tracing.set_exporter(None)
+    assert calls == []
@@ -0,0 +1,109 @@
+# tests/test_users.py
+"""
+User directory queries (crud/users.py) on SQLite: keyset pages, escaped
+search terms, the capped total and the one-query dashboard counters.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import users as crud_users
+from app.db import models
+
+T0 = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(UUID, "sqlite")
+def _sqlite_uuid(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    models.Base.metadata.create_all(engine, tables=[models.User.__table__])
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cur, sql, *a: statements.append(sql))
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.statements = statements
+    crud_users.invalidate_counts()
+    yield session
+    crud_users.invalidate_counts()
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def people(db):
+    """Nine users, newest first by index; every third is inactive, two share a timestamp."""
+    roles = ["Administrador", "Operador", "Visualizador"]
+    rows = [
+        models.User(id=uuid.uuid4(), name=f"User {i}", email=f"u{i}@x", role=roles[i % 3],
+                    status="inactivo" if i % 3 == 2 else "activo", password_hash="-",
+                    department="Riego", created_at=T0 - timedelta(minutes=min(i, 7)))
+        for i in range(9)
+    ]
+    rows += [
+        models.User(name="Ana 100%", email="ana@x", role="Operador", password_hash="-", department="R_D",
+                    created_at=T0 - timedelta(days=1)),
+        models.User(name="Ana 1000", email="ana2@x", role="Operador", password_hash="-", department="RxD",
+                    created_at=T0 - timedelta(days=2)),
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+def test_keyset_pages_match_offset_pages(db, people):
+    by_offset = [u.id for u in crud_users.list_users(db, limit=100)[0]]
+    assert len(by_offset) == 11
+    seen, after = [], None
+    while True:
+        rows, total, capped = crud_users.list_users(db, limit=4, after=after)
+        assert (total, capped) == (11, False)
+        seen += [u.id for u in rows]
+        if len(rows) < 4:
+            break
+        after = (rows[-1].created_at, rows[-1].id)
+    assert seen == by_offset
+    # the old offset path still works
+    assert [u.id for u in crud_users.list_users(db, offset=4, limit=4)[0]] == by_offset[4:8]
+
+
+def test_search_terms_are_literal():
+    assert crud_users._escape_like(r"100%_a\b") == r"100\%\_a\\b"
+
+
+def test_search_escapes_wildcards(db, people):
+    assert [u.name for u in crud_users.list_users(db, query="100%")[0]] == ["Ana 100%"]
+    assert [u.name for u in crud_users.list_users(db, query="r_d")[0]] == ["Ana 100%"]
+    rows, total, _ = crud_users.list_users(db, query="user", role="Operador", status="activo")
+    assert total == len(rows) == 3
+
+
+def test_total_is_capped(db, people, monkeypatch):
+    monkeypatch.setattr(crud_users, "COUNT_CAP", 5)
+    rows, total, capped = crud_users.list_users(db, limit=2)
+    assert len(rows) == 2 and (total, capped) == (5, True)
+    # an empty page still reports the count
+    assert crud_users.list_users(db, query="nobody") == ([], 0, False)
+
+
+def test_counts_are_one_cached_query(db, people):
+    db.statements.clear()
+    counts = crud_users.counts(db)
+    assert counts == {"total": 11, "active": 8, "admins": 3, "operators": 5, "viewers": 3}
+    assert len(db.statements) == 1 and "FILTER (WHERE" in db.statements[0]
+    assert crud_users.counts(db) is counts and len(db.statements) == 1
+    crud_users.create_user(db, "Nuevo", "n@x", "Visualizador", None, "-")
+    assert crud_users.counts(db)["viewers"] == 4
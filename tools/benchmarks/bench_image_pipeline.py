@@ -0,0 +1,86 @@
+"""
+Throughput of the image rendering step (images per second per core).
+
+Generates synthetic camera frames and times ``render_derivatives`` with and
+without JPEG draft decoding, then pushes the same frames through the process
+pool to show how it scales with workers.
+
+    python tools/benchmarks/bench_image_pipeline.py --frames 24 --size 5472x3648
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+from app.workers import images  # noqa: E402
+
+
+def make_frames(n, width, height, directory):
+    rng = np.random.default_rng(0)
+    paths = []
+    # smooth gradient + noise compresses like a real field photo, not like white noise
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = np.stack([(xx * 255 // width), (yy * 255 // height), ((xx + yy) * 127 // (width + height))], axis=-1)
+    for i in range(n):
+        noise = rng.integers(0, 24, size=(height, width, 3))
+        arr = np.clip(base + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"frame_{i}.jpg")
+        Image.fromarray(arr).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def bench_serial(paths, draft):
+    t0 = time.perf_counter()
+    for p in paths:
+        images.render_derivatives(p, draft=draft)
+    return len(paths) / (time.perf_counter() - t0)
+
+
+def bench_pool(paths, workers):
+    images.shutdown_pool()
+    pool = images.get_pool(workers)
+    # warm the workers so process start-up is not measured
+    list(pool.map(images.render_derivatives, paths[:workers]))
+    t0 = time.perf_counter()
+    list(pool.map(images.render_derivatives, paths))
+    rate = len(paths) / (time.perf_counter() - t0)
+    images.shutdown_pool()
+    return rate
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=12)
+    ap.add_argument("--size", default="4000x3000", help="WIDTHxHEIGHT of generated frames")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args(argv)
+    width, height = (int(v) for v in args.size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as d:
+        paths = make_frames(args.frames, width, height, d)
+        full = bench_serial(paths, draft=False)
+        drafted = bench_serial(paths, draft=True)
+        pooled = bench_pool(paths, args.workers)
+
+    results = {
+        "frame": f"{width}x{height}",
+        "full_decode_img_per_s_per_core": round(full, 2),
+        "draft_decode_img_per_s_per_core": round(drafted, 2),
+        "draft_speedup": round(drafted / full, 2),
+        "pool_workers": args.workers,
+        "pool_img_per_s": round(pooled, 2),
+        "pool_img_per_s_per_core": round(pooled / args.workers, 2),
+    }
+    for k, v in results.items():
+        print(f"{k:34s} {v}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
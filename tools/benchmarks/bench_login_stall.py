@@ -0,0 +1,79 @@
+"""
+Event-loop stall during a burst of password verifications.
+
+A ticker coroutine measures how late it wakes up while N logins verify a
+bcrypt hash, first inline on the loop (the old ``login`` behaviour) and then
+through ``security.verify_and_update_password`` (hash pool).
+
+    python tools/benchmarks/bench_login_stall.py --logins 32 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from harness import use_backend  # noqa: E402
+
+use_backend()
+
+
+async def ticker(stop: asyncio.Event, interval: float, lags: list):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t0 - interval)
+
+
+async def burst(verify, n, interval=0.005):
+    stop = asyncio.Event()
+    lags = []
+    tick = asyncio.create_task(ticker(stop, interval, lags))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await tick
+    lags.sort()
+    return {
+        "wall_s": round(elapsed, 3),
+        "logins_per_s": round(n / elapsed, 1),
+        "loop_lag_max_ms": round(lags[-1] * 1000, 1) if lags else None,
+        "loop_lag_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 1) if lags else None,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--logins", type=int, default=16)
+    ap.add_argument("--rounds", type=int, default=12)
+    args = ap.parse_args(argv)
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    from app.core import security
+
+    hashed = security.hash_password("secret")
+
+    async def inline():
+        security.verify_password("secret", hashed)
+
+    async def offloaded():
+        ok, _ = await security.verify_and_update_password("secret", hashed)
+        assert ok
+
+    async def run():
+        return {
+            "inline": await burst(inline, args.logins),
+            "offloaded": await burst(offloaded, args.logins),
+            "pool": security.hash_pool_stats.snapshot(),
+        }
+
+    results = asyncio.run(run())
+    for name, res in results.items():
+        print(name, res)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+CPU cost of the in-process telemetry paths (no database, Redis or broker).
+
+  * ``TelemetryIn`` parsing + the job payload ``ingest_telemetry`` enqueues
+  * ``serialize_measurement`` over a list of ORM rows
+  * ``ConnectionManager.broadcast`` to many (fake) sockets
+  * anomaly ``detect`` per reading (single-row writer) and over one batch
+
+    python tools/benchmarks/bench_telemetry_paths.py --rows 100000 --sockets 1000 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(__file__))
+from harness import measure, print_results, use_backend  # noqa: E402
+
+use_backend()
+from app.api.telemetry import ConnectionManager, TelemetryIn, serialize_measurement  # noqa: E402
+from app.db import models  # noqa: E402
+from app.workers import anomaly  # noqa: E402
+from app.workers.alerts import Reading  # noqa: E402
+
+SUITE = "telemetry"
+
+
+def sample_body(rng: random.Random, i: int) -> dict:
+    return {
+        "device_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "message_id": f"bench-{i}",
+        "timestamp": (datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=i)).isoformat(),
+        "measurements": {
+            "temperature_c": rng.uniform(-5, 40),
+            "relative_humidity_pct": rng.uniform(0, 100),
+            "solar_radiance_w_m2": rng.uniform(0, 1200),
+            "wind_speed_m_s": rng.uniform(0, 20),
+            "wind_direction_deg": rng.uniform(0, 360),
+            "battery_v": rng.uniform(3.3, 4.2),
+        },
+        "meta": {"fw": "1.4.2"},
+    }
+
+
+def job_payload(payload: TelemetryIn) -> dict:
+    # same shape as ingest_telemetry builds before process_measurement.delay
+    return {
+        "received_at": time.time(),
+        "device_id": str(payload.device_id),
+        "message_id": payload.message_id,
+        "timestamp": payload.timestamp.isoformat(),
+        "measurements": payload.measurements.model_dump(),
+        "meta": payload.meta,
+    }
+
+
+def sample_rows(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    device_id = uuid.uuid4()
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        models.Measurement(
+            id=i, time=start + timedelta(seconds=10 * i), device_id=device_id, message_id=f"m-{i}",
+            temperature_c=rng.uniform(-5, 40), relative_humidity_pct=rng.uniform(0, 100),
+            solar_radiance_w_m2=rng.uniform(0, 1200), wind_speed_m_s=rng.uniform(0, 20),
+            wind_direction_deg=rng.uniform(0, 360), battery_v=rng.uniform(3.3, 4.2), meta=None,
+        )
+        for i in range(n)
+    ]
+
+
+class FakeSocket:
+    """Accepts everything instantly, so only the fan-out itself is timed."""
+    __slots__ = ("sent",)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent += 1
+
+    async def close(self):
+        pass
+
+
+def bench_parse(n: int) -> dict:
+    rng = random.Random(0)
+    raw = [json.dumps(sample_body(rng, i)) for i in range(n)]
+
+    def parse_and_build():
+        for body in raw:
+            job_payload(TelemetryIn.model_validate_json(body))
+
+    return measure(parse_and_build, items=n)
+
+
+def bench_serialize(n: int) -> dict:
+    rows = sample_rows(n)
+
+    def serialize():
+        return [serialize_measurement(r) for r in rows]
+
+    return measure(serialize, repeat=5, items=n)
+
+
+def bench_broadcast(n_sockets: int, scope: str) -> dict:
+    import asyncio
+
+    manager = ConnectionManager()
+    device_id = str(uuid.uuid4())
+    payload = {
+        "type": "measurement", "device_id": device_id, "time": datetime.now(timezone.utc).isoformat(),
+        "data": sample_body(random.Random(1), 0)["measurements"], "meta": None, "message_id": "m-0",
+    }
+
+    async def setup():
+        for _ in range(n_sockets):
+            await manager.connect(FakeSocket(), device_id if scope == "device" else None)
+
+    asyncio.run(setup())
+
+    async def fan_out():
+        await manager.broadcast(device_id, payload)
+
+    return measure(fan_out, items=n_sockets)
+
+
+def bench_anomaly(n: int, batch: bool, devices: int = 100) -> dict:
+    rng = random.Random(2)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(devices)]
+    readings = [
+        Reading(ids[i % devices], 60.0 * (i // devices), sample_body(rng, i)["measurements"])
+        for i in range(n)
+    ]
+    params = anomaly.Params.from_settings()
+
+    def one_by_one():
+        state = {}
+        for r in readings:
+            state.update(anomaly.detect([r], state, params).state)
+
+    def one_batch():
+        anomaly.detect(readings, {}, params)
+
+    return measure(one_batch if batch else one_by_one, repeat=5, items=n)
+
+
+def cases(rows: int = 100_000, messages: int = 10_000, sockets=(100, 1000, 10_000)) -> dict:
+    results = {
+        f"{SUITE}.parse_and_payload[{messages}]": bench_parse(messages),
+        f"{SUITE}.serialize_measurement[{rows}]": bench_serialize(rows),
+        f"{SUITE}.anomaly_detect[single,{messages}]": bench_anomaly(messages, batch=False),
+        f"{SUITE}.anomaly_detect[batch,{messages}]": bench_anomaly(messages, batch=True),
+    }
+    for n in sockets:
+        for scope in ("device", "all"):
+            results[f"{SUITE}.broadcast[{scope},{n}]"] = bench_broadcast(n, scope)
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--messages", type=int, default=10_000)
+    ap.add_argument("--sockets", type=int, nargs="+", default=[100, 1000, 10_000])
+    args = ap.parse_args(argv)
+    results = cases(args.rows, args.messages, args.sockets)
+    print_results(results)
+    return results
+
+
+if __name__ == "__main__":
+    main()
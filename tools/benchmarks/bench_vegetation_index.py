@@ -0,0 +1,89 @@
+"""
+Vectorized, tiled ExG/VARI analysis vs a naive per-pixel Python loop.
+
+The naive loop is timed on a small crop and reported per megapixel; the tiled
+NumPy version runs on the full synthetic frame and also reports the peak
+traced memory, which should stay at a few tiles regardless of frame size.
+
+    python tools/benchmarks/bench_vegetation_index.py --size 5472x3648
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+from app.workers import analysis  # noqa: E402
+
+
+def naive_stats(im: Image.Image, threshold=analysis.CANOPY_EXG_THRESHOLD):
+    n = exg_sum = vari_sum = 0.0
+    vari_n = canopy = 0
+    for r, g, b in im.getdata():
+        total = r + g + b
+        exg = (2 * g - r - b) / total if total else 0.0
+        exg_sum += exg
+        n += 1
+        if exg > threshold:
+            canopy += 1
+        denom = g + r - b
+        if denom:
+            vari_sum += max(-1.0, min(1.0, (g - r) / denom))
+            vari_n += 1
+    return {"exg_mean": exg_sum / n, "vari_mean": vari_sum / vari_n if vari_n else None, "canopy_cover": canopy / n}
+
+
+def make_frame(path, width, height):
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    arr[..., 1] = np.maximum(arr[..., 1], 96)  # bias towards green
+    Image.fromarray(arr).save(path, quality=90)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size", default="4000x3000", help="WIDTHxHEIGHT of the generated frame")
+    ap.add_argument("--tile", type=int, default=512)
+    ap.add_argument("--naive-crop", type=int, default=300, help="edge of the crop timed with the naive loop")
+    args = ap.parse_args(argv)
+    width, height = (int(v) for v in args.size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "frame.jpg")
+        make_frame(path, width, height)
+
+        with Image.open(path) as im:
+            crop = im.convert("RGB").crop((0, 0, args.naive_crop, args.naive_crop))
+        t0 = time.perf_counter()
+        naive_stats(crop)
+        naive_s_per_mp = (time.perf_counter() - t0) / (args.naive_crop ** 2 / 1e6)
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        res = analysis.analyze_image(path, tile=args.tile)
+        vec_s = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    mp = width * height / 1e6
+    results = {
+        "frame_mp": round(mp, 1),
+        "naive_s_per_mp": round(naive_s_per_mp, 3),
+        "naive_s_full_frame_est": round(naive_s_per_mp * mp, 1),
+        "vectorized_s_full_frame": round(vec_s, 3),
+        "speedup": round(naive_s_per_mp * mp / vec_s, 1),
+        "vectorized_peak_numpy_mb": round(peak / 1e6, 1),
+        "canopy_cover": round(res["canopy_cover"], 4),
+    }
+    for k, v in results.items():
+        print(f"{k:28s} {v}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare two run.py result files and flag regressions.
+
+    python tools/benchmarks/compare.py results/base.json results/head.json --threshold 0.10
+
+A case regresses when its median time grows by more than ``--threshold``
+(relative) *and* by more than the baseline's own spread (stdev), so noisy
+micro-cases do not fail the run on jitter alone.  Exits 1 if any case
+regressed, 0 otherwise; cases present in only one file are listed but never
+fail the comparison.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base: dict, head: dict, threshold: float) -> list[dict]:
+    rows = []
+    b_res, h_res = base["results"], head["results"]
+    for name in sorted(set(b_res) | set(h_res)):
+        b, h = b_res.get(name), h_res.get(name)
+        if b is None or h is None or "median_s" not in b or "median_s" not in h:
+            rows.append({"case": name, "status": "added" if b is None else "removed" if h is None else "skipped"})
+            continue
+        change = (h["median_s"] - b["median_s"]) / b["median_s"] if b["median_s"] else 0.0
+        noise = b.get("stdev_s", 0.0)
+        if change > threshold and h["median_s"] - b["median_s"] > noise:
+            status = "REGRESSED"
+        elif change < -threshold and b["median_s"] - h["median_s"] > noise:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({
+            "case": name, "status": status, "change": change,
+            "base_ms": b["median_s"] * 1000, "head_ms": h["median_s"] * 1000,
+        })
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("base")
+    ap.add_argument("head")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    ap.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = ap.parse_args(argv)
+
+    base, head = load(args.base), load(args.head)
+    rows = compare(base, head, args.threshold)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"base {base['environment'].get('git_rev')}  ->  head {head['environment'].get('git_rev')}")
+        for r in rows:
+            if "change" in r:
+                print(f"{r['case']:48s} {r['base_ms']:>10.3f} -> {r['head_ms']:>10.3f} ms  {r['change']:+7.1%}  {r['status']}")
+            else:
+                print(f"{r['case']:48s} {r['status']}")
+    regressed = [r for r in rows if r["status"] == "REGRESSED"]
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
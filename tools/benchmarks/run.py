@@ -0,0 +1,73 @@
+"""
+Run the benchmark suites and write one JSON document with every case.
+
+    python tools/benchmarks/run.py                       # all suites, full sizes
+    python tools/benchmarks/run.py --quick -o base.json  # smaller datasets (CI)
+    python tools/benchmarks/run.py --suite db --database-url postgresql://...
+
+Output layout::
+
+    {"environment": {"git_rev": ..., "python": ..., ...},
+     "params": {...},
+     "results": {"telemetry.serialize_measurement[100000]": {"median_s": ..., ...}, ...}}
+
+Compare two runs with compare.py.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from harness import environment, print_results  # noqa: E402
+
+SUITES = ("telemetry", "db")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def run_suites(suites, quick=False, database_url=None) -> tuple[dict, dict]:
+    params = {
+        "rows": 10_000 if quick else 100_000,
+        "messages": 2_000 if quick else 10_000,
+        "sockets": [100, 1000] if quick else [100, 1000, 10_000],
+        "sizes": [1000, 10_000] if quick else [1000, 10_000, 100_000],
+        "inserts": 100 if quick else 500,
+    }
+    results = {}
+    if "telemetry" in suites:
+        import bench_telemetry_paths
+
+        results.update(bench_telemetry_paths.cases(params["rows"], params["messages"], params["sockets"]))
+    if "db" in suites:
+        import bench_measurements_db
+
+        results.update(bench_measurements_db.cases(database_url, params["sizes"], params["inserts"]))
+    return params, results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    ap.add_argument("--quick", action="store_true", help="smaller datasets, for CI smoke runs")
+    ap.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                    help="local Postgres for the db suite (default: throwaway SQLite)")
+    ap.add_argument("-o", "--output", help="JSON file to write (default: results/<git rev>.json)")
+    args = ap.parse_args(argv)
+
+    env = environment()
+    params, results = run_suites(args.suite, args.quick, args.database_url)
+    params.update({"suites": args.suite, "quick": args.quick})
+    print_results(results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{env['git_rev'] or 'unversioned'}.json")
+    with open(output, "w") as f:
+        json.dump({"environment": env, "params": params, "results": results}, f, indent=2, sort_keys=True)
+    print(f"\nwrote {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,284 @@
-import time
-import requests
+"""
+Asyncio load generator for the telemetry pipeline.
+
+Simulates many devices posting to /api/v1/telemetry and, optionally, viewers
+watching /ws/live, then reports ingest throughput, request latency
+percentiles and end-to-end delivery lag (send -> WebSocket receive).
+
+Register the simulated devices first (ids are derived, see LOADGEN_NAMESPACE):
+
+    docker compose exec backend python -m app.scripts.seed_devices --count 2000
+
+Examples:
+
+    # one device, one reading (the old behaviour)
+    python tools/device_simulator.py --devices 1 --count 1
+
+    # 2000 devices at 0.2 Hz for 2 minutes, 5% duplicates, 50 viewers
+    python tools/device_simulator.py --devices 2000 --rate 0.2 --duration 120 \\
+        --duplicate-ratio 0.05 --out-of-order-ratio 0.02 --viewers 50 --username admin --password secret
+
+    # every device replays 30 minutes of buffered readings, then runs steady
+    python tools/device_simulator.py --devices 500 --pattern backlog --backlog-minutes 30
+"""
+import argparse
+import asyncio
+import json
 import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+API_BASE = os.environ.get('API_BASE', 'http://localhost:8000')
+DEVICE_TOKEN = os.environ.get('DEVICE_TOKEN', 'devicetoken-example')
+
+# keep in sync with backend/app/scripts/seed_devices.py
+LOADGEN_NAMESPACE = uuid.UUID("6f1d8a52-3c1e-4b8e-9a57-0c2f6a4e9b11")
+
+
+def device_id(i: int) -> str:
+    return str(uuid.uuid5(LOADGEN_NAMESPACE, f"loadgen-{i}"))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+class Stats:
+    def __init__(self):
+        self.status = Counter()
+        self.latencies = []
+        self.errors = Counter()
+        self.sent_ids = set()
+        self.sent_by_device = {}      # device id -> accepted message ids
+        self.duplicates_sent = 0
+        self.out_of_order_sent = 0
+        self.delivered = Counter()
+        self.delivery_lags = []
+
+
+class LoadGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.stats = Stats()
+        self.sem = asyncio.Semaphore(args.concurrency)
+        self.rng = random.Random(args.seed)
+        self.stop_at = None
+
+    # ---------- readings ----------
+    def reading(self, dev: int, seq: int, ts: datetime) -> dict:
+        rng = self.rng
+        return {
+            'device_id': device_id(dev),
+            'message_id': f'{self.run_id}-{dev}-{seq}',
+            'timestamp': ts.isoformat(),
+            'measurements': {
+                'temperature_c': round(rng.gauss(18, 6), 2),
+                'relative_humidity_pct': round(min(100, max(0, rng.gauss(60, 15))), 1),
+                'solar_radiance_w_m2': round(max(0, rng.gauss(500, 300)), 1),
+                'wind_speed_m_s': round(abs(rng.gauss(3, 2)), 2),
+                'wind_direction_deg': round(rng.uniform(0, 360), 1),
+                'battery_v': round(rng.uniform(3.4, 4.2), 3),
+            },
+            # echoed back through pubsub so viewers can measure delivery lag
+            'meta': {'loadgen': self.run_id, 'sent_at': None},
+        }
+
+    async def post(self, client: httpx.AsyncClient, body: dict):
+        async with self.sem:
+            body['meta']['sent_at'] = time.time()
+            t0 = time.perf_counter()
+            try:
+                r = await client.post('/api/v1/telemetry', json=body, headers={'X-Device-Token': DEVICE_TOKEN})
+                self.stats.status[r.status_code] += 1
+            except httpx.HTTPError as exc:
+                self.stats.errors[type(exc).__name__] += 1
+                return
+            self.stats.latencies.append(time.perf_counter() - t0)
+            self.stats.sent_ids.add(body['message_id'])
+            if r.status_code == 202:
+                self.stats.sent_by_device.setdefault(body['device_id'], set()).add(body['message_id'])
+
+    async def emit(self, client, dev, seq, ts, history):
+        args, rng = self.args, self.rng
+        if history and rng.random() < args.duplicate_ratio:
+            # resend a previous reading unchanged (same message_id)
+            self.stats.duplicates_sent += 1
+            await self.post(client, json.loads(json.dumps(rng.choice(history))))
+            return
+        if rng.random() < args.out_of_order_ratio:
+            ts = ts - timedelta(seconds=rng.uniform(1, 10) / max(args.rate, 1e-6))
+            self.stats.out_of_order_sent += 1
+        body = self.reading(dev, seq, ts)
+        history.append(body)
+        del history[:-20]
+        await self.post(client, body)
+
+    # ---------- device behaviour ----------
+    async def device(self, client, dev):
+        args = self.args
+        interval = 1.0 / args.rate
+        seq = 0
+        history = []
+        if args.pattern == 'backlog':
+            # replay buffered readings with their original timestamps, as fast as allowed
+            n = int(args.backlog_minutes * 60 * args.rate)
+            start = datetime.now(timezone.utc) - timedelta(minutes=args.backlog_minutes)
+            for k in range(n):
+                await self.emit(client, dev, seq, start + timedelta(seconds=k * interval), history)
+                seq += 1
+        # open loop: readings go out on schedule whether or not the server has
+        # answered the previous one, so a slow server shows up as latency, not as less load
+        pending = set()
+        next_at = time.monotonic() + self.rng.uniform(0, interval)  # spread devices over the interval
+        next_burst = time.monotonic() + args.burst_every
+        while next_at < self.stop_at and (args.count is None or seq < args.count):
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            burst = args.pattern == 'burst' and time.monotonic() >= next_burst
+            for _ in range(args.burst_size if burst else 1):
+                task = asyncio.create_task(self.emit(client, dev, seq, datetime.now(timezone.utc), history))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                seq += 1
+            if burst:
+                next_burst += args.burst_every
+            next_at += interval
+        if pending:
+            await asyncio.gather(*pending)
+
+    # ---------- viewers ----------
+    async def login(self, client) -> str | None:
+        if not self.args.username:
+            return None
+        r = await client.post('/api/auth/login', json={'username': self.args.username, 'password': self.args.password})
+        r.raise_for_status()
+        return r.json()['access_token']
+
+    async def viewer(self, token, idx):
+        import websockets
+
+        ws_base = API_BASE.replace('http', 'ws', 1).rstrip('/')
+        query = f'access_token={token}'
+        if self.args.viewer_mode == 'device':
+            query += f'&device_id={device_id(idx % self.args.devices)}'
+        try:
+            async with websockets.connect(f'{ws_base}/ws/live?{query}') as ws:
+                while True:
+                    msg = json.loads(await ws.recv())
+                    meta = msg.get('meta') or {}
+                    if meta.get('loadgen') != self.run_id:
+                        continue
+                    self.stats.delivered[msg.get('message_id')] += 1
+                    if meta.get('sent_at'):
+                        self.stats.delivery_lags.append(time.time() - meta['sent_at'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.stats.errors[f'viewer:{type(exc).__name__}'] += 1
+
+    # ---------- run ----------
+    async def run(self):
+        args = self.args
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=API_BASE, limits=limits, timeout=args.timeout) as client:
+            viewers = []
+            if args.viewers:
+                token = await self.login(client)
+                if token is None:
+                    sys.exit('--viewers needs --username/--password')
+                viewers = [asyncio.create_task(self.viewer(token, i)) for i in range(args.viewers)]
+                await asyncio.sleep(1.0)  # let subscriptions settle
+
+            t0 = time.perf_counter()
+            self.stop_at = time.monotonic() + args.duration
+            await asyncio.gather(*(self.device(client, d) for d in range(args.devices)))
+            elapsed = time.perf_counter() - t0
+
+            if viewers:
+                await asyncio.sleep(args.drain)
+                for v in viewers:
+                    v.cancel()
+                await asyncio.gather(*viewers, return_exceptions=True)
+        return self.report(elapsed)
+
+    def watched_ids(self) -> set:
+        """Accepted message ids the viewers subscribed to (in device mode each watches one device)."""
+        s, args = self.stats, self.args
+        if args.viewer_mode == 'all':
+            devices = s.sent_by_device.keys()
+        else:
+            devices = {device_id(i % args.devices) for i in range(args.viewers)}
+        return set().union(*(s.sent_by_device.get(d, ()) for d in devices))
+
+    def report(self, elapsed):
+        s = self.stats
+        expected = self.watched_ids() if self.args.viewers else set()
+        lat = sorted(s.latencies)
+        lag = sorted(s.delivery_lags)
+        ms = lambda v: round(v * 1000, 1) if v is not None else None  # noqa: E731
+        return {
+            'run_id': self.run_id,
+            'devices': self.args.devices,
+            'pattern': self.args.pattern,
+            'elapsed_s': round(elapsed, 2),
+            'requests': sum(s.status.values()),
+            'throughput_rps': round(sum(s.status.values()) / elapsed, 1) if elapsed else None,
+            'status': dict(s.status),
+            'errors': dict(s.errors),
+            'duplicates_sent': s.duplicates_sent,
+            'out_of_order_sent': s.out_of_order_sent,
+            'latency_ms': {'p50': ms(percentile(lat, 50)), 'p95': ms(percentile(lat, 95)), 'p99': ms(percentile(lat, 99))},
+            'viewers': self.args.viewers,
+            'delivered_unique': len(s.delivered),
+            'expected_deliveries': len(expected),
+            'delivery_ratio': round(len(expected & s.delivered.keys()) / len(expected), 4) if expected else None,
+            'delivery_lag_ms': {'p50': ms(percentile(lag, 50)), 'p95': ms(percentile(lag, 95)), 'p99': ms(percentile(lag, 99))},
+        }
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--devices', type=int, default=1)
+    ap.add_argument('--rate', type=float, default=1.0, help='readings per second per device')
+    ap.add_argument('--duration', type=float, default=10.0, help='seconds of steady traffic')
+    ap.add_argument('--count', type=int, default=None, help='stop each device after this many readings')
+    ap.add_argument('--pattern', choices=['steady', 'burst', 'backlog'], default='steady')
+    ap.add_argument('--burst-size', type=int, default=10)
+    ap.add_argument('--burst-every', type=float, default=30.0)
+    ap.add_argument('--backlog-minutes', type=float, default=10.0)
+    ap.add_argument('--duplicate-ratio', type=float, default=0.0)
+    ap.add_argument('--out-of-order-ratio', type=float, default=0.0)
+    ap.add_argument('--viewers', type=int, default=0)
+    ap.add_argument('--viewer-mode', choices=['all', 'device'], default='device')
+    ap.add_argument('--username', default=os.environ.get('LOADGEN_USER'))
+    ap.add_argument('--password', default=os.environ.get('LOADGEN_PASSWORD'))
+    ap.add_argument('--concurrency', type=int, default=200, help='max in-flight HTTP requests')
+    ap.add_argument('--timeout', type=float, default=10.0)
+    ap.add_argument('--drain', type=float, default=3.0, help='seconds to wait for late WS deliveries')
+    ap.add_argument('--seed', type=int, default=None)
+    ap.add_argument('--json', action='store_true', help='print the report as JSON')
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(LoadGenerator(args).run())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for k, v in report.items():
+            print(f'{k:18s} {v}')
+    return report
 
-API_BASE = os.environ.get('API_BASE','http://localhost:8000')
-DEVICE_TOKEN = os.environ.get('DEVICE_TOKEN','devicetoken-example')
-
-# Send one telemetry
-telemetry = {
-    'device_id': '11111111-1111-1111-1111-111111111111',
-    'message_id': 'msg-008',
-    'timestamp': '2025-09-25T17:10:00Z',
-    'measurements': {
-        'temperature_c': 25.0,
-        'relative_humidity_pct': 65.0,
-        'solar_radiance_w_m2': 1080.0,
-        'wind_speed_m_s': 12.3,
-        'wind_direction_deg': 16.0,
-        'battery_v': 33.8
-    }
-}
-
-# Headers should include the token as 'X-Device-Token'
-headers = {
-    'Authorization': f'Bearer {DEVICE_TOKEN}',  # Optionally, you can include Authorization header.
-    'X-Device-Token': DEVICE_TOKEN  # The device token goes here as required by the backend
-}
-
-# Sending the POST request with telemetry data
-r = requests.post(f'{API_BASE}/api/v1/telemetry', json=telemetry, headers=headers)
-
-print('telemetry:', r.status_code, r.text)
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+"""
+Edge gateway client: buffer readings on disk, upload them in batches.
+
+    import threading
+    from gateway import DiskQueue, GatewayClient
+
+    gw = GatewayClient('https://api.example', DiskQueue('/var/lib/gateway/outbox.db'),
+                       tokens={device_id: device_token})
+    gw.submit(device_id, {'temperature_c': 21.4, ...})   # durable once it returns
+    threading.Thread(target=gw.run, args=(stop,), daemon=True).start()
+
+Put ``tools/`` on ``PYTHONPATH`` to import it; it only needs ``httpx``.
+"""
+from gateway.client import FlushResult, GatewayClient, message_id_for
+from gateway.diskqueue import DiskQueue
+
+__all__ = ['DiskQueue', 'FlushResult', 'GatewayClient', 'message_id_for']
@@ -0,0 +1,211 @@
+"""
+Gateway uploader: readings go to the disk queue first and are sent in
+gzip-compressed batches to ``POST /api/v1/telemetry/batch``, one device per
+request.
+
+Pacing follows the server's signals, per device:
+
+  * ``X-RateLimit-Limit`` (the device's burst) caps the batch size, and a
+    413 for a too-large batch shrinks it to that limit;
+  * ``X-RateLimit-Remaining`` sizes the next batch to what is admissible now;
+  * a 429 parks the device for ``Retry-After`` seconds (not a failure);
+  * network errors and 5xx back off exponentially with jitter, up to
+    ``backoff_max``; 401/404 (unknown device, bad token) park the device for
+    ``backoff_max``;
+  * a 422 halves the batch until the bad reading is sent on its own; only
+    then is it (or a single reading refused with 413) moved to the queue's
+    ``rejected`` table, so one malformed reading does not take its batch
+    with it.
+
+``batch_size`` is clamped to the server's ``TELEMETRY_BATCH_MAX``.
+
+Message ids are derived from device id and timestamp unless given, so a
+reading submitted twice (e.g. re-read from the sensor after a restart) is
+queued and stored once.
+"""
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import httpx
+
+from gateway.diskqueue import DiskQueue
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_NAMESPACE = uuid.UUID('2b7c4e0a-9d51-4f36-8a1e-5c3f7b9d0e62')
+BATCH_PATH = '/api/v1/telemetry/batch'
+# the server's TELEMETRY_BATCH_MAX; larger batches are refused as invalid
+SERVER_BATCH_MAX = 500
+
+
+def message_id_for(device_id: str, timestamp: str) -> str:
+    """Stable id of a device's reading at ``timestamp`` (ISO 8601)."""
+    return str(uuid.uuid5(GATEWAY_NAMESPACE, f'{device_id}|{timestamp}'))
+
+
+@dataclass
+class FlushResult:
+    sent: int = 0                      # readings accepted by the server
+    requests: int = 0
+    limited: int = 0                   # 429s
+    rejected: int = 0                  # readings moved to ``rejected``
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+
+
+class GatewayClient:
+    def __init__(self, base_url: str, queue: DiskQueue, *, token: str | None = None,
+                 tokens: dict[str, str] | None = None, batch_size: int = 100, timeout: float = 10.0,
+                 backoff_base: float = 1.0, backoff_max: float = 300.0, http: httpx.Client | None = None):
+        self.queue = queue
+        self.token = token
+        self.tokens = tokens or {}
+        self.batch_size = max(1, min(batch_size, SERVER_BATCH_MAX))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.http = http or httpx.Client(base_url=base_url, timeout=timeout)
+        self._limit: dict[str, int] = {}          # device -> server burst
+        self._bisect: dict[str, int] = {}         # device -> batch cap while hunting a bad reading
+        self._remaining: dict[str, tuple[int, float]] = {}   # device -> (tokens left, when)
+        self._not_before: dict[str, float] = {}   # device -> monotonic time it may send again
+        self._failures = 0                        # consecutive network / server errors
+        self._paused_until = 0.0
+
+    def close(self) -> None:
+        self.http.close()
+        self.queue.close()
+
+    # ---------- producer side ----------
+    def submit(self, device_id: str, measurements: dict, timestamp: datetime | None = None,
+               meta: dict | None = None, message_id: str | None = None) -> str:
+        """Queue a reading (durably) and return its message id."""
+        ts = (timestamp or datetime.now(timezone.utc)).isoformat()
+        message_id = message_id or message_id_for(device_id, ts)
+        reading = {'message_id': message_id, 'timestamp': ts, 'measurements': measurements}
+        if meta:
+            reading['meta'] = meta
+        self.queue.put(str(device_id), message_id, reading)
+        return message_id
+
+    # ---------- uploader side ----------
+    def next_attempt(self, device_id: str) -> float:
+        """Monotonic time before which the device's readings are held back."""
+        return max(self._not_before.get(device_id, 0.0), self._paused_until)
+
+    def _backoff(self) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** min(self._failures, 30))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _batch_size(self, device_id: str) -> int:
+        size = min(self.batch_size, self._limit.get(device_id, self.batch_size),
+                   self._bisect.get(device_id, self.batch_size))
+        remaining, at = self._remaining.get(device_id, (0, 0.0))
+        # only meaningful right after the last batch; the bucket refills meanwhile
+        if remaining and time.monotonic() - at < 1.0:
+            size = min(size, remaining)
+        return max(1, size)
+
+    def flush(self) -> FlushResult:
+        """One pass over the devices that may send now: at most one batch each."""
+        result = FlushResult()
+        for device_id in self.queue.devices():
+            now = time.monotonic()
+            if self._paused_until > now:
+                break
+            if self._not_before.get(device_id, 0.0) > now:
+                continue
+            self._send(device_id, result)
+        return result
+
+    def _send(self, device_id: str, result: FlushResult) -> None:
+        batch = self.queue.peek(device_id, self._batch_size(device_id))
+        if not batch:
+            return
+        body = gzip.compress(json.dumps(
+            {'device_id': device_id, 'readings': [r for _, r in batch]}, separators=(',', ':'),
+        ).encode(), compresslevel=6)
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip',
+                   'X-Device-Token': self.tokens.get(device_id, self.token or '')}
+        seqs = [s for s, _ in batch]
+        result.requests += 1
+        try:
+            r = self.http.post(BATCH_PATH, content=body, headers=headers)
+        except httpx.HTTPError as exc:
+            self._failed(result, f'{type(exc).__name__}: {exc}')
+            return
+        result.statuses[r.status_code] = result.statuses.get(r.status_code, 0) + 1
+        self._learn(device_id, r)
+
+        if r.status_code == 202:
+            self.queue.ack(seqs)
+            self._failures = 0
+            result.sent += len(seqs)
+        elif r.status_code == 429:
+            self._remaining.pop(device_id, None)
+            self._not_before[device_id] = time.monotonic() + _retry_after(r, self._backoff())
+            result.limited += 1
+        elif r.status_code == 413 and len(seqs) > 1:
+            if _int_header(r, 'X-RateLimit-Limit') is None:
+                self._limit[device_id] = len(seqs) // 2
+        elif r.status_code == 422 and len(seqs) > 1:
+            # bisect: the good half goes through, the bad one shrinks again
+            self._bisect[device_id] = len(seqs) // 2
+        elif r.status_code in (413, 422):
+            self.queue.reject(seqs, r.text[:500])
+            self._bisect.pop(device_id, None)
+            result.rejected += len(seqs)
+        elif r.status_code in (401, 403, 404):
+            logger.error('Device %s refused (%s): %s', device_id, r.status_code, r.text[:200])
+            self._not_before[device_id] = time.monotonic() + self.backoff_max
+        else:
+            self._failed(result, f'HTTP {r.status_code}')
+
+    def _learn(self, device_id: str, r: httpx.Response) -> None:
+        limit = _int_header(r, 'X-RateLimit-Limit')
+        if limit:
+            self._limit[device_id] = limit
+        remaining = _int_header(r, 'X-RateLimit-Remaining')
+        if remaining is not None:
+            self._remaining[device_id] = (remaining, time.monotonic())
+
+    def _failed(self, result: FlushResult, reason: str) -> None:
+        # connectivity or server trouble: hold everything, not just this device
+        delay = self._backoff()
+        self._failures += 1
+        self._paused_until = time.monotonic() + delay
+        result.errors += 1
+        logger.warning('Upload failed (%s), retrying in %.1fs', reason, delay)
+
+    def run(self, stop: threading.Event, idle_s: float = 5.0) -> None:
+        """Upload until ``stop`` is set, sleeping until the next device may send."""
+        while not stop.is_set():
+            result = self.flush()
+            pending = self.queue.devices()
+            if not pending:
+                stop.wait(idle_s)
+                continue
+            if result.sent:
+                continue
+            wait = min(self.next_attempt(d) for d in pending) - time.monotonic()
+            stop.wait(min(idle_s, max(0.05, wait)))
+
+
+def _int_header(r: httpx.Response, name: str) -> int | None:
+    try:
+        return int(r.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _retry_after(r: httpx.Response, default: float) -> float:
+    try:
+        return max(0.0, float(r.headers['Retry-After']))
+    except (KeyError, ValueError):
+        return default
@@ -0,0 +1,109 @@
+"""
+Crash-safe outbound queue for a gateway, in one SQLite file.
+
+Every reading is committed (WAL, ``synchronous=FULL``) before ``put`` returns,
+so a power cut loses nothing that was acknowledged to the sensor side.  A row
+only leaves the queue once the server has accepted its batch (``ack``), so a
+crash between upload and ack re-sends it; the server drops the duplicate by
+``message_id``.
+
+Readings the server refuses as invalid are moved to ``rejected`` rather than
+deleted, so they can be inspected.  ``max_items`` bounds the file on a full
+disk: the oldest readings are dropped first.
+"""
+import json
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id  TEXT NOT NULL,
+    message_id TEXT NOT NULL UNIQUE,
+    body       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_device ON outbox (device_id, seq);
+CREATE TABLE IF NOT EXISTS rejected (
+    seq        INTEGER PRIMARY KEY,
+    device_id  TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    body       TEXT NOT NULL,
+    reason     TEXT
+);
+"""
+
+
+class DiskQueue:
+    def __init__(self, path: str, max_items: int | None = None):
+        self.path = path
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=FULL')
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def put(self, device_id: str, message_id: str, reading: dict) -> bool:
+        """Store a reading; False if ``message_id`` is already queued."""
+        with self._lock:
+            cur = self._db.execute(
+                'INSERT OR IGNORE INTO outbox (device_id, message_id, body) VALUES (?, ?, ?)',
+                (device_id, message_id, json.dumps(reading, separators=(',', ':'))),
+            )
+            if cur.rowcount and self.max_items:
+                self._trim()
+            return bool(cur.rowcount)
+
+    def _trim(self) -> None:
+        over = self._db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0] - self.max_items
+        if over > 0:
+            self._db.execute('DELETE FROM outbox WHERE seq IN (SELECT seq FROM outbox ORDER BY seq LIMIT ?)', (over,))
+            logger.warning('Gateway queue full, dropped %d oldest readings', over)
+
+    def devices(self) -> list[str]:
+        """Devices with queued readings, the one waiting longest first."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT device_id FROM outbox GROUP BY device_id ORDER BY MIN(seq)'
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def peek(self, device_id: str, limit: int) -> list[tuple[int, dict]]:
+        """Oldest ``limit`` readings of a device as ``(seq, reading)``; they stay queued."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT seq, body FROM outbox WHERE device_id = ? ORDER BY seq LIMIT ?', (device_id, limit),
+            ).fetchall()
+        return [(seq, json.loads(body)) for seq, body in rows]
+
+    def ack(self, seqs: list[int]) -> None:
+        with self._lock:
+            self._db.executemany('DELETE FROM outbox WHERE seq = ?', [(s,) for s in seqs])
+
+    def reject(self, seqs: list[int], reason: str) -> None:
+        """Move readings the server will never accept out of the way."""
+        with self._lock:
+            self._db.execute('BEGIN')
+            for s in seqs:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO rejected SELECT seq, device_id, message_id, body, ? FROM outbox WHERE seq = ?',
+                    (reason, s),
+                )
+                self._db.execute('DELETE FROM outbox WHERE seq = ?', (s,))
+            self._db.execute('COMMIT')
+
+    def rejected(self) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute('SELECT device_id, message_id, body, reason FROM rejected ORDER BY seq').fetchall()
+        return [{'device_id': d, 'message_id': m, 'reading': json.loads(b), 'reason': r} for d, m, b, r in rows]